@@ -1,6 +1,12 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, abort, jsonify, redirect, request, send_from_directory
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
+from werkzeug.security import safe_join
+from dotenv import load_dotenv
+
+# Before the blueprints: some of them read required secrets at import time
+load_dotenv()
+
 from database.config import db_config
 
 from database.db_helper import get_db_connection, get_cursor
@@ -18,10 +24,28 @@ from blueprints.rating_bp import rating_bp
 # from blueprints.payment_bp import payment_bp  # 已弃用 - 使用 Stripe 代替
 from blueprints.stripe_payment_bp import stripe_payment_bp
 from blueprints.account_deletion_bp import account_deletion_bp
+from blueprints.bootstrap_bp import bootstrap_bp
+from services.stripe_events import start_event_workers
+from services.google_tokens import start_token_refresher
+from services.google_calendar_sync import start_sync_scheduler
+from services.photo_store import start_photo_gc, hash_from_url
+from services.reference_data import start_reference_data
+from services.service_area_geocoding import start_service_area_geocoder
+from services.cache_bus import start_cache_bus, metrics as cache_bus_metrics
+from services.object_storage import STATIC_DIR, cache_control_for, get_storage
+from services import metrics, query_tracer
+import mimetypes
 import socket
 import os
 
-app = Flask(__name__)
+# /static is served by serve_static below (caching headers, proxy offload, storage backends)
+app = Flask(__name__, static_folder=None)
+
+# 'x-accel' (nginx X-Accel-Redirect) or 'x-sendfile' (Apache/lighttpd) hands file bytes to the front proxy
+STATIC_OFFLOAD = os.getenv('STATIC_OFFLOAD', '')
+# nginx internal location that maps to backend/static (and may proxy the S3 bucket)
+STATIC_ACCEL_PREFIX = os.getenv('STATIC_ACCEL_PREFIX', '/_protected_static/')
+app.config['USE_X_SENDFILE'] = STATIC_OFFLOAD == 'x-sendfile'
 
 
 def add_cors_headers(response):
@@ -32,9 +56,45 @@ def add_cors_headers(response):
 
 app.after_request(add_cors_headers)
 
+# Route latency, DB and outbound time per request: /metrics and the Server-Timing header
+metrics.init_app(app)
+# QUERY_TRACE=1 (development, canary): flag N+1 patterns and EXPLAIN slow queries per route
+query_tracer.init_app(app)
+
 
 bcrypt = Bcrypt(app)
 
+_workers_pid = None
+
+
+def start_background_workers():
+    """
+    Start this process's background threads. Threads do not survive fork, so under a
+    pre-forking server (gunicorn --preload) every worker starts its own: from the
+    post_fork hook in gunicorn.conf.py, or at the latest on its first request.
+    """
+    global _workers_pid
+    if _workers_pid == os.getpid():
+        return
+    _workers_pid = os.getpid()
+
+    # Process Stripe events stored while the server was down
+    start_event_workers()
+    # Renew Google Calendar tokens before they expire
+    start_token_refresher()
+    # Keep mirrored Google Calendar busy time fresh
+    start_sync_scheduler()
+    # Remove photos no row has referenced for a day
+    start_photo_gc()
+    # Geocode chef service areas outside the search request path
+    start_service_area_geocoder()
+    # Keep cuisine types and agreements in memory, refreshed on change notifications
+    start_reference_data()
+    # Evict cache entries other workers have written to
+    start_cache_bus()
+
+app.before_request(start_background_workers)
+
 
 app.register_blueprint(auth_bp, url_prefix='/auth')
 
@@ -66,6 +126,8 @@ app.register_blueprint(stripe_payment_bp, url_prefix='/stripe-payment')
 
 app.register_blueprint(account_deletion_bp)
 
+app.register_blueprint(bootstrap_bp)
+
 @app.route('/')
 def index():
     try:
@@ -79,8 +141,32 @@ def index():
 
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    """Serve static files"""
-    return send_from_directory('static', filename)
+    """
+    Serve static files. Content-addressed photos are immutable and cached for a year;
+    ETag/If-None-Match and Range come from send_from_directory. With STATIC_OFFLOAD set
+    the front proxy sends the bytes, and photos in an S3 backend redirect to the bucket.
+    """
+    # send_from_directory checks this itself, but the proxy and S3 branches do not
+    if safe_join(STATIC_DIR, filename) is None:
+        abort(404)
+
+    cache_control = cache_control_for(filename)
+    storage = get_storage()
+
+    if STATIC_OFFLOAD == 'x-accel':
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = STATIC_ACCEL_PREFIX + filename
+    elif storage.name != 'local' and hash_from_url(f'/static/{filename}'):
+        response = redirect(storage.public_url(filename), code=302)
+    else:
+        response = send_from_directory(STATIC_DIR, filename)
+
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.route('/__cache_bus__')
+def __cache_bus__():
+    return jsonify(cache_bus_metrics())
 
 @app.route('/__routes__')
 def __routes__():
@@ -97,5 +183,7 @@ if __name__ == '__main__':
     finally:
         s.close()
 
+    start_background_workers()
+
     print(f'Server starting on {local_ip}:3000')
     app.run(debug=True, host='0.0.0.0', port=3000, threaded=True)
@@ -9,6 +9,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.geocoding_service import geocoding_service
+from services import image_pipeline
 
 def validate_email(email):
     email_regex = r'^[a-zA-Z0-9._-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -242,6 +243,115 @@ def signin():
             conn.close()
 
 
+def load_user_profile(cursor, user_id):
+    """User profile with chef or customer details, or None if the user does not exist"""
+    # Get user information with linked profile
+    cursor.execute('''
+        SELECT u.id as user_id, u.email, u.user_type, u.chef_id, u.customer_id,
+               u.created_at as user_created_at
+        FROM users u
+        WHERE u.id = %s
+    ''', (user_id,))
+    
+    user = cursor.fetchone()
+    if not user:
+        return None
+
+    profile_data = {
+        'user_id': user['user_id'],
+        'email': user['email'],
+        'user_type': user['user_type'],
+        'created_at': user['user_created_at']
+    }
+
+    # Get detailed profile based on user type
+    if user['user_type'] == 'chef' and user['chef_id']:
+        # Get chef profile with additional details
+        cursor.execute('''
+            SELECT c.id as chef_id, c.first_name, c.last_name, c.phone, c.photo_url,
+                   c.created_at, c.updated_at
+            FROM chefs c
+            WHERE c.id = %s
+        ''', (user['chef_id'],))
+        
+        chef_profile = cursor.fetchone()
+        if chef_profile:
+            profile_data.update({
+                'profile_id': chef_profile['chef_id'],
+                'first_name': chef_profile['first_name'],
+                'last_name': chef_profile['last_name'],
+                'phone': chef_profile['phone'],
+                'photo_url': chef_profile['photo_url'],
+                'photo_variants': image_pipeline.photo_variants(chef_profile['photo_url']),
+                'profile_created_at': chef_profile['created_at'],
+                'profile_updated_at': chef_profile['updated_at']
+            })
+
+            # Get chef cuisines
+            cursor.execute('''
+                SELECT ct.name
+                FROM chef_cuisines cc
+                JOIN cuisine_types ct ON cc.cuisine_id = ct.id
+                WHERE cc.chef_id = %s
+            ''', (user['chef_id'],))
+            cuisines = [row['name'] for row in cursor.fetchall()]
+            profile_data['cuisines'] = cuisines
+
+            # Get chef service areas
+            cursor.execute('''
+                SELECT city, state, zip_code, service_radius_miles
+                FROM chef_service_areas
+                WHERE chef_id = %s
+            ''', (user['chef_id'],))
+            service_areas = cursor.fetchall()
+            profile_data['service_areas'] = service_areas
+
+            # Get chef pricing
+            cursor.execute('''
+                SELECT base_rate_per_person, produce_supply_extra_cost, 
+                       minimum_people, maximum_people
+                FROM chef_pricing
+                WHERE chef_id = %s
+            ''', (user['chef_id'],))
+            pricing = cursor.fetchone()
+            if pricing:
+                profile_data['pricing'] = pricing
+
+    elif user['user_type'] == 'customer' and user['customer_id']:
+        # Get customer profile
+        cursor.execute('''
+            SELECT c.id as customer_id, c.first_name, c.last_name, c.phone, 
+                   c.photo_url, c.allergy_notes, c.created_at, c.updated_at
+            FROM customers c
+            WHERE c.id = %s
+        ''', (user['customer_id'],))
+        
+        customer_profile = cursor.fetchone()
+        if customer_profile:
+            profile_data.update({
+                'profile_id': customer_profile['customer_id'],
+                'first_name': customer_profile['first_name'],
+                'last_name': customer_profile['last_name'],
+                'phone': customer_profile['phone'],
+                'photo_url': customer_profile['photo_url'],
+                'photo_variants': image_pipeline.photo_variants(customer_profile['photo_url']),
+                'allergy_notes': customer_profile['allergy_notes'],
+                'profile_created_at': customer_profile['created_at'],
+                'profile_updated_at': customer_profile['updated_at']
+            })
+
+            # Get customer addresses
+            cursor.execute('''
+                SELECT id, address_line1, address_line2, city, state, zip_code, is_default
+                FROM customer_addresses
+                WHERE customer_id = %s
+            ''', (user['customer_id'],))
+            addresses = cursor.fetchall()
+            profile_data['addresses'] = addresses
+
+    return profile_data
+
+
 @auth_bp.route('/profile', methods=['GET'])
 def get_user_profile():
     """Get user profile information including chef or customer details"""
@@ -256,108 +366,10 @@ def get_user_profile():
         conn = get_db_connection()
         cursor = get_cursor(conn, dictionary=True)
 
-        # Get user information with linked profile
-        cursor.execute('''
-            SELECT u.id as user_id, u.email, u.user_type, u.chef_id, u.customer_id,
-                   u.created_at as user_created_at
-            FROM users u
-            WHERE u.id = %s
-        ''', (user_id,))
-        
-        user = cursor.fetchone()
-        if not user:
+        profile_data = load_user_profile(cursor, user_id)
+        if profile_data is None:
             return jsonify({'error': 'User not found'}), 404
 
-        profile_data = {
-            'user_id': user['user_id'],
-            'email': user['email'],
-            'user_type': user['user_type'],
-            'created_at': user['user_created_at']
-        }
-
-        # Get detailed profile based on user type
-        if user['user_type'] == 'chef' and user['chef_id']:
-            # Get chef profile with additional details
-            cursor.execute('''
-                SELECT c.id as chef_id, c.first_name, c.last_name, c.phone, c.photo_url,
-                       c.created_at, c.updated_at
-                FROM chefs c
-                WHERE c.id = %s
-            ''', (user['chef_id'],))
-            
-            chef_profile = cursor.fetchone()
-            if chef_profile:
-                profile_data.update({
-                    'profile_id': chef_profile['chef_id'],
-                    'first_name': chef_profile['first_name'],
-                    'last_name': chef_profile['last_name'],
-                    'phone': chef_profile['phone'],
-                    'photo_url': chef_profile['photo_url'],
-                    'profile_created_at': chef_profile['created_at'],
-                    'profile_updated_at': chef_profile['updated_at']
-                })
-
-                # Get chef cuisines
-                cursor.execute('''
-                    SELECT ct.name
-                    FROM chef_cuisines cc
-                    JOIN cuisine_types ct ON cc.cuisine_id = ct.id
-                    WHERE cc.chef_id = %s
-                ''', (user['chef_id'],))
-                cuisines = [row['name'] for row in cursor.fetchall()]
-                profile_data['cuisines'] = cuisines
-
-                # Get chef service areas
-                cursor.execute('''
-                    SELECT city, state, zip_code, service_radius_miles
-                    FROM chef_service_areas
-                    WHERE chef_id = %s
-                ''', (user['chef_id'],))
-                service_areas = cursor.fetchall()
-                profile_data['service_areas'] = service_areas
-
-                # Get chef pricing
-                cursor.execute('''
-                    SELECT base_rate_per_person, produce_supply_extra_cost, 
-                           minimum_people, maximum_people
-                    FROM chef_pricing
-                    WHERE chef_id = %s
-                ''', (user['chef_id'],))
-                pricing = cursor.fetchone()
-                if pricing:
-                    profile_data['pricing'] = pricing
-
-        elif user['user_type'] == 'customer' and user['customer_id']:
-            # Get customer profile
-            cursor.execute('''
-                SELECT c.id as customer_id, c.first_name, c.last_name, c.phone, 
-                       c.photo_url, c.allergy_notes, c.created_at, c.updated_at
-                FROM customers c
-                WHERE c.id = %s
-            ''', (user['customer_id'],))
-            
-            customer_profile = cursor.fetchone()
-            if customer_profile:
-                profile_data.update({
-                    'profile_id': customer_profile['customer_id'],
-                    'first_name': customer_profile['first_name'],
-                    'last_name': customer_profile['last_name'],
-                    'phone': customer_profile['phone'],
-                    'photo_url': customer_profile['photo_url'],
-                    'allergy_notes': customer_profile['allergy_notes'],
-                    'profile_created_at': customer_profile['created_at'],
-                    'profile_updated_at': customer_profile['updated_at']
-                })
-
-                # Get customer addresses
-                cursor.execute('''
-                    SELECT id, address_line1, address_line2, city, state, zip_code, is_default
-                    FROM customer_addresses
-                    WHERE customer_id = %s
-                ''', (user['customer_id'],))
-                addresses = cursor.fetchall()
-                profile_data['addresses'] = addresses
-
         return jsonify(profile_data), 200
 
     except Exception as e:
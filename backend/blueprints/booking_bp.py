@@ -4,6 +4,7 @@ from database.config import db_config
 from database.db_helper import get_db_connection, get_cursor, handle_db_error
 import math
 from services.geocoding_service import geocoding_service, get_coordinates_for_zip
+from services import image_pipeline
 from datetime import date as _date
 
 # Create the blueprint
@@ -30,6 +31,35 @@ def get_zip_coordinates(zip_code):
     """Get coordinates for a zip code using improved geocoding service"""
     return get_coordinates_for_zip(zip_code)
 
+def covering_service_areas_query(customer_lat, customer_lon):
+    """
+    Build a subquery of service areas whose radius covers the customer's location,
+    one row per chef (nearest area) with its distance_miles.
+    The GiST index on coverage_box narrows candidates before the exact distance check.
+    """
+    query = '''
+        SELECT DISTINCT ON (chef_id) *
+        FROM (
+            SELECT
+                csa.chef_id,
+                csa.city,
+                csa.state,
+                csa.zip_code,
+                csa.service_radius_miles,
+                3959 * acos(LEAST(1.0, GREATEST(-1.0,
+                    cos(radians(%s)) * cos(radians(csa.latitude)) *
+                    cos(radians(csa.longitude) - radians(%s)) +
+                    sin(radians(%s)) * sin(radians(csa.latitude))))) AS distance_miles
+            FROM chef_service_areas csa
+            WHERE csa.coverage_box && box(point(%s, %s), point(%s, %s))
+        ) areas
+        WHERE distance_miles <= COALESCE(service_radius_miles, 10)
+        ORDER BY chef_id, distance_miles
+    '''
+    params = [customer_lat, customer_lon, customer_lat,
+              customer_lon, customer_lat, customer_lon, customer_lat]
+    return query, params
+
 @booking_bp.route('/create', methods=['POST'])
 def create_booking():
     """Create a new booking request"""
@@ -102,10 +132,13 @@ def search_chefs():
         
         # Use improved geocoding service
         customer_lat, customer_lon = get_zip_coordinates(customer_zip)
-        
-  
-        cursor.execute('''
-            SELECT DISTINCT 
+
+        # Service areas get coordinates from services.service_area_geocoding in the background
+        coverage_query, coverage_params = covering_service_areas_query(customer_lat, customer_lon)
+
+        # Only chefs whose service radius covers the customer come back from the coverage subquery
+        cursor.execute(f'''
+            SELECT DISTINCT
                 c.id as chef_id,
                 c.first_name,
                 c.last_name,
@@ -116,6 +149,7 @@ def search_chefs():
                 csa.state,
                 csa.zip_code,
                 csa.service_radius_miles,
+                csa.distance_miles,
                 cp.base_rate_per_person,
                 cp.produce_supply_extra_cost,
                 cp.minimum_people,
@@ -124,61 +158,55 @@ def search_chefs():
             FROM chefs c
             JOIN chef_cuisines cc ON c.id = cc.chef_id
             JOIN cuisine_types ct ON cc.cuisine_id = ct.id
-            JOIN chef_service_areas csa ON c.id = csa.chef_id
+            JOIN ({coverage_query}) csa ON c.id = csa.chef_id
             LEFT JOIN chef_pricing cp ON c.id = cp.chef_id
             WHERE ct.name = %s
             AND (cp.minimum_people IS NULL OR cp.minimum_people <= %s)
             AND (cp.maximum_people IS NULL OR cp.maximum_people >= %s)
             GROUP BY c.id, c.first_name, c.last_name, c.email, c.phone, c.photo_url,
-                     csa.city, csa.state, csa.zip_code, csa.service_radius_miles,
+                     csa.city, csa.state, csa.zip_code, csa.service_radius_miles, csa.distance_miles,
                      cp.base_rate_per_person, cp.produce_supply_extra_cost,
                      cp.minimum_people, cp.maximum_people
-        ''', (cuisine_type, number_of_people, number_of_people))
-        
+        ''', coverage_params + [cuisine_type, number_of_people, number_of_people])
+
         chefs = cursor.fetchall()
-        
-      
+
+
         available_chefs = []
         for chef in chefs:
-      
-            chef_lat, chef_lon = get_zip_coordinates(chef['zip_code'])
-            distance = calculate_distance(customer_lat, customer_lon, chef_lat, chef_lon)
+            distance = float(chef['distance_miles'])
+            cursor.execute('''
+                SELECT COUNT(*) as conflict_count
+                FROM bookings
+                WHERE chef_id = %s 
+                AND booking_date = %s 
+                AND booking_time = %s
+                AND status NOT IN ('declined', 'cancelled')
+            ''', (chef['chef_id'], booking_date, booking_time))
             
-          
-            service_radius = chef['service_radius_miles'] or 10
-            if distance <= service_radius:
+            conflict = cursor.fetchone()
+            if conflict['conflict_count'] == 0:
 
-                cursor.execute('''
-                    SELECT COUNT(*) as conflict_count
-                    FROM bookings
-                    WHERE chef_id = %s 
-                    AND booking_date = %s 
-                    AND booking_time = %s
-                    AND status NOT IN ('declined', 'cancelled')
-                ''', (chef['chef_id'], booking_date, booking_time))
+                base_cost = (chef['base_rate_per_person'] or 50) * number_of_people
+                produce_cost = chef['produce_supply_extra_cost'] or 0
                 
-                conflict = cursor.fetchone()
-                if conflict['conflict_count'] == 0:
-
-                    base_cost = (chef['base_rate_per_person'] or 50) * number_of_people
-                    produce_cost = chef['produce_supply_extra_cost'] or 0
-                    
-                    chef_info = {
-                        'chef_id': chef['chef_id'],
-                        'name': f"{chef['first_name']} {chef['last_name']}",
-                        'email': chef['email'],
-                        'phone': chef['phone'],
-                        'photo_url': chef['photo_url'],
-                        'location': f"{chef['city']}, {chef['state']} {chef['zip_code']}",
-                        'distance_miles': round(distance, 1),
-                        'cuisines': chef['cuisines'].split(',') if chef['cuisines'] else [],
-                        'base_rate_per_person': float(chef['base_rate_per_person'] or 50),
-                        'produce_supply_extra_cost': float(produce_cost),
-                        'estimated_total_cost': float(base_cost),
-                        'min_people': chef['minimum_people'] or 1,
-                        'max_people': chef['maximum_people'] or 50
-                    }
-                    available_chefs.append(chef_info)
+                chef_info = {
+                    'chef_id': chef['chef_id'],
+                    'name': f"{chef['first_name']} {chef['last_name']}",
+                    'email': chef['email'],
+                    'phone': chef['phone'],
+                    'photo_url': chef['photo_url'],
+                    'photo_variants': image_pipeline.photo_variants(chef['photo_url']),
+                    'location': f"{chef['city']}, {chef['state']} {chef['zip_code']}",
+                    'distance_miles': round(distance, 1),
+                    'cuisines': chef['cuisines'].split(',') if chef['cuisines'] else [],
+                    'base_rate_per_person': float(chef['base_rate_per_person'] or 50),
+                    'produce_supply_extra_cost': float(produce_cost),
+                    'estimated_total_cost': float(base_cost),
+                    'min_people': chef['minimum_people'] or 1,
+                    'max_people': chef['maximum_people'] or 50
+                }
+                available_chefs.append(chef_info)
         
        
         available_chefs.sort(key=lambda x: x['distance_miles'])
@@ -228,21 +256,38 @@ def book_chef():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@booking_bp.route('/customer/<int:customer_id>/dashboard', methods=['GET'])
-def get_customer_dashboard(customer_id):
-    """Get categorized bookings for customer dashboard: previous, today's, and upcoming"""
-    try:
-        conn = get_db_connection()
-        cursor = get_cursor(conn, dictionary=True)
-        
-        # Get today's date
-        from datetime import date
-        today = date.today()
-        
-        # Base query for booking details
-        base_query = '''
-            SELECT 
-                b.id as booking_id,
+DASHBOARD_PREVIOUS_LIMIT = 20
+DASHBOARD_PREVIOUS_MAX_LIMIT = 100
+
+def load_customer_dashboard(cursor, customer_id, previous_limit=DASHBOARD_PREVIOUS_LIMIT, previous_before=None):
+    """
+    Previous, today's and upcoming bookings with counts, from one query. Previous
+    bookings are capped at previous_limit newest first; previous_before=<booking_id>
+    continues from an earlier page.
+    """
+    # Get today's date
+    from datetime import date
+    today = date.today()
+
+    # Loading older history returns only previous bookings strictly after the cursor row
+    if previous_before:
+        page_filter = '''
+            s.bucket = 'previous'
+            AND (s.booking_date, s.booking_time, s.booking_id) < (
+                SELECT booking_date, booking_time, id FROM bookings
+                WHERE id = %(before)s AND customer_id = %(customer_id)s
+            )
+        '''
+    else:
+        page_filter = 'TRUE'
+
+    # Counts come from the full scan; the chef/address/review joins only run for
+    # the rows actually returned. The LEFT JOIN keeps the counts row when the page is empty.
+    cursor.execute(f'''
+        WITH scoped AS (
+            SELECT
+                b.id AS booking_id,
+                b.customer_id,
                 b.chef_id,
                 b.booking_date,
                 b.booking_time,
@@ -254,75 +299,141 @@ def get_customer_dashboard(customer_id):
                 b.status,
                 b.total_cost,
                 b.created_at,
-                c.first_name || ' ' || c.last_name as chef_name,
-                c.email as chef_email,
-                c.phone as chef_phone,
-                c.photo_url as chef_photo,
-                ca.address_line1 as chef_address_line1,
-                ca.address_line2 as chef_address_line2,
-                ca.city as chef_city,
-                ca.state as chef_state,
-                ca.zip_code as chef_zip_code,
-                CASE WHEN cr.id IS NOT NULL THEN TRUE ELSE FALSE END as has_reviewed
+                CASE
+                    WHEN b.booking_date < %(today)s THEN 'previous'
+                    WHEN b.booking_date = %(today)s THEN 'today'
+                    ELSE 'upcoming'
+                END AS bucket
             FROM bookings b
-            LEFT JOIN chefs c ON b.chef_id = c.id
-            LEFT JOIN chef_addresses ca ON c.id = ca.chef_id AND ca.is_default = TRUE
-            LEFT JOIN chef_ratings cr ON b.id = cr.booking_id AND cr.customer_id = b.customer_id
-            WHERE b.customer_id = %s
-        '''
-        
-        # Get previous bookings (before today)
-        cursor.execute(base_query + ' AND b.booking_date < %s ORDER BY b.booking_date DESC, b.booking_time DESC', 
-                      (customer_id, today))
-        previous_bookings = cursor.fetchall()
-        
-        # Get today's bookings
-        cursor.execute(base_query + ' AND b.booking_date = %s ORDER BY b.booking_time ASC', 
-                      (customer_id, today))
-        todays_bookings = cursor.fetchall()
-        
-        # Get upcoming bookings (after today)
-        cursor.execute(base_query + ' AND b.booking_date > %s ORDER BY b.booking_date ASC, b.booking_time ASC', 
-                      (customer_id, today))
-        upcoming_bookings = cursor.fetchall()
-        
-        # Convert datetime/date objects to strings for JSON serialization
-        def format_booking_data(bookings):
-            formatted = []
-            for booking in bookings:
-                formatted_booking = dict(booking)
-                # Convert date to string
-                if formatted_booking.get('booking_date'):
-                    formatted_booking['booking_date'] = str(formatted_booking['booking_date'])
-                # Convert time to string
-                if formatted_booking.get('booking_time'):
-                    formatted_booking['booking_time'] = str(formatted_booking['booking_time'])
-                # Convert datetime to string
-                if formatted_booking.get('created_at'):
-                    formatted_booking['created_at'] = formatted_booking['created_at'].isoformat()
-                # Convert decimal to float
-                if formatted_booking.get('total_cost'):
-                    formatted_booking['total_cost'] = float(formatted_booking['total_cost'])
-                formatted.append(formatted_booking)
-            return formatted
-        
+            WHERE b.customer_id = %(customer_id)s
+        ),
+        totals AS (
+            SELECT
+                COUNT(*) FILTER (WHERE bucket = 'previous') AS previous_count,
+                COUNT(*) FILTER (WHERE bucket = 'today') AS todays_count,
+                COUNT(*) FILTER (WHERE bucket = 'upcoming') AS upcoming_count
+            FROM scoped
+        ),
+        page AS (
+            SELECT s.*, ROW_NUMBER() OVER (
+                PARTITION BY s.bucket
+                ORDER BY s.booking_date DESC, s.booking_time DESC, s.booking_id DESC
+            ) AS rn
+            FROM scoped s
+            WHERE {page_filter}
+        )
+        SELECT
+            t.previous_count,
+            t.todays_count,
+            t.upcoming_count,
+            p.booking_id,
+            p.chef_id,
+            p.booking_date,
+            p.booking_time,
+            p.cuisine_type,
+            p.meal_type,
+            p.event_type,
+            p.number_of_people,
+            p.special_notes,
+            p.status,
+            p.total_cost,
+            p.created_at,
+            p.bucket,
+            c.first_name || ' ' || c.last_name as chef_name,
+            c.email as chef_email,
+            c.phone as chef_phone,
+            c.photo_url as chef_photo,
+            ca.address_line1 as chef_address_line1,
+            ca.address_line2 as chef_address_line2,
+            ca.city as chef_city,
+            ca.state as chef_state,
+            ca.zip_code as chef_zip_code,
+            CASE WHEN cr.id IS NOT NULL THEN TRUE ELSE FALSE END as has_reviewed
+        FROM totals t
+        LEFT JOIN page p ON p.bucket <> 'previous' OR p.rn <= %(fetch_previous)s
+        LEFT JOIN chefs c ON p.chef_id = c.id
+        LEFT JOIN chef_addresses ca ON c.id = ca.chef_id AND ca.is_default = TRUE
+        LEFT JOIN chef_ratings cr ON p.booking_id = cr.booking_id AND cr.customer_id = p.customer_id
+        ORDER BY
+            CASE p.bucket WHEN 'previous' THEN 0 WHEN 'today' THEN 1 ELSE 2 END,
+            CASE WHEN p.bucket = 'previous' THEN p.rn END,
+            p.booking_date, p.booking_time, p.booking_id
+    ''', {
+        'customer_id': customer_id,
+        'today': today,
+        'before': previous_before,
+        # One extra row tells us whether older bookings remain
+        'fetch_previous': previous_limit + 1,
+    })
+    rows = cursor.fetchall()
+
+    # Bucket and convert date/time/decimal values for JSON in a single pass
+    buckets = {'previous': [], 'today': [], 'upcoming': []}
+    count_columns = ('previous_count', 'todays_count', 'upcoming_count', 'bucket')
+    for row in rows:
+        if row['booking_id'] is None:
+            continue
+        formatted_booking = {k: v for k, v in row.items() if k not in count_columns}
+        if formatted_booking.get('booking_date'):
+            formatted_booking['booking_date'] = str(formatted_booking['booking_date'])
+        if formatted_booking.get('booking_time'):
+            formatted_booking['booking_time'] = str(formatted_booking['booking_time'])
+        if formatted_booking.get('created_at'):
+            formatted_booking['created_at'] = formatted_booking['created_at'].isoformat()
+        if formatted_booking.get('total_cost'):
+            formatted_booking['total_cost'] = float(formatted_booking['total_cost'])
+        buckets[row['bucket']].append(formatted_booking)
+
+    previous_bookings = buckets['previous']
+    previous_has_more = len(previous_bookings) > previous_limit
+    previous_bookings = previous_bookings[:previous_limit]
+
+    totals = rows[0] if rows else {}
+    previous_count = totals.get('previous_count') or 0
+    todays_count = totals.get('todays_count') or 0
+    upcoming_count = totals.get('upcoming_count') or 0
+
+    return {
+        'data': {
+            'previous_bookings': previous_bookings,
+            'todays_bookings': buckets['today'],
+            'upcoming_bookings': buckets['upcoming']
+        },
+        'counts': {
+            'previous_count': previous_count,
+            'todays_count': todays_count,
+            'upcoming_count': upcoming_count,
+            'total_count': previous_count + todays_count + upcoming_count
+        },
+        'pagination': {
+            'previous_limit': previous_limit,
+            'previous_has_more': previous_has_more,
+            'previous_next_cursor': previous_bookings[-1]['booking_id'] if previous_has_more else None
+        }
+    }
+
+@booking_bp.route('/customer/<int:customer_id>/dashboard', methods=['GET'])
+def get_customer_dashboard(customer_id):
+    """
+    Get categorized bookings for customer dashboard: previous, today's, and upcoming.
+    Previous bookings are capped at previous_limit (default 20, max 100); older ones
+    are fetched with previous_before=<booking_id> from pagination.
+    """
+    try:
+        try:
+            previous_limit = int(request.args.get('previous_limit', DASHBOARD_PREVIOUS_LIMIT))
+            previous_before = request.args.get('previous_before', type=int)
+        except ValueError:
+            return jsonify({'error': 'previous_limit must be an integer'}), 400
+        previous_limit = max(1, min(previous_limit, DASHBOARD_PREVIOUS_MAX_LIMIT))
+
+        conn = get_db_connection()
+        cursor = get_cursor(conn, dictionary=True)
+        dashboard = load_customer_dashboard(cursor, customer_id, previous_limit, previous_before)
         cursor.close()
         conn.close()
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'previous_bookings': format_booking_data(previous_bookings),
-                'todays_bookings': format_booking_data(todays_bookings),
-                'upcoming_bookings': format_booking_data(upcoming_bookings)
-            },
-            'counts': {
-                'previous_count': len(previous_bookings),
-                'todays_count': len(todays_bookings),
-                'upcoming_count': len(upcoming_bookings),
-                'total_count': len(previous_bookings) + len(todays_bookings) + len(upcoming_bookings)
-            }
-        }), 200
+
+        return jsonify({'success': True, **dashboard}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -456,6 +567,59 @@ def get_customer_bookings(customer_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def load_favorite_chefs(cursor, customer_id):
+    """Customer's favorite chefs, most recently favorited first"""
+    cursor.execute('''
+        SELECT 
+            c.id as chef_id,
+            c.first_name,
+            c.last_name,
+            c.first_name || ' ' || c.last_name as full_name,
+            c.email,
+            c.phone,
+            c.photo_url,
+            STRING_AGG(ct.name, ', ' ORDER BY ct.name) as cuisines,
+            crs.average_rating,
+            crs.total_reviews,
+            --csa.city,
+            --csa.state,
+            --cp.base_rate_per_person,
+            fcf.created_at as favorited_at
+        FROM customer_favorite_chefs fcf
+        JOIN chefs c ON fcf.chef_id = c.id
+        LEFT JOIN chef_cuisines cc ON c.id = cc.chef_id
+        LEFT JOIN cuisine_types ct ON cc.cuisine_id = ct.id
+        LEFT JOIN chef_rating_summary crs ON c.id = crs.chef_id
+        --LEFT JOIN chef_service_areas csa ON c.id = csa.chef_id
+        --LEFT JOIN chef_pricing cp ON c.id = cp.chef_id
+        WHERE fcf.customer_id = %s
+        GROUP BY c.id, c.first_name, c.last_name, c.email, c.phone, c.photo_url,
+                --csa.city, csa.state, cp.base_rate_per_person,
+                fcf.created_at, crs.average_rating, crs.total_reviews
+        ORDER BY fcf.created_at DESC
+    ''', (customer_id,))
+    
+    favorite_chefs = cursor.fetchall()
+    
+    # Format data
+    formatted_chefs = []
+    for chef in favorite_chefs:
+        chef_data = dict(chef)
+        chef_data['photo_variants'] = image_pipeline.photo_variants(chef_data.get('photo_url'))
+        if chef_data.get('favorited_at'):
+            chef_data['favorited_at'] = chef_data['favorited_at'].isoformat()
+        if chef_data.get('cuisines'):
+            chef_data['cuisines'] = chef_data['cuisines'].split(',')
+        if chef_data.get('base_rate_per_person'):
+            chef_data['base_rate_per_person'] = float(chef_data['base_rate_per_person'])
+        chef_data['rating'] = {
+                'average_rating': round(float(chef['average_rating']), 2) if chef['average_rating'] else None,
+                'total_reviews': chef['total_reviews'] or 0
+            }
+        formatted_chefs.append(chef_data)
+
+    return formatted_chefs
+
 @booking_bp.route('/customer/<int:customer_id>/favorite-chefs', methods=['GET'])
 def get_favorite_chefs(customer_id):
     """Get customer's favorite chefs"""
@@ -463,53 +627,7 @@ def get_favorite_chefs(customer_id):
         conn = get_db_connection()
         cursor = get_cursor(conn, dictionary=True)
         
-        cursor.execute('''
-            SELECT 
-                c.id as chef_id,
-                c.first_name,
-                c.last_name,
-                c.first_name || ' ' || c.last_name as full_name,
-                c.email,
-                c.phone,
-                c.photo_url,
-                STRING_AGG(ct.name, ', ' ORDER BY ct.name) as cuisines,
-                crs.average_rating,
-                crs.total_reviews,
-                --csa.city,
-                --csa.state,
-                --cp.base_rate_per_person,
-                fcf.created_at as favorited_at
-            FROM customer_favorite_chefs fcf
-            JOIN chefs c ON fcf.chef_id = c.id
-            LEFT JOIN chef_cuisines cc ON c.id = cc.chef_id
-            LEFT JOIN cuisine_types ct ON cc.cuisine_id = ct.id
-            LEFT JOIN chef_rating_summary crs ON c.id = crs.chef_id
-            --LEFT JOIN chef_service_areas csa ON c.id = csa.chef_id
-            --LEFT JOIN chef_pricing cp ON c.id = cp.chef_id
-            WHERE fcf.customer_id = %s
-            GROUP BY c.id, c.first_name, c.last_name, c.email, c.phone, c.photo_url,
-                    --csa.city, csa.state, cp.base_rate_per_person,
-                    fcf.created_at, crs.average_rating, crs.total_reviews
-            ORDER BY fcf.created_at DESC
-        ''', (customer_id,))
-        
-        favorite_chefs = cursor.fetchall()
-        
-        # Format data
-        formatted_chefs = []
-        for chef in favorite_chefs:
-            chef_data = dict(chef)
-            if chef_data.get('favorited_at'):
-                chef_data['favorited_at'] = chef_data['favorited_at'].isoformat()
-            if chef_data.get('cuisines'):
-                chef_data['cuisines'] = chef_data['cuisines'].split(',')
-            if chef_data.get('base_rate_per_person'):
-                chef_data['base_rate_per_person'] = float(chef_data['base_rate_per_person'])
-            chef_data['rating'] = {
-                    'average_rating': round(float(chef['average_rating']), 2) if chef['average_rating'] else None,
-                    'total_reviews': chef['total_reviews'] or 0
-                }
-            formatted_chefs.append(chef_data)
+        formatted_chefs = load_favorite_chefs(cursor, customer_id)
         
         cursor.close()
         conn.close()
@@ -588,6 +706,58 @@ def remove_favorite_chef(customer_id, chef_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def load_recent_chefs(cursor, customer_id, limit=10):
+    """Chefs the customer most recently completed bookings with"""
+    cursor.execute('''
+        SELECT DISTINCT
+            c.id as chef_id,
+            c.first_name,
+            c.last_name,
+            c.first_name || ' ' || c.last_name as chef_name,
+            c.email,
+            c.phone,
+            c.photo_url,
+            STRING_AGG(ct.name, ', ' ORDER BY ct.name) as cuisines,
+            AVG(cr.rating) as average_rating,
+            COUNT(cr.rating) as total_reviews,
+            csa.city,
+            csa.state,
+            cp.base_rate_per_person,
+            MAX(b.booking_date) as last_completed_date,
+            COUNT(DISTINCT b.id) as completed_bookings
+        FROM bookings b
+        JOIN chefs c ON b.chef_id = c.id
+        LEFT JOIN chef_cuisines cc ON c.id = cc.chef_id
+        LEFT JOIN cuisine_types ct ON cc.cuisine_id = ct.id
+        LEFT JOIN chef_ratings cr ON c.id = cr.chef_id
+        LEFT JOIN chef_service_areas csa ON c.id = csa.chef_id
+        LEFT JOIN chef_pricing cp ON c.id = cp.chef_id
+        WHERE b.customer_id = %s AND b.chef_id IS NOT NULL AND b.status = 'completed'
+        GROUP BY c.id, c.first_name, c.last_name, c.email, c.phone, c.photo_url,
+                 csa.city, csa.state, cp.base_rate_per_person
+        ORDER BY MAX(b.booking_date) DESC, MAX(b.booking_time) DESC
+        LIMIT %s
+    ''', (customer_id, limit))
+    
+    recent_chefs = cursor.fetchall()
+    
+    # Format data
+    formatted_chefs = []
+    for chef in recent_chefs:
+        chef_data = dict(chef)
+        chef_data['photo_variants'] = image_pipeline.photo_variants(chef_data.get('photo_url'))
+        if chef_data.get('last_completed_date'):
+            chef_data['last_completed_date'] = str(chef_data['last_completed_date'])
+        if chef_data.get('cuisines'):
+            chef_data['cuisines'] = chef_data['cuisines'].split(',')
+        if chef_data.get('average_rating'):
+            chef_data['average_rating'] = round(float(chef_data['average_rating']), 2)
+        if chef_data.get('base_rate_per_person'):
+            chef_data['base_rate_per_person'] = float(chef_data['base_rate_per_person'])
+        formatted_chefs.append(chef_data)
+
+    return formatted_chefs
+
 @booking_bp.route('/customer/<int:customer_id>/recent-chefs', methods=['GET'])
 def get_recent_chefs(customer_id):
     """Get chefs the customer has recently completed appointments with"""
@@ -596,53 +766,7 @@ def get_recent_chefs(customer_id):
         cursor = get_cursor(conn, dictionary=True)
         
         limit = request.args.get('limit', 10, type=int)
-        
-        cursor.execute('''
-            SELECT DISTINCT
-                c.id as chef_id,
-                c.first_name,
-                c.last_name,
-                c.first_name || ' ' || c.last_name as chef_name,
-                c.email,
-                c.phone,
-                c.photo_url,
-                STRING_AGG(ct.name, ', ' ORDER BY ct.name) as cuisines,
-                AVG(cr.rating) as average_rating,
-                COUNT(cr.rating) as total_reviews,
-                csa.city,
-                csa.state,
-                cp.base_rate_per_person,
-                MAX(b.booking_date) as last_completed_date,
-                COUNT(DISTINCT b.id) as completed_bookings
-            FROM bookings b
-            JOIN chefs c ON b.chef_id = c.id
-            LEFT JOIN chef_cuisines cc ON c.id = cc.chef_id
-            LEFT JOIN cuisine_types ct ON cc.cuisine_id = ct.id
-            LEFT JOIN chef_ratings cr ON c.id = cr.chef_id
-            LEFT JOIN chef_service_areas csa ON c.id = csa.chef_id
-            LEFT JOIN chef_pricing cp ON c.id = cp.chef_id
-            WHERE b.customer_id = %s AND b.chef_id IS NOT NULL AND b.status = 'completed'
-            GROUP BY c.id, c.first_name, c.last_name, c.email, c.phone, c.photo_url,
-                     csa.city, csa.state, cp.base_rate_per_person
-            ORDER BY MAX(b.booking_date) DESC, MAX(b.booking_time) DESC
-            LIMIT %s
-        ''', (customer_id, limit))
-        
-        recent_chefs = cursor.fetchall()
-        
-        # Format data
-        formatted_chefs = []
-        for chef in recent_chefs:
-            chef_data = dict(chef)
-            if chef_data.get('last_completed_date'):
-                chef_data['last_completed_date'] = str(chef_data['last_completed_date'])
-            if chef_data.get('cuisines'):
-                chef_data['cuisines'] = chef_data['cuisines'].split(',')
-            if chef_data.get('average_rating'):
-                chef_data['average_rating'] = round(float(chef_data['average_rating']), 2)
-            if chef_data.get('base_rate_per_person'):
-                chef_data['base_rate_per_person'] = float(chef_data['base_rate_per_person'])
-            formatted_chefs.append(chef_data)
+        formatted_chefs = load_recent_chefs(cursor, customer_id, limit)
         
         cursor.close()
         conn.close()
@@ -679,9 +803,11 @@ def get_nearby_chefs(customer_id):
             return jsonify({'error': 'Customer address not found'}), 404
         
         customer_lat, customer_lon = get_zip_coordinates(customer_address['zip_code'])
-        
-        cursor.execute('''
-            SELECT 
+
+        coverage_query, coverage_params = covering_service_areas_query(customer_lat, customer_lon)
+
+        cursor.execute(f'''
+            SELECT
                 c.id as chef_id,
                 c.first_name,
                 c.last_name,
@@ -696,41 +822,35 @@ def get_nearby_chefs(customer_id):
                 csa.state,
                 csa.zip_code,
                 csa.service_radius_miles,
+                csa.distance_miles,
                 cp.base_rate_per_person
             FROM chefs c
             LEFT JOIN chef_cuisines cc ON c.id = cc.chef_id
             LEFT JOIN cuisine_types ct ON cc.cuisine_id = ct.id
             LEFT JOIN chef_ratings cr ON c.id = cr.chef_id
-            JOIN chef_service_areas csa ON c.id = csa.chef_id
+            JOIN ({coverage_query}) csa ON c.id = csa.chef_id
             LEFT JOIN chef_pricing cp ON c.id = cp.chef_id
+            WHERE csa.distance_miles <= %s
             GROUP BY c.id, c.first_name, c.last_name, c.email, c.phone, c.photo_url,
-                     csa.city, csa.state, csa.zip_code, csa.service_radius_miles, cp.base_rate_per_person
-        ''')
-        
-        all_chefs = cursor.fetchall()
-        
-        # Calculate distances and filter
+                     csa.city, csa.state, csa.zip_code, csa.service_radius_miles, csa.distance_miles,
+                     cp.base_rate_per_person
+            ORDER BY csa.distance_miles
+            LIMIT %s
+        ''', coverage_params + [max_distance, limit])
+
+        # Customer is within each chef's service radius and within max_distance
         nearby_chefs = []
-        for chef in all_chefs:
-            chef_lat, chef_lon = get_zip_coordinates(chef['zip_code'])
-            distance = calculate_distance(customer_lat, customer_lon, chef_lat, chef_lon)
-            
-            # Check if customer is within chef's service radius and within max_distance
-            service_radius = chef['service_radius_miles'] or 10
-            if distance <= min(service_radius, max_distance):
-                chef_data = dict(chef)
-                chef_data['distance_miles'] = round(distance, 1)
-                if chef_data.get('cuisines'):
-                    chef_data['cuisines'] = chef_data['cuisines'].split(',')
-                if chef_data.get('average_rating'):
-                    chef_data['average_rating'] = round(float(chef_data['average_rating']), 2)
-                if chef_data.get('base_rate_per_person'):
-                    chef_data['base_rate_per_person'] = float(chef_data['base_rate_per_person'])
-                nearby_chefs.append(chef_data)
-        
-        # Sort by distance
-        nearby_chefs.sort(key=lambda x: x['distance_miles'])
-        nearby_chefs = nearby_chefs[:limit]
+        for chef in cursor.fetchall():
+            chef_data = dict(chef)
+            chef_data['photo_variants'] = image_pipeline.photo_variants(chef_data.get('photo_url'))
+            chef_data['distance_miles'] = round(float(chef_data['distance_miles']), 1)
+            if chef_data.get('cuisines'):
+                chef_data['cuisines'] = chef_data['cuisines'].split(',')
+            if chef_data.get('average_rating'):
+                chef_data['average_rating'] = round(float(chef_data['average_rating']), 2)
+            if chef_data.get('base_rate_per_person'):
+                chef_data['base_rate_per_person'] = float(chef_data['base_rate_per_person'])
+            nearby_chefs.append(chef_data)
         
         cursor.close()
         conn.close()
@@ -935,12 +1055,13 @@ def update_booking_status(booking_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Calendar endpoints: bookings with derived duration_minutes (MAX prep_time per chef+cuisine)
+# Calendar endpoints: bookings with duration_minutes/ends_at stored at write time
+# (MAX prep_time per chef+cuisine, see migration add_booking_duration_columns)
 @booking_bp.route('/customer/<int:customer_id>/calendar', methods=['GET'])
 def calendar_for_customer(customer_id: int):
     """
-    Return customer's bookings within a date range, including duration_minutes
-    derived from chef_menu_items.prep_time (max per cuisine/chef). Fallback 60.
+    Return customer's bookings within a date range, including the stored
+    duration_minutes (max chef_menu_items.prep_time per cuisine/chef, fallback 60).
     Query params: start=YYYY-MM-DD, end=YYYY-MM-DD (inclusive).
     """
     start = request.args.get("start")
@@ -968,16 +1089,11 @@ def calendar_for_customer(customer_id: int):
               b.special_notes,
               b.cuisine_type,
               b.meal_type,
-              COALESCE(MAX(cmi.prep_time), 60) AS duration_minutes
+              COALESCE(b.duration_minutes, 60) AS duration_minutes,
+              b.ends_at
             FROM bookings b
-            LEFT JOIN chef_menu_items cmi
-              ON cmi.chef_id = b.chef_id
-             AND (b.cuisine_type IS NULL OR cmi.cuisine_type = b.cuisine_type)
             WHERE b.customer_id = %s
               AND b.booking_date BETWEEN %s AND %s
-            GROUP BY
-              b.id, b.customer_id, b.chef_id, b.booking_date, b.booking_time, b.status,
-              b.special_notes, b.cuisine_type, b.meal_type
             ORDER BY b.booking_date, b.booking_time
             """,
             (customer_id, start_d, end_d),
@@ -1005,6 +1121,7 @@ def calendar_for_customer(customer_id: int):
                 "cuisine_type": r.get("cuisine_type"),
                 "meal_type": r.get("meal_type"),
                 "duration_minutes": int(r.get("duration_minutes") or 60),
+                "ends_at": r["ends_at"].isoformat() if r.get("ends_at") else None,
             })
 
         return jsonify({"success": True, "data": data})
@@ -1020,8 +1137,8 @@ def calendar_for_customer(customer_id: int):
 @booking_bp.route('/chef/<int:chef_id>/calendar', methods=['GET'])
 def calendar_for_chef(chef_id: int):
     """
-    Return chef's bookings within a date range, including duration_minutes
-    derived from chef_menu_items.prep_time (max per cuisine/chef). Fallback 60.
+    Return chef's bookings within a date range, including the stored
+    duration_minutes (max chef_menu_items.prep_time per cuisine/chef, fallback 60).
     Query params: start=YYYY-MM-DD, end=YYYY-MM-DD (inclusive).
     """
     start = request.args.get("start")
@@ -1049,16 +1166,11 @@ def calendar_for_chef(chef_id: int):
               b.special_notes,
               b.cuisine_type,
               b.meal_type,
-              COALESCE(MAX(cmi.prep_time), 60) AS duration_minutes
+              COALESCE(b.duration_minutes, 60) AS duration_minutes,
+              b.ends_at
             FROM bookings b
-            LEFT JOIN chef_menu_items cmi
-              ON cmi.chef_id = b.chef_id
-             AND (b.cuisine_type IS NULL OR cmi.cuisine_type = b.cuisine_type)
             WHERE b.chef_id = %s
               AND b.booking_date BETWEEN %s AND %s
-            GROUP BY
-              b.id, b.customer_id, b.chef_id, b.booking_date, b.booking_time, b.status,
-              b.special_notes, b.cuisine_type, b.meal_type
             ORDER BY b.booking_date, b.booking_time
             """,
             (chef_id, start_d, end_d),
@@ -1086,6 +1198,7 @@ def calendar_for_chef(chef_id: int):
                 "cuisine_type": r.get("cuisine_type"),
                 "meal_type": r.get("meal_type"),
                 "duration_minutes": int(r.get("duration_minutes") or 60),
+                "ends_at": r["ends_at"].isoformat() if r.get("ends_at") else None,
             })
 
         return jsonify({"success": True, "data": data})
@@ -0,0 +1,102 @@
+from flask import Blueprint, Response, current_app, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import hashlib
+
+from database.db_helper import pooled_connection, get_cursor
+from blueprints.auth_bp import load_user_profile
+from blueprints.booking_bp import load_customer_dashboard, load_favorite_chefs, load_recent_chefs
+from blueprints.chat_bp import load_conversations
+
+bootstrap_bp = Blueprint('bootstrap_bp', __name__)
+
+# Sections run in parallel, each on its own pooled connection
+bootstrap_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='bootstrap')
+
+# Payloads smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+
+def run_section(loader, *args):
+    with pooled_connection() as conn:
+        cursor = get_cursor(conn, dictionary=True)
+        try:
+            return loader(cursor, *args)
+        finally:
+            cursor.close()
+
+
+def section_version(data):
+    """Content hash of a section; the client echoes it back to skip unchanged sections"""
+    return hashlib.sha1(current_app.json.dumps(data).encode('utf-8')).hexdigest()[:16]
+
+
+def parse_known_versions(raw):
+    """known=profile:ab12,dashboard:cd34 -> {'profile': 'ab12', 'dashboard': 'cd34'}"""
+    known = {}
+    for item in (raw or '').split(','):
+        name, _, version = item.partition(':')
+        if name and version:
+            known[name.strip()] = version.strip()
+    return known
+
+
+@bootstrap_bp.route('/bootstrap', methods=['GET'])
+def bootstrap():
+    """
+    First-screen data for app launch in one round trip: profile, conversations and,
+    for customers, dashboard, favorite and recent chefs.
+    Query params: user_id (required), known=<section>:<version>,... from a previous launch.
+    Sections whose version still matches come back as {'version', 'unchanged': true}.
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'user_id is required'}), 400
+    known = parse_known_versions(request.args.get('known'))
+
+    try:
+        profile = run_section(load_user_profile, user_id)
+        if profile is None:
+            return jsonify({'error': 'User not found'}), 404
+
+        futures = {}
+        profile_id = profile.get('profile_id')
+        if profile['user_type'] == 'customer' and profile_id:
+            futures['conversations'] = bootstrap_executor.submit(
+                run_section, load_conversations, None, profile_id)
+            futures['dashboard'] = bootstrap_executor.submit(
+                run_section, load_customer_dashboard, profile_id)
+            futures['favorite_chefs'] = bootstrap_executor.submit(
+                run_section, load_favorite_chefs, profile_id)
+            futures['recent_chefs'] = bootstrap_executor.submit(
+                run_section, load_recent_chefs, profile_id)
+        elif profile['user_type'] == 'chef' and profile_id:
+            futures['conversations'] = bootstrap_executor.submit(
+                run_section, load_conversations, profile_id, None)
+
+        results = {'profile': profile}
+        sections = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # One failing section should not cost the client the whole launch payload
+                sections[name] = {'error': str(e)}
+
+        for name, data in results.items():
+            version = section_version(data)
+            if known.get(name) == version:
+                sections[name] = {'version': version, 'unchanged': True}
+            else:
+                sections[name] = {'version': version, 'data': data}
+
+        body = current_app.json.dumps({'success': True, 'sections': sections}).encode('utf-8')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    response = Response(body, mimetype='application/json')
+    if len(body) >= MIN_COMPRESS_BYTES and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
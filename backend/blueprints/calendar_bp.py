@@ -1,53 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for
 from datetime import datetime, timedelta
-import os, json, time, requests
+import os, time
 
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from database.db_helper import get_db_connection, get_cursor
+from services import google_calendar_sync, google_tokens, http_client, ics_feed, ics_import
+from blueprints.stripe_payment_bp import token_required
 
 calendar_bp = Blueprint('calendar_bp', __name__)
 
-TOKEN_DIR = os.path.join(os.path.dirname(__file__), '..', 'static', 'google_tokens')
-os.makedirs(TOKEN_DIR, exist_ok=True)
-
 GOOGLE_TOKEN_ENDPOINT = 'https://oauth2.googleapis.com/token'
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')       # Web client ID
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')  # Web client secret
 
-def token_path(user_id: str):
-    return os.path.join(TOKEN_DIR, f'{user_id}.json')
-
-def load_tokens(user_id: str):
-    p = token_path(user_id)
-    if not os.path.exists(p):
-        return None
-    with open(p, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def save_tokens(user_id: str, tok: dict):
-    with open(token_path(user_id), 'w', encoding='utf-8') as f:
-        json.dump(tok, f)
-
-def ensure_access_token(user_id: str):
-    data = load_tokens(user_id)
-    if not data:
-        return None, 'Not connected'
-    # Refresh if expired (pad 60s)
-    if data.get('expires_at', 0) <= time.time() + 60:
-        r = requests.post(GOOGLE_TOKEN_ENDPOINT, data={
-            'client_id': GOOGLE_CLIENT_ID,
-            'client_secret': GOOGLE_CLIENT_SECRET,
-            'grant_type': 'refresh_token',
-            'refresh_token': data.get('refresh_token'),
-        }, timeout=15)
-        if r.status_code != 200:
-            return None, f"Refresh failed: {r.text}"
-        nd = r.json()
-        data['access_token'] = nd['access_token']
-        data['expires_at'] = time.time() + int(nd.get('expires_in', 3600))
-        save_tokens(user_id, data)
-    return data, None
-
 @calendar_bp.route('/google/exchange', methods=['POST'])
 def google_exchange():
     body = request.get_json(silent=True) or {}
@@ -62,14 +26,14 @@ def google_exchange():
         return jsonify({'error': 'Server missing GOOGLE_CLIENT_ID/SECRET'}), 500
 
     # Exchange authorization code for tokens
-    r = requests.post(GOOGLE_TOKEN_ENDPOINT, data={
+    r = http_client.request('google', 'POST', GOOGLE_TOKEN_ENDPOINT, data={
         'client_id': GOOGLE_CLIENT_ID,
         'client_secret': GOOGLE_CLIENT_SECRET,
         'grant_type': 'authorization_code',
         'code': code,
         'code_verifier': code_verifier,
         'redirect_uri': redirect_uri,
-    }, timeout=20)
+    })
 
     if r.status_code != 200:
         return jsonify({'error': 'Exchange failed', 'detail': r.text}), 400
@@ -83,60 +47,119 @@ def google_exchange():
         'token_type': tok.get('token_type'),
         'expires_at': time.time() + int(tok.get('expires_in', 3600)),
     }
-    save_tokens(user_id, stored)
+    google_tokens.save_tokens(user_id, stored)
     return jsonify({'success': True})
 
 @calendar_bp.route('/google/sync', methods=['GET'])
 def google_sync():
     user_id = request.args.get('user_id', '').strip()
-    days = int(request.args.get('days', '30'))
+    days = request.args.get('days', 30, type=int)
     if not user_id:
         return jsonify({'error': 'user_id required'}), 400
+    if days is None or days < 1:
+        return jsonify({'error': 'days must be a positive integer'}), 400
 
-    data, err = ensure_access_token(user_id)
-    if err:
-        return jsonify({'error': err}), 400
-
-    creds = Credentials(
-        token=data['access_token'],
-        refresh_token=data.get('refresh_token'),
-        token_uri=GOOGLE_TOKEN_ENDPOINT,
-        client_id=GOOGLE_CLIENT_ID,
-        client_secret=GOOGLE_CLIENT_SECRET,
-        scopes=['https://www.googleapis.com/auth/calendar.readonly'],
-    )
-
-    service = build('calendar', 'v3', credentials=creds)
+    # Answer from the local copy; when it is stale, Google is asked for changes in the
+    # background and the next read sees them
     now = datetime.utcnow()
-    time_min = now.isoformat() + 'Z'
-    time_max = (now + timedelta(days=days)).isoformat() + 'Z'
-
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=time_min,
-        timeMax=time_max,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
+    try:
+        if not google_tokens.load_tokens(user_id):
+            return jsonify({'error': 'Not connected'}), 400
+
+        conn = get_db_connection()
+        cursor = get_cursor(conn, dictionary=True)
+        try:
+            status = google_calendar_sync.get_sync_status(cursor, user_id)
+            blocks = google_calendar_sync.get_busy_blocks(cursor, user_id, now, now + timedelta(days=days))
+        finally:
+            cursor.close()
+            conn.close()
+    except Exception as e:
+        return jsonify({'error': f'Failed to read Google busy time: {e}'}), 500
+
+    refreshing = status is None or status['stale']
+    if refreshing:
+        google_calendar_sync.request_sync(user_id)
+    result = {
+        'last_synced_at': status['last_synced_at'].isoformat() if status and status['last_synced_at'] else None,
+        'last_error': status['last_error'] if status else None,
+        'refreshing': refreshing,
+    }
 
-    events = events_result.get('items', [])
-    # TODO: upsert events into the bookings database
-    return jsonify({'success': True, 'count': len(events), 'events': events})
+    events = [{
+        'id': block['external_id'],
+        'source': block['source'],
+        'summary': block['summary'],
+        'start': block['starts_at'].isoformat() + 'Z',
+        'end': block['ends_at'].isoformat() + 'Z',
+        'all_day': block['all_day'],
+    } for block in blocks]
+    return jsonify({'success': True, 'count': len(events), 'events': events, 'sync': result})
 
 @calendar_bp.route('/ics/upload', methods=['POST'])
 def ics_upload():
-    # Simple .ics import; parse events and return count; not integrated yet
-    from icalendar import Calendar
+    # Streams the upload into external_busy_blocks, replacing the user's previous .ics import
+    user_id = (request.form.get('user_id') or '').strip()
+    if not user_id:
+        return jsonify({'error': 'user_id required'}), 400
     if 'ics' not in request.files:
         return jsonify({'error': 'ics file required'}), 400
     f = request.files['ics']
+
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
     try:
-        cal = Calendar.from_ical(f.read())
-        count = 0
-        for comp in cal.walk():
-            if comp.name == "VEVENT":
-                count += 1
-                # TODO: upsert each VEVENT into your DB
-        return jsonify({'success': True, 'imported': count})
+        stats = ics_import.import_ics(conn, cursor, user_id, f.stream)
+        return jsonify({'success': True, **stats})
     except Exception as e:
-        return jsonify({'error': f'Failed to parse .ics: {e}'}), 400
\ No newline at end of file
+        conn.rollback()
+        return jsonify({'error': f'Failed to import .ics: {e}'}), 400
+    finally:
+        cursor.close()
+        conn.close()
+
+@calendar_bp.route('/feed-url', methods=['GET'])
+@token_required
+def calendar_feed_url(current_user_id, user_type):
+    # The signed-in chef's or customer's subscription URL; the feed itself needs no login
+    if user_type not in ics_feed.OWNER_TABLES:
+        return jsonify({'error': 'type must be chef or customer'}), 403
+
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        cursor.execute(f'SELECT {user_type}_id AS owner_id FROM users WHERE id = %s', (current_user_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    if not row or not row['owner_id']:
+        return jsonify({'error': f'{user_type.capitalize()} not found'}), 404
+
+    token = ics_feed.feed_token(user_type, row['owner_id'])
+    return jsonify({'feed_url': url_for('calendar_bp.calendar_feed', token=token, _external=True)})
+
+@calendar_bp.route('/feed/<token>.ics', methods=['GET'])
+def calendar_feed(token):
+    # Subscription feed for calendar apps; unchanged feeds cost one lookup and a 304
+    owner = ics_feed.parse_feed_token(token)
+    if owner is None:
+        return jsonify({'error': 'Feed not found'}), 404
+    owner_type, owner_id = owner
+
+    version = ics_feed.current_version(owner_type, owner_id)
+    if version is None:
+        return jsonify({'error': f'{owner_type.capitalize()} not found'}), 404
+
+    etag = ics_feed.feed_etag(owner_type, owner_id, version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = ics_feed.get_cached_feed(owner_type, owner_id, version)
+        if body is None:
+            body = ics_feed.generate_feed(owner_type, owner_id, version)
+        response = Response(body, mimetype='text/calendar')
+    response.set_etag(etag)
+    # Clients may keep the feed but must revalidate, which the ETag makes cheap
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
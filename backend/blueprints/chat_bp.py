@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from database.config import db_config
 from database.db_helper import get_db_connection, get_cursor, handle_db_error
+from services import image_pipeline
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/api/chat")
 
@@ -234,6 +235,76 @@ def list_contacts():
         conn.close()
 
 
+def load_conversations(cursor, chef_id=None, customer_id=None):
+    """Active conversations for a chef or a customer, newest first, with last message and unread count"""
+    if chef_id:
+        # Unread = customer messages the chef has not read
+        cursor.execute("""
+            SELECT 
+                c.id as chat_id,
+                c.customer_id,
+                cu.first_name as customer_first_name,
+                cu.last_name as customer_last_name,
+                cu.email as customer_email,
+                c.booking_id,
+                c.last_message_at,
+                cu.photo_url,
+                (
+                    SELECT cm.message_text 
+                    FROM chat_messages cm 
+                    WHERE cm.chat_id = c.id 
+                    ORDER BY cm.sent_at DESC 
+                    LIMIT 1
+                ) as last_message,
+                (
+                    SELECT COUNT(*) 
+                    FROM chat_messages cm 
+                    WHERE cm.chat_id = c.id 
+                      AND cm.sender_type = 'customer' 
+                      AND cm.is_read = FALSE
+                ) as unread_count
+            FROM chats c
+            JOIN customers cu ON c.customer_id = cu.id
+            WHERE c.chef_id = %s AND c.status = 'active'
+            ORDER BY c.last_message_at DESC
+        """, (chef_id,))
+    else:
+        # Unread = chef messages the customer has not read
+        cursor.execute("""
+            SELECT 
+                c.id as chat_id,
+                c.chef_id,
+                ch.first_name as chef_first_name,
+                ch.last_name as chef_last_name,
+                ch.email as chef_email,
+                c.booking_id,
+                c.last_message_at,
+                ch.photo_url,
+                (
+                    SELECT cm.message_text 
+                    FROM chat_messages cm 
+                    WHERE cm.chat_id = c.id 
+                    ORDER BY cm.sent_at DESC 
+                    LIMIT 1
+                ) as last_message,
+                (
+                    SELECT COUNT(*) 
+                    FROM chat_messages cm 
+                    WHERE cm.chat_id = c.id 
+                      AND cm.sender_type = 'chef' 
+                      AND cm.is_read = FALSE
+                ) as unread_count
+            FROM chats c
+            JOIN chefs ch ON c.chef_id = ch.id
+            WHERE c.customer_id = %s AND c.status = 'active'
+            ORDER BY c.last_message_at DESC
+        """, (customer_id,))
+    conversations = cursor.fetchall()
+    for conversation in conversations:
+        conversation['photo_variants'] = image_pipeline.photo_variants(conversation['photo_url'])
+    return conversations
+
+
 # Get recent conversations for a user (chef or customer)
 @chat_bp.route('/conversations', methods=['GET'])
 def get_conversations():
@@ -258,78 +329,8 @@ def get_conversations():
     try:
         conn = get_db_connection()
         
-        if chef_id:
-            print(f"Looking up chef {chef_id}")
-            
-            # Get conversations for a chef
-            cursor = get_cursor(conn, dictionary=True)                    
-            
-            cursor.execute("""
-                SELECT 
-                    c.id as chat_id,
-                    c.customer_id,
-                    cu.first_name as customer_first_name,
-                    cu.last_name as customer_last_name,
-                    cu.email as customer_email,
-                    c.booking_id,
-                    c.last_message_at,
-                    cu.photo_url,
-                    (
-                        SELECT cm.message_text 
-                        FROM chat_messages cm 
-                        WHERE cm.chat_id = c.id 
-                        ORDER BY cm.sent_at DESC 
-                        LIMIT 1
-                    ) as last_message,
-                    (
-                        SELECT COUNT(*) 
-                        FROM chat_messages cm 
-                        WHERE cm.chat_id = c.id 
-                          AND cm.sender_type = 'customer' 
-                          AND cm.is_read = FALSE
-                    ) as unread_count
-                FROM chats c
-                JOIN customers cu ON c.customer_id = cu.id
-                WHERE c.chef_id = %s AND c.status = 'active'
-                ORDER BY c.last_message_at DESC
-            """, (chef_id,))
-        else:
-            print("=== CUSTOMER BRANCH ===")
-            print(f"Looking up customer {customer_id}")
-
-            # Get conversations for a customer
-            cursor = get_cursor(conn, dictionary=True)
-            cursor.execute("""
-                SELECT 
-                    c.id as chat_id,
-                    c.chef_id,
-                    ch.first_name as chef_first_name,
-                    ch.last_name as chef_last_name,
-                    ch.email as chef_email,
-                    c.booking_id,
-                    c.last_message_at,
-                    ch.photo_url,
-                    (
-                        SELECT cm.message_text 
-                        FROM chat_messages cm 
-                        WHERE cm.chat_id = c.id 
-                        ORDER BY cm.sent_at DESC 
-                        LIMIT 1
-                    ) as last_message,
-                    (
-                        SELECT COUNT(*) 
-                        FROM chat_messages cm 
-                        WHERE cm.chat_id = c.id 
-                          AND cm.sender_type = 'chef' 
-                          AND cm.is_read = FALSE
-                    ) as unread_count
-                FROM chats c
-                JOIN chefs ch ON c.chef_id = ch.id
-                WHERE c.customer_id = %s AND c.status = 'active'
-                ORDER BY c.last_message_at DESC
-            """, (customer_id,))
-
-        conversations = cursor.fetchall()
+        cursor = get_cursor(conn, dictionary=True)
+        conversations = load_conversations(cursor, chef_id=chef_id, customer_id=customer_id)
         print(f"Found {len(conversations)} conversations")
         return jsonify(conversations), 200
 
@@ -3,10 +3,9 @@ Blueprint for chef menu management
 """
 from flask import Blueprint, request, jsonify
 import psycopg2
-import os
-from werkzeug.utils import secure_filename
 from database.config import db_config
-from database.db_helper import get_db_connection
+from database.db_helper import get_db_connection, apply_display_order
+from services import image_pipeline
 
 menu_bp = Blueprint('menu', __name__, url_prefix='/api/menu')
 
@@ -51,6 +50,7 @@ def get_chef_menu(chef_id):
                 'dish_name': row[2],
                 'description': row[3],
                 'photo_url': row[4],
+                'photo_variants': image_pipeline.photo_variants(row[4]),
                 'servings': row[5],
                 'cuisine_type': row[6],
                 'dietary_info': row[7],
@@ -104,6 +104,7 @@ def get_menu_item(item_id):
             'dish_name': row[2],
             'description': row[3],
             'photo_url': row[4],
+            'photo_variants': image_pipeline.photo_variants(row[4]),
             'servings': row[5],
             'cuisine_type': row[6],
             'dietary_info': row[7],
@@ -316,6 +317,7 @@ def get_featured_dishes(chef_id):
                 'dish_name': row[2],
                 'description': row[3],
                 'photo_url': row[4],
+                'photo_variants': image_pipeline.photo_variants(row[4]),
                 'servings': row[5],
                 'cuisine_type': row[6],
                 'dietary_info': row[7],
@@ -383,6 +385,53 @@ def set_featured_dishes(chef_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@menu_bp.route('/chef/<int:chef_id>/reorder', methods=['POST'])
+def reorder_menu_items(chef_id):
+    """Set the display order of a chef's menu items from an array of item IDs"""
+    try:
+        data = request.get_json()
+        item_order = data.get('item_order') if data else None
+        
+        if not isinstance(item_order, list) or not all(isinstance(item_id, int) for item_id in item_order):
+            return jsonify({
+                'success': False,
+                'error': 'item_order must be an array of menu item IDs'
+            }), 400
+        if len(set(item_order)) != len(item_order):
+            return jsonify({
+                'success': False,
+                'error': 'item_order contains duplicate menu item IDs'
+            }), 400
+        
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+        
+        # The whole ordering is applied in one statement, however long the menu
+        found_items = apply_display_order(cursor, 'chef_menu_items', item_order, {'chef_id': chef_id})
+        invalid_items = set(item_order) - found_items
+        
+        if invalid_items:
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return jsonify({
+                'success': False,
+                'error': 'Invalid menu item IDs found',
+                'invalid_ids': list(invalid_items)
+            }), 400
+        
+        conn.commit()
+        cursor.close()
+        conn.close()
+        
+        return jsonify({
+            'success': True,
+            'message': f'Menu reordered ({len(item_order)} items)'
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ==================== Menu Categories Management ====================
 
 @menu_bp.route('/chef/<int:chef_id>/categories', methods=['GET'])
@@ -619,25 +668,13 @@ def upload_menu_item_photo():
         if photo.filename == '':
             return jsonify({'error': 'No selected file'}), 400
         
-        # Ensure directory exists
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        photo_dir = os.path.join(base_dir, 'static', 'menu_photos')
-        os.makedirs(photo_dir, exist_ok=True)
-        
-        # Generate unique filename
-        import time
-        timestamp = int(time.time())
-        extension = photo.filename.rsplit('.', 1)[-1]
-        filename = secure_filename(f"menu_{timestamp}.{extension}")
-        filepath = os.path.join(photo_dir, filename)
+        # Variants are generated off the request thread; their content-addressed URLs are final already
+        photo_url, variants = image_pipeline.store_upload(photo)
         
-        # Save photo
-        photo.save(filepath)
-        
-        photo_url = f"/static/menu_photos/{filename}"
-        
-        return jsonify({'photo_url': photo_url}), 200
+        return jsonify({'photo_url': photo_url, 'variants': variants, 'processing': True}), 200
         
+    except image_pipeline.InvalidImageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -651,16 +688,7 @@ def upload_item_photo(item_id):
         if photo.filename == '':
             return jsonify({'error': 'No selected file'}), 400
 
-        # Ensure directory exists (use absolute path)
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        photo_dir = os.path.join(base_dir, 'static', 'item_photos')
-        os.makedirs(photo_dir, exist_ok=True)
-
-        filename = secure_filename(f"item_{item_id}.{photo.filename.rsplit('.', 1)[-1]}")
-        filepath = os.path.join(photo_dir, filename)
-        photo.save(filepath)
-
-        photo_url = f"/static/item_photos/{filename}"
+        photo_url, variants = image_pipeline.store_upload(photo)
 
         # Update photo_url in database
         conn = get_db_connection()
@@ -670,6 +698,8 @@ def upload_item_photo(item_id):
         cursor.close()
         conn.close()
 
-        return jsonify({'photo_url': photo_url}), 200
+        return jsonify({'photo_url': photo_url, 'variants': variants, 'processing': True}), 200
+    except image_pipeline.InvalidImageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import execute_values
+from werkzeug.exceptions import RequestEntityTooLarge
 from database.config import db_config
-from database.db_helper import get_db_connection, get_cursor, handle_db_error
+from database.db_helper import get_db_connection, get_cursor, handle_db_error, apply_display_order
 import re
-import os
-import time
-from werkzeug.utils import secure_filename
+from services import image_pipeline, photo_store, reference_data
 
 # Create the blueprint
 profile_bp = Blueprint('profile', __name__)
@@ -200,6 +201,7 @@ def get_chef_profile(chef_id):
             
             photo_data = {
                 'photo_url': photo['photo_url'],
+                'photo_variants': image_pipeline.photo_variants(photo['photo_url']),
                 'photo_title': photo['photo_title'],
                 'photo_description': photo['photo_description'],
                 'is_featured': photo['is_featured'],
@@ -214,6 +216,7 @@ def get_chef_profile(chef_id):
             'first_name': chef_profile['first_name'],
             'last_name': chef_profile['last_name'],
             'photo_url': chef_profile['photo_url'],
+            'photo_variants': image_pipeline.photo_variants(chef_profile['photo_url']),
             'description': chef_profile['description'],
             'meal_timings': chef_profile['meal_timings'] if chef_profile['meal_timings'] else [],
             'residency': residency,
@@ -402,6 +405,7 @@ def get_chef_public_profile(chef_id):
             
             photo_data = {
                 'photo_url': photo['photo_url'],
+                'photo_variants': image_pipeline.photo_variants(photo['photo_url']),
                 'photo_title': photo['photo_title'],
                 'photo_description': photo['photo_description'],
                 'is_featured': photo['is_featured'],
@@ -416,6 +420,7 @@ def get_chef_public_profile(chef_id):
             'first_name': chef_profile['first_name'],
             'last_name': chef_profile['last_name'],
             'photo_url': chef_profile['photo_url'],
+            'photo_variants': image_pipeline.photo_variants(chef_profile['photo_url']),
             'description': chef_profile['description'],
             'meal_timings': chef_profile['meal_timings'] if chef_profile['meal_timings'] else [],
             'public_location': public_location,
@@ -606,23 +611,20 @@ def update_chef_cuisines(chef_id):
             conn.close()
             return jsonify({'error': 'Chef not found'}), 404
         
-        # Delete existing cuisines
-        cursor.execute('DELETE FROM chef_cuisines WHERE chef_id = %s', (chef_id,))
+        # Unknown names are skipped, as before
+        cuisine_ids = reference_data.cuisine_ids(cuisine_names)
         
-        # Add new cuisines
-        for cuisine_name in cuisine_names:
-            # Get cuisine_id from cuisine_types table
-            cursor.execute('SELECT id FROM cuisine_types WHERE name = %s', (cuisine_name,))
-            cuisine_result = cursor.fetchone()
-            
-            if cuisine_result:
-                cuisine_id = cuisine_result[0]
-                # Insert into chef_cuisines
-                cursor.execute('''
-                    INSERT INTO chef_cuisines (chef_id, cuisine_id)
-                    VALUES (%s, %s)
-                    ON CONFLICT (chef_id, cuisine_id) DO NOTHING
-                ''', (chef_id, cuisine_id))
+        # Apply only the difference, so an unchanged list writes nothing and the
+        # search index triggers on chef_cuisines do not fire
+        cursor.execute('''
+            DELETE FROM chef_cuisines
+            WHERE chef_id = %s AND NOT (cuisine_id = ANY(%s::int[]))
+        ''', (chef_id, cuisine_ids))
+        cursor.execute('''
+            INSERT INTO chef_cuisines (chef_id, cuisine_id)
+            SELECT %s, unnest(%s::int[])
+            ON CONFLICT (chef_id, cuisine_id) DO NOTHING
+        ''', (chef_id, cuisine_ids))
         
         conn.commit()
         cursor.close()
@@ -637,14 +639,7 @@ def update_chef_cuisines(chef_id):
 def get_all_cuisines():
     """Get all available cuisine types"""
     try:
-        conn = get_db_connection()
-        cursor = get_cursor(conn, dictionary=True)
-        
-        cursor.execute('SELECT id, name FROM cuisine_types ORDER BY name')
-        cuisines = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        cuisines = reference_data.cuisine_types()
         
         cuisine_list = [{'id': c['id'], 'name': c['name']} for c in cuisines]
         
@@ -702,6 +697,7 @@ def get_customer_profile(customer_id):
             'email': customer_profile['email'],
             'phone': customer_profile['phone'],
             'photo_url': customer_profile['photo_url'],
+            'photo_variants': image_pipeline.photo_variants(customer_profile['photo_url']),
             'allergy_notes': customer_profile['allergy_notes'],
             'residency': residency,
             'full_address': {
@@ -866,16 +862,7 @@ def upload_customer_photo(customer_id):
         if photo.filename == '':
             return jsonify({'error': 'No selected file'}), 400
 
-        # Ensure directory exists (use absolute path)
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        photo_dir = os.path.join(base_dir, 'static', 'profile_photos')
-        os.makedirs(photo_dir, exist_ok=True)
-
-        filename = secure_filename(f"profile_customer{customer_id}.{photo.filename.rsplit('.', 1)[-1]}")
-        filepath = os.path.join(photo_dir, filename)
-        photo.save(filepath)
-
-        photo_url = f"/static/profile_photos/{filename}"
+        photo_url, variants = image_pipeline.store_upload(photo)
 
         # Update photo_url in database
         conn = get_db_connection()
@@ -885,7 +872,9 @@ def upload_customer_photo(customer_id):
         cursor.close()
         conn.close()
 
-        return jsonify({'photo_url': photo_url}), 200
+        return jsonify({'photo_url': photo_url, 'variants': variants, 'processing': True}), 200
+    except image_pipeline.InvalidImageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -899,16 +888,7 @@ def upload_chef_photo(chef_id):
         if photo.filename == '':
             return jsonify({'error': 'No selected file'}), 400
 
-        # Ensure directory exists (use absolute path)
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        photo_dir = os.path.join(base_dir, 'static', 'profile_photos')
-        os.makedirs(photo_dir, exist_ok=True)
-
-        filename = secure_filename(f"profile_chef{chef_id}.{photo.filename.rsplit('.', 1)[-1]}")
-        filepath = os.path.join(photo_dir, filename)
-        photo.save(filepath)
-
-        photo_url = f"/static/profile_photos/{filename}"
+        photo_url, variants = image_pipeline.store_upload(photo)
 
         # Update photo_url in database
         conn = get_db_connection()
@@ -918,7 +898,9 @@ def upload_chef_photo(chef_id):
         cursor.close()
         conn.close()
 
-        return jsonify({'photo_url': photo_url}), 200
+        return jsonify({'photo_url': photo_url, 'variants': variants, 'processing': True}), 200
+    except image_pipeline.InvalidImageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -939,7 +921,8 @@ def get_chef_photo(chef_id):
         if result:
             photo_url = result[0]
             if photo_url:
-                return jsonify({'chef_id': chef_id, 'photo_url': photo_url}), 200
+                return jsonify({'chef_id': chef_id, 'photo_url': photo_url,
+                                'photo_variants': image_pipeline.photo_variants(photo_url)}), 200
             else:
                 return jsonify({'chef_id': chef_id, 'photo_url': None, 'message': 'No photo uploaded yet'}), 200
         else:
@@ -949,6 +932,27 @@ def get_chef_photo(chef_id):
         print(f"Error fetching photo for chef {chef_id}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+MAX_PHOTO_STATUS_URLS = 50
+
+@profile_bp.route('/photos/status', methods=['GET'])
+def get_photo_status():
+    """
+    Processing status of uploaded photos: ?url=<photo_url>&url=...
+    Uploads return before their variants exist; clients poll this until each photo is
+    'ready', or show the error if it is 'failed' and ask for a new upload.
+    """
+    photo_urls = request.args.getlist('url')
+    if not photo_urls:
+        return jsonify({'error': 'At least one url is required'}), 400
+    if len(photo_urls) > MAX_PHOTO_STATUS_URLS:
+        return jsonify({'error': f'At most {MAX_PHOTO_STATUS_URLS} urls per request'}), 400
+
+    try:
+        return jsonify({'photos': photo_store.processing_status(photo_urls)}), 200
+    except Exception as e:
+        print(f"Error fetching photo status: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @profile_bp.route('/chef/<int:chef_id>/rating', methods=['POST'])
 def add_chef_rating():
     data = request.get_json()
@@ -984,135 +988,141 @@ def add_chef_rating():
 
 # ============= Chef Cuisine Photos Management =============
 
+# Limit: Max 10 photos per cuisine type, max 50 total photos per chef
+MAX_PHOTOS_PER_CUISINE = 10
+MAX_TOTAL_PHOTOS_PER_CHEF = 50
+
+# Files of one multi-photo upload are hashed and written in parallel
+photo_upload_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='photo-upload')
+
+
+def cuisine_photo_limit_error(cursor, chef_id, cuisine_type, new_photos_count):
+    """
+    Check the per-cuisine and per-chef photo limits for an upload of new_photos_count.
+    Returns (error_response, max_order): error_response is None when the upload fits,
+    max_order is the cuisine's highest display order.
+    """
+    # Current counts and the cuisine's highest display order in one pass
+    cursor.execute('''
+        SELECT
+          COUNT(*) AS total_count,
+          COUNT(*) FILTER (WHERE cuisine_type = %s) AS cuisine_count,
+          COALESCE(MAX(display_order) FILTER (WHERE cuisine_type = %s), 0) AS max_order
+        FROM chef_cuisine_photos
+        WHERE chef_id = %s
+    ''', (cuisine_type, cuisine_type, chef_id))
+    current_total_count, current_cuisine_count, max_order = cursor.fetchone()
+
+    if current_cuisine_count + new_photos_count > MAX_PHOTOS_PER_CUISINE:
+        return (jsonify({
+            'error': f'Photo limit exceeded for {cuisine_type} cuisine. Maximum {MAX_PHOTOS_PER_CUISINE} photos allowed per cuisine type.',
+            'current_count': current_cuisine_count,
+            'max_allowed': MAX_PHOTOS_PER_CUISINE,
+            'trying_to_add': new_photos_count
+        }), 400), max_order
+
+    if current_total_count + new_photos_count > MAX_TOTAL_PHOTOS_PER_CHEF:
+        return (jsonify({
+            'error': f'Total photo limit exceeded. Maximum {MAX_TOTAL_PHOTOS_PER_CHEF} photos allowed per chef.',
+            'current_total': current_total_count,
+            'max_allowed': MAX_TOTAL_PHOTOS_PER_CHEF,
+            'trying_to_add': new_photos_count
+        }), 400), max_order
+
+    return None, max_order
+
 @profile_bp.route('/chef/<int:chef_id>/cuisine-photos', methods=['POST'])
 def upload_chef_cuisine_photos(chef_id):
     """Upload cuisine photos for chef"""
     try:
-        # Check if chef exists
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id FROM chefs WHERE id = %s', (chef_id,))
-        if not cursor.fetchone():
-            cursor.close()
-            conn.close()
-            return jsonify({'error': 'Chef not found'}), 404
+        # Parse the body ourselves so files stream to disk and oversized ones abort early
+        try:
+            form, files = image_pipeline.parse_photo_form(request.environ, MAX_PHOTOS_PER_CUISINE)
+        except RequestEntityTooLarge as e:
+            return jsonify({'error': e.description}), 413
 
         # Get form data
-        cuisine_type = request.form.get('cuisine_type', '').strip()
-        photo_title = request.form.get('photo_title', '').strip()
-        photo_description = request.form.get('photo_description', '').strip()
-        is_featured = request.form.get('is_featured', '').lower() == 'true'
+        cuisine_type = form.get('cuisine_type', '').strip()
+        photo_title = form.get('photo_title', '').strip()
+        photo_description = form.get('photo_description', '').strip()
+        is_featured = form.get('is_featured', '').lower() == 'true'
 
         if not cuisine_type:
-            cursor.close()
-            conn.close()
             return jsonify({'error': 'Cuisine type is required'}), 400
 
-        # Check current photo limits
-        # Limit: Max 10 photos per cuisine type, max 50 total photos per chef
-        MAX_PHOTOS_PER_CUISINE = 10
-        MAX_TOTAL_PHOTOS_PER_CHEF = 50
-        
-        # Check current photo count for this cuisine
-        cursor.execute('''
-            SELECT COUNT(*) as cuisine_count 
-            FROM chef_cuisine_photos 
-            WHERE chef_id = %s AND cuisine_type = %s
-        ''', (chef_id, cuisine_type))
-        current_cuisine_count = cursor.fetchone()[0]
-        
-        # Check total photo count for chef
-        cursor.execute('''
-            SELECT COUNT(*) as total_count 
-            FROM chef_cuisine_photos 
-            WHERE chef_id = %s
-        ''', (chef_id,))
-        current_total_count = cursor.fetchone()[0]
-        
         # Check for uploaded photos
-        uploaded_photos = []
-        photo_files = request.files.getlist('photos')  # Support multiple photos
-        
-        if not photo_files or all(f.filename == '' for f in photo_files):
-            cursor.close()
-            conn.close()
+        photo_files = [f for f in files.getlist('photos') if f and f.filename != '']  # Support multiple photos
+        if not photo_files:
             return jsonify({'error': 'At least one photo is required'}), 400
-        
-        # Check if adding new photos would exceed limits
-        new_photos_count = len([f for f in photo_files if f.filename != ''])
-        
-        if current_cuisine_count + new_photos_count > MAX_PHOTOS_PER_CUISINE:
-            cursor.close()
-            conn.close()
-            return jsonify({
-                'error': f'Photo limit exceeded for {cuisine_type} cuisine. Maximum {MAX_PHOTOS_PER_CUISINE} photos allowed per cuisine type.',
-                'current_count': current_cuisine_count,
-                'max_allowed': MAX_PHOTOS_PER_CUISINE,
-                'trying_to_add': new_photos_count
-            }), 400
-        
-        if current_total_count + new_photos_count > MAX_TOTAL_PHOTOS_PER_CHEF:
+
+        # Reject by content before any work is done; extensions alone are easy to fake
+        for photo in photo_files:
+            file_extension = image_pipeline.file_extension(photo.filename)
+            if file_extension not in image_pipeline.ALLOWED_EXTENSIONS:
+                return jsonify({'error': f'Invalid file type: {file_extension}. Allowed: jpg, jpeg, png, gif, webp'}), 400
+            if image_pipeline.sniff_image_type(photo.stream) is None:
+                return jsonify({'error': f'{photo.filename}: file content is not a JPEG, PNG, GIF or WebP image'}), 400
+
+        new_photos_count = len(photo_files)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            # Unlocked pre-check, so an upload that is sure to be rejected is not processed
+            cursor.execute('SELECT id FROM chefs WHERE id = %s', (chef_id,))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Chef not found'}), 404
+            limit_error = cuisine_photo_limit_error(cursor, chef_id, cuisine_type, new_photos_count)[0]
+            if limit_error:
+                return limit_error
+            # Nothing is held while the files are hashed and processed
+            conn.rollback()
+
+            # Process all photos at once; results come back in upload order. Photos of an
+            # upload rejected below stay unreferenced and are collected by the photo GC.
+            futures = [photo_upload_executor.submit(image_pipeline.store_upload, photo) for photo in photo_files]
+            stored = []
+            for photo, future in zip(photo_files, futures):
+                try:
+                    stored.append(future.result())
+                except image_pipeline.InvalidImageError as e:
+                    return jsonify({'error': f'{photo.filename}: {e}'}), 400
+
+            # Lock the chef row so concurrent uploads see each other's counts and display orders
+            cursor.execute('SELECT id FROM chefs WHERE id = %s FOR UPDATE', (chef_id,))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Chef not found'}), 404
+            limit_error, max_order = cuisine_photo_limit_error(cursor, chef_id, cuisine_type, new_photos_count)
+            if limit_error:
+                return limit_error
+
+            # Insert all photo records in one statement (PostgreSQL with RETURNING)
+            rows = [
+                (chef_id, cuisine_type, photo_url, photo_title, photo_description, is_featured, max_order + 1 + i)
+                for i, (photo_url, _) in enumerate(stored)
+            ]
+            photo_ids = execute_values(cursor, '''
+                INSERT INTO chef_cuisine_photos
+                (chef_id, cuisine_type, photo_url, photo_title, photo_description, is_featured, display_order)
+                VALUES %s RETURNING id
+            ''', rows, fetch=True)
+
+            uploaded_photos = [{
+                'photo_id': photo_id[0],
+                'photo_url': photo_url,
+                'variants': variants,
+                'cuisine_type': cuisine_type,
+                'photo_title': photo_title,
+                'photo_description': photo_description,
+                'is_featured': is_featured,
+                'display_order': row[6]
+            } for photo_id, (photo_url, variants), row in zip(photo_ids, stored, rows)]
+
+            conn.commit()
+        finally:
+            # Returning early leaves the transaction open; closing rolls it back
             cursor.close()
             conn.close()
-            return jsonify({
-                'error': f'Total photo limit exceeded. Maximum {MAX_TOTAL_PHOTOS_PER_CHEF} photos allowed per chef.',
-                'current_total': current_total_count,
-                'max_allowed': MAX_TOTAL_PHOTOS_PER_CHEF,
-                'trying_to_add': new_photos_count
-            }), 400
-
-        # Create directory if it doesn't exist (use absolute path)
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        cuisine_photos_dir = os.path.join(base_dir, 'static', 'cuisine_photos')
-        os.makedirs(cuisine_photos_dir, exist_ok=True)
-
-        # Process each photo
-        for i, photo in enumerate(photo_files):
-            if photo and photo.filename != '':
-                # Generate unique filename
-                file_extension = photo.filename.rsplit('.', 1)[-1].lower()
-                if file_extension not in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
-                    cursor.close()
-                    conn.close()
-                    return jsonify({'error': f'Invalid file type: {file_extension}. Allowed: jpg, jpeg, png, gif, webp'}), 400
-
-                timestamp = int(time.time())
-                filename = secure_filename(f"chef{chef_id}_cuisine_{cuisine_type.replace(' ', '_')}_{timestamp}_{i}.{file_extension}")
-                filepath = os.path.join(cuisine_photos_dir, filename)
-                photo.save(filepath)
-
-                photo_url = f"/static/cuisine_photos/{filename}"
-                
-                # Get display order (find max + 1)
-                cursor.execute('''
-                    SELECT MAX(display_order) as max_order 
-                    FROM chef_cuisine_photos 
-                    WHERE chef_id = %s AND cuisine_type = %s
-                ''', (chef_id, cuisine_type))
-                result = cursor.fetchone()
-                display_order = (result[0] or 0) + 1 + i
-
-                # Insert photo record (PostgreSQL with RETURNING)
-                cursor.execute('''
-                    INSERT INTO chef_cuisine_photos 
-                    (chef_id, cuisine_type, photo_url, photo_title, photo_description, is_featured, display_order)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
-                ''', (chef_id, cuisine_type, photo_url, photo_title, photo_description, is_featured, display_order))
-                photo_id = cursor.fetchone()[0]
-
-                uploaded_photos.append({
-                    'photo_id': photo_id,
-                    'photo_url': photo_url,
-                    'cuisine_type': cuisine_type,
-                    'photo_title': photo_title,
-                    'photo_description': photo_description,
-                    'is_featured': is_featured,
-                    'display_order': display_order
-                })
-
-        conn.commit()
-        cursor.close()
-        conn.close()
 
         return jsonify({
             'message': f'Successfully uploaded {len(uploaded_photos)} cuisine photos',
@@ -1157,6 +1167,7 @@ def get_chef_cuisine_photos(chef_id):
             photo_data = {
                 'photo_id': photo['id'],
                 'photo_url': photo['photo_url'],
+                'photo_variants': image_pipeline.photo_variants(photo['photo_url']),
                 'photo_title': photo['photo_title'],
                 'photo_description': photo['photo_description'],
                 'is_featured': photo['is_featured'],
@@ -1268,14 +1279,8 @@ def delete_cuisine_photo(chef_id, photo_id):
             WHERE id = %s AND chef_id = %s
         ''', (photo_id, chef_id))
         
-        # Delete physical file
-        try:
-            if photo[0] and photo[0].startswith('/static/'):
-                file_path = photo[0][1:]  # Remove leading slash
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-        except:
-            pass  # Don't fail if file deletion fails
+        # Delete physical files (all variants); never fails the request
+        image_pipeline.delete_photo_files(photo[0])
         
         conn.commit()
         cursor.close()
@@ -1367,52 +1372,40 @@ def reorder_cuisine_photos(chef_id):
         cuisine_type = data['cuisine_type']
         photo_order = data['photo_order']  # Array of photo_ids in desired order
         
-        if not isinstance(photo_order, list):
+        if not isinstance(photo_order, list) or not all(isinstance(pid, int) for pid in photo_order):
             return jsonify({'error': 'photo_order must be an array of photo IDs'}), 400
+        if len(set(photo_order)) != len(photo_order):
+            return jsonify({'error': 'photo_order contains duplicate photo IDs'}), 400
         
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Verify chef exists
-        cursor.execute('SELECT id FROM chefs WHERE id = %s', (chef_id,))
-        if not cursor.fetchone():
+        # Apply the whole ordering in one statement; photos outside the chef's cuisine are not touched
+        found_photos = apply_display_order(cursor, 'chef_cuisine_photos', photo_order,
+                                           {'chef_id': chef_id, 'cuisine_type': cuisine_type})
+        invalid_photos = set(photo_order) - found_photos
+        
+        if invalid_photos or not photo_order:
+            conn.rollback()
+            # Verify chef exists
+            cursor.execute('SELECT id FROM chefs WHERE id = %s', (chef_id,))
+            chef_exists = cursor.fetchone() is not None
             cursor.close()
             conn.close()
-            return jsonify({'error': 'Chef not found'}), 404
-        
-        # Verify all photos belong to chef and cuisine type
-        if photo_order:
-            placeholders = ','.join(['%s'] * len(photo_order))
-            cursor.execute(f'''
-                SELECT id FROM chef_cuisine_photos 
-                WHERE chef_id = %s AND cuisine_type = %s AND id IN ({placeholders})
-            ''', [chef_id, cuisine_type] + photo_order)
-            
-            found_photos = {row[0] for row in cursor.fetchall()}
-            invalid_photos = set(photo_order) - found_photos
-            
+            if not chef_exists:
+                return jsonify({'error': 'Chef not found'}), 404
             if invalid_photos:
-                cursor.close()
-                conn.close()
                 return jsonify({
                     'error': 'Invalid photo IDs found',
                     'invalid_ids': list(invalid_photos)
                 }), 400
+        else:
+            conn.commit()
+            cursor.close()
+            conn.close()
         
-        # Update display_order for each photo
-        updated_photos = []
-        for index, photo_id in enumerate(photo_order):
-            new_order = index + 1
-            cursor.execute('''
-                UPDATE chef_cuisine_photos 
-                SET display_order = %s, updated_at = NOW()
-                WHERE id = %s AND chef_id = %s
-            ''', (new_order, photo_id, chef_id))
-            updated_photos.append({'photo_id': photo_id, 'new_order': new_order})
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        updated_photos = [{'photo_id': photo_id, 'new_order': index + 1}
+                          for index, photo_id in enumerate(photo_order)]
         
         return jsonify({
             'message': f'Successfully reordered {len(updated_photos)} photos for {cuisine_type}',
@@ -1439,31 +1432,24 @@ def move_photo_position(chef_id, photo_id):
         conn = get_db_connection()
         cursor = get_cursor(conn, dictionary=True)
         
-        # Get photo info
+        # Get the photo and the current order of its cuisine type in one query
         cursor.execute('''
-            SELECT cuisine_type, display_order 
-            FROM chef_cuisine_photos 
-            WHERE id = %s AND chef_id = %s
+            SELECT p.id, p.display_order, p.cuisine_type
+            FROM chef_cuisine_photos target
+            JOIN chef_cuisine_photos p
+              ON p.chef_id = target.chef_id AND p.cuisine_type = target.cuisine_type
+            WHERE target.id = %s AND target.chef_id = %s
+            ORDER BY p.display_order ASC, p.created_at ASC
         ''', (photo_id, chef_id))
         
-        photo_info = cursor.fetchone()
-        if not photo_info:
+        all_photos = cursor.fetchall()
+        if not all_photos:
             cursor.close()
             conn.close()
             return jsonify({'error': 'Photo not found'}), 404
         
-        cuisine_type = photo_info['cuisine_type']
-        current_position = photo_info['display_order']
-        
-        # Get all photos in this cuisine type ordered by display_order
-        cursor.execute('''
-            SELECT id, display_order 
-            FROM chef_cuisine_photos 
-            WHERE chef_id = %s AND cuisine_type = %s
-            ORDER BY display_order ASC, created_at ASC
-        ''', (chef_id, cuisine_type))
-        
-        all_photos = cursor.fetchall()
+        cuisine_type = all_photos[0]['cuisine_type']
+        current_position = next(p['display_order'] for p in all_photos if p['id'] == photo_id)
         
         if new_position > len(all_photos):
             new_position = len(all_photos)
@@ -1477,13 +1463,8 @@ def move_photo_position(chef_id, photo_id):
         # Insert at new position (convert to 0-based index)
         photo_ids.insert(new_position - 1, photo_id)
         
-        # Update all photos with new display_order
-        for index, pid in enumerate(photo_ids):
-            cursor.execute('''
-                UPDATE chef_cuisine_photos 
-                SET display_order = %s, updated_at = NOW()
-                WHERE id = %s
-            ''', (index + 1, pid))
+        # One UPDATE renumbers the cuisine; only photos whose position changed are written
+        apply_display_order(cursor, 'chef_cuisine_photos', photo_ids, {'chef_id': chef_id})
         
         conn.commit()
         cursor.close()
@@ -1548,50 +1529,60 @@ def toggle_photo_featured(chef_id, photo_id):
 #route for chef to update their availability status
 @profile_bp.route('/chef/<int:chef_id>/availability', methods=['PUT'])
 def update_chef_availability(chef_id):
-    """Update chef's availability status"""
+    """
+    Update chef's weekly schedule.
+    Expects {'availability': {'monday': [{'meal_type', 'start_time', 'end_time'}, ...], ...}}
+    with times in 'HH:MM:SS' format.
+    """
     try:
         data = request.get_json()
-        '''if not data or 'is_available' not in data:
-            return jsonify({'error': 'is_available field is required'}), 400
-        
-        is_available = data['is_available']
-        if not isinstance(is_available, bool):
-            return jsonify({'error': 'is_available must be a boolean value'}), 400'''
         
         if not data or 'availability' not in data:
             return jsonify({'error': 'Availability data required'}), 400
 
         availability = data['availability']
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        #clear chef's current schedule from availability days table
-        cursor.execute('DELETE FROM chef_availability_days WHERE chef_id = %s', (chef_id,))
-
-        #insert updated availability into table
-        for day_info in availability:
-            day_of_week = day_info.get('day_of_week')
-            meal_type = day_info.get('meal_type')
-            start_time = day_info.get('start_time')  # Expecting 'HH:MM:SS' format 
-            end_time = day_info.get('end_time')      # Expecting 'HH:MM:SS' format 
-
-        for day, type in availability.items():
-            if day.lower() not in ['monday','tuesday','wednesday','thursday','friday','saturday','sunday']:
+        if not isinstance(availability, dict):
+            return jsonify({'error': 'Availability must map days of the week to shifts'}), 400
+
+        # One shift per (day, meal) - the table's unique_shifts constraint; later entries win
+        shifts = {}
+        for day, day_shifts in availability.items():
+            day_of_week = day.lower()
+            if day_of_week not in ['monday','tuesday','wednesday','thursday','friday','saturday','sunday']:
                 continue  # skip invalid days
-            for t in type:
+            for t in day_shifts or []:
                 meal_type = t.get('meal_type')
                 start_time = t.get('start_time')
-                end_time = t.get('end_time')   
-            
+                end_time = t.get('end_time')
+
                 if not(meal_type and start_time and end_time):
                     continue  # skip incomplete entries
-                
-                #inserts new schedule for chef to chef_availability_days table
-                cursor.execute('''
-                    INSERT INTO chef_availability_days (chef_id, day_of_week, start_time, end_time, meal_type)
-                    VALUES (%s, %s, %s, %s, %s)
-                ''', (chef_id, day_of_week, start_time, end_time, meal_type))
+                shifts[(day_of_week, meal_type)] = (start_time, end_time)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Apply the difference against the current schedule: drop shifts that are gone,
+        # then upsert the rest. Shifts whose times did not change are not rewritten
+        cursor.execute('''
+            DELETE FROM chef_availability_days
+            WHERE chef_id = %s
+              AND (day_of_week, meal_type) NOT IN (
+                  SELECT * FROM unnest(%s::text[], %s::text[])
+              )
+        ''', (chef_id, [day for day, _ in shifts], [meal for _, meal in shifts]))
+
+        if shifts:
+            execute_values(cursor, '''
+                INSERT INTO chef_availability_days (chef_id, day_of_week, meal_type, start_time, end_time)
+                VALUES %s
+                ON CONFLICT (chef_id, day_of_week, meal_type) DO UPDATE SET
+                    start_time = EXCLUDED.start_time,
+                    end_time = EXCLUDED.end_time
+                WHERE (chef_availability_days.start_time, chef_availability_days.end_time)
+                      IS DISTINCT FROM (EXCLUDED.start_time, EXCLUDED.end_time)
+            ''', [(chef_id, day, meal, start, end) for (day, meal), (start, end) in shifts.items()],
+                template='(%s, %s, %s, %s::time, %s::time)')
         
         conn.commit()
         cursor.close()
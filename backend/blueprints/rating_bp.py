@@ -30,8 +30,6 @@ def add_chef_rating(chef_id):
             INSERT INTO chef_rating (chef_id, customer_id, booking_id, rating, comment)
             VALUES (%s, %s, %s, %s, %s)
         ''', (chef_id, customer_id, booking_id, rating, review))
-        
-        conn.commit()
 
         cursor.execute('''
             UPDATE bookings
@@ -1,18 +1,327 @@
 from flask import Blueprint, request, jsonify
+from itsdangerous import URLSafeSerializer, BadSignature
+import math
+import os
 from database.config import db_config
 from database.db_helper import get_db_connection, get_cursor, handle_db_error
+from services import image_pipeline, reference_data
 
 # Create the search blueprint
 search_bp = Blueprint('search', __name__)
 
+EARTH_RADIUS_MILES = 3959
+MILES_PER_DEGREE_LAT = 69.0
+
+# Great-circle distance from the search point to a chef_search_index row.
+# LEAST/GREATEST keep acos inside its domain when the two points coincide.
+DISTANCE_SQL = f'''
+    ({EARTH_RADIUS_MILES} * acos(LEAST(1.0, GREATEST(-1.0,
+        cos(radians(%s)) * cos(radians(csi.latitude)) *
+        cos(radians(csi.longitude) - radians(%s)) +
+        sin(radians(%s)) * sin(radians(csi.latitude))))))
+'''
+
+# (column, direction) sort keys per sort_by; chef_id ASC breaks ties.
+# NULLs are ranked as +Infinity, which is where Postgres puts them by default
+# (last ascending, first descending), so the keys stay comparable for keyset paging.
+SORT_KEYS = {
+    'distance': [('distance_miles', 'ASC'), ('average_rating', 'DESC'), ('total_reviews', 'DESC')],
+    'rating': [('average_rating', 'DESC'), ('total_reviews', 'DESC'), ('distance_miles', 'ASC')],
+    'price': [('base_rate_per_person', 'ASC'), ('distance_miles', 'ASC'), ('average_rating', 'DESC')],
+    'reviews': [('total_reviews', 'DESC'), ('average_rating', 'DESC'), ('distance_miles', 'ASC')],
+}
+
+MAX_PAGE_SIZE = 100
+
+# Page cursors are signed, so any worker can serve the next page without shared state.
+# A guessable key would let clients forge cursors, so there is no default.
+SEARCH_CURSOR_SECRET = os.getenv('SEARCH_CURSOR_SECRET')
+if not SEARCH_CURSOR_SECRET:
+    raise RuntimeError('SEARCH_CURSOR_SECRET is not set')
+search_cursor_serializer = URLSafeSerializer(SEARCH_CURSOR_SECRET, salt='chef-search-cursor')
+
+
+def bounding_box(latitude, longitude, radius_miles):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) enclosing a radius around a point.
+    Used as an index-friendly prefilter before the exact distance check.
+    """
+    lat_delta = radius_miles / MILES_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    lon_delta = radius_miles / (MILES_PER_DEGREE_LAT * cos_lat)
+    return (latitude - lat_delta, latitude + lat_delta,
+            longitude - lon_delta, longitude + lon_delta)
+
+
+GENDERS = ('male', 'female', 'other', 'prefer_not_to_say')
+MEAL_TIMINGS = ('breakfast', 'lunch', 'dinner')
+
+
+def search_filters(cuisine='', gender='', timing='', min_rating=None, max_price=None):
+    """
+    SQL conditions over a chef_search_index row for the filters that have a facet.
+    Returns {facet: (condition, params)} for the filters that are set.
+    """
+    filters = {}
+
+    if gender and gender in GENDERS:
+        filters['gender'] = ('gender = %s', [gender])
+
+    if timing and timing in MEAL_TIMINGS:
+        filters['meal_timing'] = ('%s = ANY(available_meal_types)', [timing])
+
+    if cuisine:
+        filters['cuisine'] = ("array_to_string(cuisine_names, ', ') ILIKE %s", [f'%{cuisine}%'])
+
+    if min_rating is not None and min_rating > 0:
+        # Use COALESCE to treat NULL ratings as 0
+        filters['rating'] = ('COALESCE(average_rating, 0) >= %s', [min_rating])
+
+    if max_price is not None:
+        filters['price'] = ('(base_rate_per_person IS NULL OR base_rate_per_person <= %s)', [max_price])
+
+    return filters
+
+
+def build_candidate_query(customer_lat, customer_lon, radius, chef_name='', cuisine='',
+                          gender='', timing='', min_rating=None, max_price=None):
+    """
+    Build the nearby-search candidate scan over chef_search_index.
+    Returns (query, params); the query yields every index column plus distance_miles
+    for chefs within the radius that match the given filters.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(customer_lat, customer_lon, radius)
+    params = [customer_lat, customer_lon, customer_lat, min_lat, max_lat, min_lon, max_lon]
+
+    query = f'''
+        SELECT csi.*, {DISTANCE_SQL} AS distance_miles
+        FROM chef_search_index csi
+        WHERE csi.latitude BETWEEN %s AND %s
+          AND csi.longitude BETWEEN %s AND %s
+    '''
+
+    # searchQuery matches chef names AND cuisine types (search_text is lowercased)
+    if chef_name:
+        query += ' AND csi.search_text LIKE %s'
+        params.append(f'%{chef_name.lower()}%')
+
+    for condition, filter_params in search_filters(cuisine, gender, timing, min_rating, max_price).values():
+        query += f' AND {condition}'
+        params.extend(filter_params)
+
+    query = f'''
+        SELECT * FROM ({query}) candidates
+        WHERE distance_miles <= %s
+    '''
+    params.append(radius)
+
+    return query, params
+
+
+def format_search_result(chef):
+    """Convert a chef_search_index row (with distance_miles and photo_url) into the API shape"""
+    return {
+        'chef_id': chef['chef_id'],
+        'first_name': chef['first_name'],
+        'last_name': chef['last_name'],
+        'full_name': f"{chef['first_name']} {chef['last_name']}",
+        'email': chef['email'],
+        'phone': chef['phone'],
+        'gender': chef['gender'],
+        'meal_timings': chef['meal_timings'] if chef['meal_timings'] else [],
+        'photo_url': chef.get('photo_url'),
+        'photo_variants': image_pipeline.photo_variants(chef.get('photo_url')),
+
+        # Distance information
+        'distance_miles': round(float(chef['distance_miles']), 1) if chef['distance_miles'] is not None else None,
+
+        # Location information
+        'location': {
+            'street_address': chef['street_address'],
+            'city': chef['city'],
+            'state': chef['state'],
+            'zip_code': chef['zip_code'],
+            'latitude': float(chef['latitude']) if chef['latitude'] else None,
+            'longitude': float(chef['longitude']) if chef['longitude'] else None
+        } if chef['city'] else None,
+
+        # Pricing information
+        'pricing': {
+            'base_rate_per_person': float(chef['base_rate_per_person']) if chef['base_rate_per_person'] else None,
+            'minimum_people': chef['minimum_people'],
+            'maximum_people': chef['maximum_people'],
+            'additional_charges': float(chef['additional_charges']) if chef['additional_charges'] else 0.0
+        } if chef['base_rate_per_person'] else None,
+
+        # Cuisine information
+        'cuisines': list(chef['cuisine_names'] or []),
+
+        # Rating information
+        'rating': {
+            'average_rating': round(float(chef['average_rating']), 2) if chef['average_rating'] else None,
+            'total_reviews': chef['total_reviews'] or 0
+        }
+    }
+
+
+def sort_key_sql(column):
+    return f"COALESCE(candidates.{column}::float8, 'Infinity')"
+
+
+def keyset_condition(sort_keys, last_key, last_chef_id):
+    """
+    Build the WHERE clause selecting rows that sort after (last_key, last_chef_id).
+    Returns (condition, params) over the sort key expressions of the candidates, so
+    the condition applies in the same scan as the search filters.
+    """
+    columns = [(sort_key_sql(column), direction, '%s::float8') for column, direction in sort_keys]
+    columns.append(('candidates.chef_id', 'ASC', '%s'))
+    values = list(last_key) + [last_chef_id]
+
+    clauses = []
+    params = []
+    for i, (column, direction, placeholder) in enumerate(columns):
+        op = '>' if direction == 'ASC' else '<'
+        parts = [f'{c} = {ph}' for c, _, ph in columns[:i]]
+        parts.append(f'{column} {op} {placeholder}')
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return ' OR '.join(clauses), params
+
+
+def load_search_page(cursor, search_location, search_params, limit, offset=0, after=None):
+    """
+    Rank the chefs matching a nearby search and fetch one page of them.
+    `after` is the decoded position of a page cursor; pages continue strictly after it,
+    so results do not shift or repeat between pages.
+    Returns (results, next_cursor, total_matches); next_cursor is None on the last page.
+    """
+    query, params = build_candidate_query(
+        search_location['latitude'], search_location['longitude'], search_params['radius'],
+        chef_name=search_params['searchQuery'] or '', cuisine=search_params['cuisine'] or '',
+        gender=search_params['gender'] or '', timing=search_params['timing'] or '',
+        min_rating=search_params['min_rating'], max_price=search_params['max_price']
+    )
+
+    sort_keys = SORT_KEYS[search_params['sort_by']]
+    key_columns = ', '.join(
+        f'{sort_key_sql(column)} AS sort_key_{i}' for i, (column, _) in enumerate(sort_keys)
+    )
+    order_clause = ', '.join(
+        f'sort_key_{i} {direction}' for i, (_, direction) in enumerate(sort_keys)
+    )
+
+    # Only the first page counts the matches; later pages carry the total in the cursor,
+    # so they read no more than the rows after their position
+    if after:
+        condition, keyset_params = keyset_condition(sort_keys, after['last_key'], after['last_chef_id'])
+        query = f'''
+            SELECT candidates.*, {key_columns}
+            FROM ({query}) candidates
+            WHERE {condition}
+        '''
+        params.extend(keyset_params)
+    else:
+        query = f'''
+            SELECT candidates.*, {key_columns}, COUNT(*) OVER () AS total_matches
+            FROM ({query}) candidates
+        '''
+
+    query = f'''
+        {query}
+        ORDER BY {order_clause}, chef_id ASC
+        LIMIT %s OFFSET %s
+    '''
+    params.extend([limit + 1, offset])
+
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+
+    if after:
+        total_matches = after['total_matches']
+    else:
+        total_matches = rows[0]['total_matches'] if rows else 0
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = search_cursor_serializer.dumps({
+            'search_location': search_location,
+            'search_params': search_params,
+            'last_key': [last[f'sort_key_{i}'] for i in range(len(sort_keys))],
+            'last_chef_id': last['chef_id'],
+            'total_matches': total_matches
+        })
+
+    # Photos are not part of the index; one primary-key lookup covers the page
+    photo_urls = {}
+    if rows:
+        cursor.execute(
+            'SELECT id, photo_url FROM chefs WHERE id = ANY(%s)',
+            ([row['chef_id'] for row in rows],)
+        )
+        photo_urls = {row['id']: row['photo_url'] for row in cursor.fetchall()}
+
+    results = []
+    for row in rows:
+        chef = dict(row)
+        chef['photo_url'] = photo_urls.get(row['chef_id'])
+        results.append(format_search_result(chef))
+    return results, next_cursor, total_matches
+
+
 @search_bp.route('/chefs/nearby', methods=['GET'])
 def search_nearby_chefs():
     """
-    Search for chefs within a specified radius of a location
+    Search for chefs within a specified radius of a location.
+    Reads only chef_search_index, which triggers keep in sync with the chef tables.
+
+    Pages are keyset-paginated: later pages pass back `cursor` (the `next_cursor`
+    of the previous response), a signed token carrying the search and the sort key of
+    the last chef returned, so any worker can serve it and results do not shift or
+    repeat between pages.
     """
     conn = None
     cursor = None
     try:
+        limit = request.args.get('limit', 20, type=int)
+        page_cursor = request.args.get('cursor', '').strip()
+
+        if limit is None or not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid limit',
+                'message': f'limit must be between 1 and {MAX_PAGE_SIZE}'
+            }), 400
+
+        if page_cursor:
+            try:
+                after = search_cursor_serializer.loads(page_cursor)
+            except BadSignature:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid cursor',
+                    'message': 'Please run the search again'
+                }), 400
+
+            conn = get_db_connection()
+            cursor = get_cursor(conn, dictionary=True)
+            results, next_cursor, total_matches = load_search_page(
+                cursor, after['search_location'], after['search_params'], limit, after=after
+            )
+
+            return jsonify({
+                'success': True,
+                'chefs': results,
+                'search_location': after['search_location'],
+                'search_radius_miles': after['search_params']['radius'],
+                'total_found': len(results),
+                'total_matches': total_matches,
+                'next_cursor': next_cursor,
+                'search_params': after['search_params']
+            }), 200
+
         # Get location parameters
         customer_lat = request.args.get('latitude', type=float)
         customer_lon = request.args.get('longitude', type=float) 
@@ -27,7 +336,6 @@ def search_nearby_chefs():
         min_rating = request.args.get('min_rating', type=float)
         max_price = request.args.get('max_price', type=float)
         sort_by = request.args.get('sort_by', 'distance').lower()  # distance, rating, price, reviews
-        limit = request.args.get('limit', 20, type=int)
         offset = request.args.get('offset', 0, type=int)
         
         # Convert 'all' to empty string for compatibility
@@ -36,6 +344,10 @@ def search_nearby_chefs():
         if timing == 'all':
             timing = ''
 
+        # Default to distance sorting
+        if sort_by not in SORT_KEYS:
+            sort_by = 'distance'
+
         if not (customer_lat and customer_lon):
             return jsonify({
                 'success': False,
@@ -43,187 +355,30 @@ def search_nearby_chefs():
                 'message': 'Please provide latitude and longitude'
             }), 400
 
+        search_location = {
+            'latitude': customer_lat,
+            'longitude': customer_lon
+        }
+        search_params = {
+            'searchQuery': chef_name or None,
+            'cuisine': cuisine or None,
+            'gender': gender or None,
+            'timing': timing or None,
+            'min_rating': min_rating,
+            'max_price': max_price,
+            'radius': radius,
+            'sort_by': sort_by
+        }
+
         conn = get_db_connection()
         cursor = get_cursor(conn, dictionary=True)
 
-        # Start with base parameters for distance calculation
-        params = [customer_lat, customer_lon, customer_lat]
-
-        # Build the complete SQL query with all parameters properly managed
-        query = f'''
-            SELECT 
-                c.id as chef_id,
-                c.first_name,
-                c.last_name,
-                c.first_name || ' ' || c.last_name as full_name,
-                c.email,
-                c.phone,
-                c.gender,
-                c.meal_timings,
-                
-                -- Distance calculation (Haversine formula)
-                (3959 * acos(cos(radians(%s)) * cos(radians(ca.latitude)) * 
-                cos(radians(ca.longitude) - radians(%s)) + 
-                sin(radians(%s)) * sin(radians(ca.latitude)))) as distance_miles,
-                
-                -- Pricing information
-                cp.base_rate_per_person,
-                cp.minimum_people,
-                cp.maximum_people,
-                cp.produce_supply_extra_cost as additional_charges,
-                
-                -- Address information 
-                ca.address_line1 as street_address,
-                ca.city,
-                ca.state,
-                ca.zip_code,
-                ca.latitude,
-                ca.longitude,
-                
-                -- Cuisine information
-                STRING_AGG(ct.name, ', ' ORDER BY ct.name) as cuisines,
-                
-                -- Rating information from summary table
-                crs.average_rating,
-                crs.total_reviews
-                
-            FROM chefs c
-            INNER JOIN chef_addresses ca ON c.id = ca.chef_id AND ca.is_default = TRUE
-            LEFT JOIN chef_pricing cp ON c.id = cp.chef_id
-            LEFT JOIN chef_cuisines cc ON c.id = cc.chef_id
-            LEFT JOIN cuisine_types ct ON cc.cuisine_id = ct.id
-            LEFT JOIN chef_rating_summary crs ON c.id = crs.chef_id
-        '''
-        
-        # Add meal timing JOIN if filtering by meal time
-        if timing and timing in ['breakfast', 'lunch', 'dinner']:
-            query += '''
-            INNER JOIN chef_meal_availability cma ON c.id = cma.chef_id 
-                AND cma.meal_type = %s AND cma.is_available = TRUE
-            '''
-            params.append(timing)
-        
-        query += '''
-            WHERE ca.latitude IS NOT NULL 
-            AND ca.longitude IS NOT NULL
-        '''
-        
-        # Add chef name filter to WHERE clause (before GROUP BY)
-        # searchQuery will search both chef names AND cuisine types (case-insensitive)
-        if chef_name:
-            query += ''' AND (c.first_name ILIKE %s 
-                            OR c.last_name ILIKE %s 
-                            OR c.first_name || ' ' || c.last_name ILIKE %s
-                            OR EXISTS (
-                                SELECT 1 FROM chef_cuisines cc2
-                                JOIN cuisine_types ct2 ON cc2.cuisine_id = ct2.id
-                                WHERE cc2.chef_id = c.id AND ct2.name ILIKE %s
-                            ))'''
-            search_pattern = f'%{chef_name}%'
-            params.extend([search_pattern, search_pattern, search_pattern, search_pattern])
-        
-        # Add gender filter to WHERE clause
-        if gender and gender in ['male', 'female']:
-            query += ' AND c.gender = %s'
-            params.append(gender)
-        
-        query += '''
-            GROUP BY c.id, c.first_name, c.last_name, c.email, c.phone, c.gender,
-                     cp.base_rate_per_person, cp.minimum_people, cp.maximum_people, cp.produce_supply_extra_cost,
-                     ca.address_line1, ca.city, ca.state, ca.zip_code, ca.latitude, ca.longitude,
-                     crs.average_rating, crs.total_reviews
-            HAVING (3959 * acos(cos(radians(%s)) * cos(radians(ca.latitude)) * 
-                cos(radians(ca.longitude) - radians(%s)) + 
-                sin(radians(%s)) * sin(radians(ca.latitude)))) <= %s
-        '''
-        params.extend([customer_lat, customer_lon, customer_lat, radius])
-        
-        # Add additional HAVING conditions
-        if cuisine:
-            # PostgreSQL: Use ILIKE for case-insensitive substring search in aggregated cuisines
-            query += ' AND cuisines ILIKE %s'
-            params.append(f'%{cuisine}%')
-
-        if min_rating is not None and min_rating > 0:
-            # Use COALESCE to treat NULL ratings as 0
-            query += ' AND COALESCE(average_rating, 0) >= %s'
-            params.append(min_rating)
-
-        if max_price is not None:
-            query += ' AND (base_rate_per_person IS NULL OR base_rate_per_person <= %s)'
-            params.append(max_price)
-
-        # Add dynamic ordering based on sort_by parameter
-        if sort_by == 'distance':
-            order_clause = 'distance_miles ASC, average_rating DESC, total_reviews DESC'
-        elif sort_by == 'rating':
-            order_clause = 'average_rating DESC, total_reviews DESC, distance_miles ASC'
-        elif sort_by == 'price':
-            order_clause = 'base_rate_per_person ASC, distance_miles ASC, average_rating DESC'
-        elif sort_by == 'reviews':
-            order_clause = 'total_reviews DESC, average_rating DESC, distance_miles ASC'
-        else:
-            # Default to distance sorting
-            order_clause = 'distance_miles ASC, average_rating DESC, total_reviews DESC'
-            
-        query += f'''
-            ORDER BY {order_clause}
-            LIMIT %s OFFSET %s
-        '''
-        params.extend([limit, offset])
-
         print(f'Executing nearby search query for location ({customer_lat}, {customer_lon}) within {radius} miles')
         print(f'Parameters: chef_name={chef_name}, gender={gender}, timing={timing}, cuisine={cuisine}')
-        print(f'Params list length: {len(params)}')
-        print(f'Query params: {params}')
-        cursor.execute(query, params)
-        chefs = cursor.fetchall()
-        print(f'Query returned {len(chefs)} chef(s)')
-
-        # Process results
-        results = []
-        for chef in chefs:
-            chef_data = {
-                'chef_id': chef['chef_id'],
-                'first_name': chef['first_name'],
-                'last_name': chef['last_name'],
-                'full_name': chef['full_name'],
-                'email': chef['email'],
-                'phone': chef['phone'],
-                'gender': chef['gender'],
-                'meal_timings': chef['meal_timings'] if chef['meal_timings'] else [],
-                
-                # Distance information
-                'distance_miles': round(float(chef['distance_miles']), 1) if chef['distance_miles'] else None,
-                
-                # Location information
-                'location': {
-                    'street_address': chef['street_address'],
-                    'city': chef['city'],
-                    'state': chef['state'],
-                    'zip_code': chef['zip_code'],
-                    'latitude': float(chef['latitude']) if chef['latitude'] else None,
-                    'longitude': float(chef['longitude']) if chef['longitude'] else None
-                } if chef['city'] else None,
-                
-                # Pricing information
-                'pricing': {
-                    'base_rate_per_person': float(chef['base_rate_per_person']) if chef['base_rate_per_person'] else None,
-                    'minimum_people': chef['minimum_people'],
-                    'maximum_people': chef['maximum_people'],
-                    'additional_charges': float(chef['additional_charges']) if chef['additional_charges'] else 0.0
-                } if chef['base_rate_per_person'] else None,
-                
-                # Cuisine information
-                'cuisines': chef['cuisines'].split(',') if chef['cuisines'] else [],
-                
-                # Rating information
-                'rating': {
-                    'average_rating': round(float(chef['average_rating']), 2) if chef['average_rating'] else None,
-                    'total_reviews': chef['total_reviews'] or 0
-                }
-            }
-            results.append(chef_data)
+        results, next_cursor, total_matches = load_search_page(
+            cursor, search_location, search_params, limit, offset=max(offset or 0, 0)
+        )
+        print(f'Query matched {total_matches} chef(s)')
 
         # Save search to recent searches history (if customer_id is provided)
         # Only save if there's an actual search query
@@ -274,22 +429,12 @@ def search_nearby_chefs():
         response_data = {
             'success': True,
             'chefs': results,
-            'search_location': {
-                'latitude': customer_lat,
-                'longitude': customer_lon
-            },
+            'search_location': search_location,
             'search_radius_miles': radius,
             'total_found': len(results),
-            'search_params': {
-                'searchQuery': chef_name or None,
-                'cuisine': cuisine or None,
-                'gender': gender or None,
-                'timing': timing or None,
-                'min_rating': min_rating,
-                'max_price': max_price,
-                'radius': radius,
-                'sort_by': sort_by
-            }
+            'total_matches': total_matches,
+            'next_cursor': next_cursor,
+            'search_params': search_params
         }
 
         print(f'Nearby search completed: Found {len(results)} chefs within {radius} miles')
@@ -310,6 +455,243 @@ def search_nearby_chefs():
         if conn:
             conn.close()
 
+# Facet buckets: (key, SQL condition over a candidate row)
+PRICE_BUCKETS = [
+    ('under_25', 'base_rate_per_person < 25'),
+    ('25_to_50', 'base_rate_per_person >= 25 AND base_rate_per_person < 50'),
+    ('50_to_100', 'base_rate_per_person >= 50 AND base_rate_per_person < 100'),
+    ('100_plus', 'base_rate_per_person >= 100'),
+    ('not_set', 'base_rate_per_person IS NULL'),
+]
+RATING_BANDS = [
+    ('4.5_and_up', 'COALESCE(average_rating, 0) >= 4.5'),
+    ('4_and_up', 'COALESCE(average_rating, 0) >= 4'),
+    ('3_and_up', 'COALESCE(average_rating, 0) >= 3'),
+    ('unrated', 'COALESCE(total_reviews, 0) = 0'),
+]
+
+
+@search_bp.route('/chefs/facets', methods=['GET'])
+def get_search_facets():
+    """
+    Count matching chefs per cuisine, gender, meal timing, price bucket and rating band.
+    Takes the same parameters as /chefs/nearby and computes every facet from a single
+    scan of the candidate set, so the search screen needs one round trip.
+
+    Facets are disjunctive: each one is counted with every filter except its own, so
+    with gender=male the female count is what choosing female instead would return.
+    total_found applies all filters.
+    """
+    conn = None
+    cursor = None
+    try:
+        customer_lat = request.args.get('latitude', type=float)
+        customer_lon = request.args.get('longitude', type=float)
+        radius = request.args.get('radius', 30, type=float)
+
+        chef_name = request.args.get('searchQuery', '').strip() or request.args.get('chef_name', '').strip()
+        cuisine = request.args.get('cuisine', '').strip()
+        gender = request.args.get('gender', '').strip().lower()
+        timing = request.args.get('timing', '').strip().lower() or request.args.get('meal_timing', '').strip().lower()
+        min_rating = request.args.get('min_rating', type=float)
+        max_price = request.args.get('max_price', type=float)
+
+        if gender == 'all':
+            gender = ''
+        if timing == 'all':
+            timing = ''
+
+        if not (customer_lat and customer_lon):
+            return jsonify({
+                'success': False,
+                'error': 'Location required',
+                'message': 'Please provide latitude and longitude'
+            }), 400
+
+        conn = get_db_connection()
+        cursor = get_cursor(conn, dictionary=True)
+
+        # Candidates match the radius and name only; each facet filter becomes a
+        # match_<facet> flag so every facet can leave its own filter out
+        filters = search_filters(cuisine, gender, timing, min_rating, max_price)
+        candidate_query, candidate_params = build_candidate_query(
+            customer_lat, customer_lon, radius, chef_name=chef_name
+        )
+        flag_columns = ''.join(f', ({condition}) AS match_{facet}' for facet, (condition, _) in filters.items())
+        params = [p for _, filter_params in filters.values() for p in filter_params] + candidate_params
+
+        def other_filters(facet=None):
+            return ' AND '.join(f'match_{other}' for other in filters if other != facet) or 'TRUE'
+
+        scalar_buckets = [('gender', [(value, f"gender = '{value}'") for value in GENDERS]),
+                          ('price', PRICE_BUCKETS),
+                          ('rating', RATING_BANDS)]
+        bucket_counts = ',\n'.join(
+            f"COUNT(*) FILTER (WHERE {other_filters(facet)} AND {condition}) AS \"{facet}:{key}\""
+            for facet, buckets in scalar_buckets
+            for key, condition in buckets
+        )
+
+        # Scalar facets come from one aggregate row; array facets are unnested.
+        # All branches read the same materialized candidate set.
+        cursor.execute(f'''
+            WITH candidates AS MATERIALIZED (
+                SELECT candidates.*{flag_columns}
+                FROM ({candidate_query}) candidates
+            ),
+            scalar_counts AS (
+                SELECT
+                    COUNT(*) FILTER (WHERE {other_filters()}) AS "total:all",
+                    {bucket_counts}
+                FROM candidates
+            )
+            SELECT split_part(kv.key, ':', 1) AS facet,
+                   split_part(kv.key, ':', 2) AS value,
+                   kv.value::int AS count
+            FROM scalar_counts, json_each_text(row_to_json(scalar_counts)) kv
+            UNION ALL
+            SELECT 'cuisine', cuisine_name, COUNT(*)::int
+            FROM candidates, unnest(cuisine_names) AS cuisine_name
+            WHERE {other_filters('cuisine')}
+            GROUP BY cuisine_name
+            UNION ALL
+            SELECT 'meal_timing', meal_type, COUNT(*)::int
+            FROM candidates, unnest(available_meal_types) AS meal_type
+            WHERE {other_filters('meal_timing')}
+            GROUP BY meal_type
+        ''', params)
+
+        facets = {'cuisine': {}, 'gender': {}, 'meal_timing': {}, 'price': {}, 'rating': {}}
+        total = 0
+        for row in cursor.fetchall():
+            if row['facet'] == 'total':
+                total = row['count']
+            else:
+                facets[row['facet']][row['value']] = row['count']
+
+        # Most common cuisines first
+        facets['cuisine'] = dict(sorted(facets['cuisine'].items(), key=lambda item: (-item[1], item[0])))
+
+        return jsonify({
+            'success': True,
+            'total_found': total,
+            'facets': facets
+        }), 200
+
+    except Exception as e:
+        print(f'Error in get_search_facets: {str(e)}')
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to count search facets'
+        }), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+# Grid cells per map tile edge; clusters are roughly 256 / 8 = 32px apart on screen
+CLUSTER_CELLS_PER_TILE = 8
+MAX_CLUSTER_ZOOM = 20
+# Cells per viewport edge; a bbox wider than the zoom implies gets coarser cells instead
+MAX_CLUSTER_CELLS_PER_EDGE = 64
+
+
+def parse_bbox(value):
+    """Parse `west,south,east,north` into floats; returns None if invalid"""
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return None
+    return west, south, east, north
+
+
+@search_bp.route('/chefs/clusters', methods=['GET'])
+def get_chef_clusters():
+    """
+    Aggregate chefs inside a map viewport into grid clusters for drawing markers.
+    Query params: bbox=west,south,east,north and zoom (0-20).
+    Each cluster carries its count, centroid, lowest price and best rating; single-chef
+    clusters also include the chef_id so the client can link straight to the profile.
+    """
+    conn = None
+    cursor = None
+    try:
+        bbox = parse_bbox(request.args.get('bbox'))
+        zoom = request.args.get('zoom', type=int)
+
+        if bbox is None or zoom is None:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid viewport',
+                'message': 'Please provide bbox=west,south,east,north and zoom'
+            }), 400
+
+        zoom = min(max(zoom, 0), MAX_CLUSTER_ZOOM)
+        west, south, east, north = bbox
+        # A viewport crossing the antimeridian has west > east
+        width = east - west if west <= east else 360 - (west - east)
+        # Bound the grid to the viewport, so the number of clusters stays capped
+        cell_size = max(360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE,
+                        max(width, north - south) / MAX_CLUSTER_CELLS_PER_EDGE)
+
+        if west <= east:
+            longitude_clause = 'longitude BETWEEN %s AND %s'
+        else:
+            longitude_clause = '(longitude >= %s OR longitude <= %s)'
+
+        conn = get_db_connection()
+        cursor = get_cursor(conn, dictionary=True)
+
+        cursor.execute(f'''
+            SELECT
+                COUNT(*) AS chef_count,
+                AVG(latitude) AS latitude,
+                AVG(longitude) AS longitude,
+                MIN(base_rate_per_person) AS min_price,
+                MAX(average_rating) AS top_rating,
+                MIN(chef_id) AS chef_id
+            FROM chef_search_index
+            WHERE latitude BETWEEN %s AND %s
+              AND {longitude_clause}
+            GROUP BY floor(latitude / %s), floor(longitude / %s)
+        ''', (south, north, west, east, cell_size, cell_size))
+
+        clusters = []
+        for row in cursor.fetchall():
+            clusters.append({
+                'count': row['chef_count'],
+                'latitude': round(float(row['latitude']), 6),
+                'longitude': round(float(row['longitude']), 6),
+                'min_price': float(row['min_price']) if row['min_price'] is not None else None,
+                'top_rating': round(float(row['top_rating']), 2) if row['top_rating'] is not None else None,
+                'chef_id': row['chef_id'] if row['chef_count'] == 1 else None
+            })
+
+        return jsonify({
+            'success': True,
+            'zoom': zoom,
+            'cell_size': cell_size,
+            'total_chefs': sum(cluster['count'] for cluster in clusters),
+            'clusters': clusters
+        }), 200
+
+    except Exception as e:
+        print(f'Error in get_chef_clusters: {str(e)}')
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to load chef clusters'
+        }), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
 @search_bp.route('/recent/<int:customer_id>', methods=['GET'])
 def get_recent_searches(customer_id):
     """
@@ -483,8 +865,8 @@ def get_viewed_chefs(customer_id):
                 c.meal_timings,
                 c.photo_url,
                 
-                -- Get cuisines
-                STRING_AGG(DISTINCT ct.name, ', ' ORDER BY ct.name) as cuisines,
+                -- Get cuisines (names come from the reference data cache)
+                ARRAY_AGG(DISTINCT cc.cuisine_id) FILTER (WHERE cc.cuisine_id IS NOT NULL) as cuisine_ids,
                 
                 -- Get rating
                 crs.average_rating,
@@ -492,12 +874,11 @@ def get_viewed_chefs(customer_id):
                 
                 -- Booking info
                 MAX(b.updated_at) as last_booking_date,
-                COUNT(b.id) as total_bookings
+                COUNT(DISTINCT b.id) as total_bookings
                 
             FROM bookings b
             INNER JOIN chefs c ON b.chef_id = c.id
             LEFT JOIN chef_cuisines cc ON c.id = cc.chef_id
-            LEFT JOIN cuisine_types ct ON cc.cuisine_id = ct.id
             LEFT JOIN chef_rating_summary crs ON c.id = crs.chef_id
             WHERE b.customer_id = %s 
                 AND b.status = 'completed'
@@ -521,14 +902,15 @@ def get_viewed_chefs(customer_id):
                 'phone': chef['phone'],
                 'gender': chef['gender'],
                 'meal_timings': chef['meal_timings'] if chef['meal_timings'] else [],
-                'cuisines': chef['cuisines'].split(', ') if chef['cuisines'] else [],
+                'cuisines': sorted(filter(None, map(reference_data.cuisine_name, chef['cuisine_ids'] or []))),
                 'rating': {
                     'average_rating': round(float(chef['average_rating']), 2) if chef['average_rating'] else None,
                     'total_reviews': chef['total_reviews'] or 0
                 },
                 'last_booking_date': chef['last_booking_date'].isoformat() if chef['last_booking_date'] else None,
                 'total_bookings': chef['total_bookings'],
-                'photo_url': chef['photo_url']
+                'photo_url': chef['photo_url'],
+                'photo_variants': image_pipeline.photo_variants(chef['photo_url'])
             }
             results.append(chef_data)
 
@@ -553,26 +935,11 @@ def get_viewed_chefs(customer_id):
 
 @search_bp.route('/cuisines', methods=['GET'])
 def get_available_cuisines():
-    """Get all available cuisine types"""
-    conn = None
-    cursor = None
+    """Get cuisine types offered by at least one chef, most offered first"""
     try:
-        conn = get_db_connection()
-        cursor = get_cursor(conn, dictionary=True)
-
-        cursor.execute('''
-            SELECT DISTINCT ct.name, COUNT(cc.chef_id) as chef_count
-            FROM cuisine_types ct
-            LEFT JOIN chef_cuisines cc ON ct.id = cc.cuisine_id
-            GROUP BY ct.name
-            HAVING chef_count > 0
-            ORDER BY chef_count DESC, ct.name
-        ''')
-        cuisines = cursor.fetchall()   
-
         return jsonify({
             'success': True,
-            'cuisines': [c['name'] for c in cuisines]
+            'cuisines': reference_data.cuisines_with_chefs()
         }), 200
 
     except Exception as e:
@@ -580,8 +947,3 @@ def get_available_cuisines():
             'success': False,
             'error': str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
\ No newline at end of file
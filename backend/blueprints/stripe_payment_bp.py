@@ -4,6 +4,8 @@ from functools import wraps
 import jwt
 import os
 import stripe
+from services import stripe_events, stripe_mirror
+from services.http_client import configure_stripe
 
 # Create the blueprint
 stripe_payment_bp = Blueprint('stripe_payment', __name__)
@@ -15,6 +17,7 @@ load_dotenv()
 # Stripe configuration
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY', 'sk_test_YOUR_STRIPE_SECRET_KEY')
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', 'pk_test_YOUR_STRIPE_PUBLISHABLE_KEY')
+configure_stripe(stripe)
 
 # JWT secret key - must match the one in auth_bp.py
 SECRET_KEY = 'your-secret-key'
@@ -48,6 +51,52 @@ def token_required(f):
     
     return decorated
 
+# Mirror columns read alongside the customer row by the payment method listings
+MIRRORED_PAYMENT_METHOD_COLUMNS = '''
+    c.stripe_customer_id,
+    c.stripe_payment_methods_synced_at,
+    spm.id, spm.brand, spm.last4, spm.exp_month, spm.exp_year,
+    spm.funding, spm.stripe_created, spm.is_default
+'''
+
+def mirrored_payment_methods(conn, cursor, rows):
+    """
+    Format rows from a customers LEFT JOIN stripe_payment_methods query.
+    The first listing after the mirror was added fills it from Stripe once.
+    """
+    stripe_customer_id = rows[0]['stripe_customer_id']
+    if rows[0]['stripe_payment_methods_synced_at'] is None:
+        print(f"Filling payment method mirror from Stripe for {stripe_customer_id}")
+        stripe_mirror.sync_customer_payment_methods(cursor, stripe_customer_id)
+        conn.commit()
+        rows = stripe_mirror.list_payment_methods(cursor, stripe_customer_id)
+
+    return [{
+        'id': row['id'],
+        'brand': row['brand'],
+        'last4': row['last4'],
+        'exp_month': row['exp_month'],
+        'exp_year': row['exp_year'],
+        'funding': row['funding'],  # credit, debit, prepaid
+        'created': row['stripe_created'],
+        'is_default': row['is_default']
+    } for row in rows if row['id']]
+
+def write_through_mirror(conn, update, *args):
+    """
+    Apply a mirror update after a successful Stripe call.
+    Failures are only logged - webhooks and reconciliation repair the mirror.
+    """
+    cursor = get_cursor(conn)
+    try:
+        update(cursor, *args)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Warning: Failed to update payment method mirror: {e}")
+    finally:
+        cursor.close()
+
 @stripe_payment_bp.route('/config', methods=['GET'])
 def get_stripe_config():
     """Get Stripe publishable key for frontend"""
@@ -141,15 +190,19 @@ def get_payment_methods_no_auth():
         conn = get_db_connection()
         cursor = get_cursor(conn, dictionary=True, buffered=True)
         
-        # First, get customer_id from users table
-        cursor.execute('''
-            SELECT customer_id FROM users
-            WHERE id = %s AND user_type = 'customer'
+        # Customer, Stripe link and mirrored cards in one read
+        cursor.execute(f'''
+            SELECT {MIRRORED_PAYMENT_METHOD_COLUMNS}
+            FROM users u
+            JOIN customers c ON c.id = u.customer_id
+            LEFT JOIN stripe_payment_methods spm ON spm.stripe_customer_id = c.stripe_customer_id
+            WHERE u.id = %s AND u.user_type = 'customer'
+            ORDER BY spm.is_default DESC, spm.stripe_created DESC
         ''', (user_id,))
         
-        user_result = cursor.fetchone()
+        rows = cursor.fetchall()
         
-        if not user_result or not user_result['customer_id']:
+        if not rows:
             print(f"No customer found for user_id: {user_id}")
             return jsonify({
                 'success': True,
@@ -157,52 +210,15 @@ def get_payment_methods_no_auth():
                 'message': 'Customer not found'
             }), 200
         
-        customer_id = user_result['customer_id']
-        
-        # Get Stripe customer ID
-        cursor.execute('''
-            SELECT stripe_customer_id FROM customers
-            WHERE id = %s
-        ''', (customer_id,))
-        
-        result = cursor.fetchone()
-        
-        if not result or not result.get('stripe_customer_id'):
-            print(f"No stripe_customer_id found for customer_id: {customer_id}")
+        if not rows[0]['stripe_customer_id']:
+            print(f"No stripe_customer_id found for user_id: {user_id}")
             return jsonify({
                 'success': True,
                 'payment_methods': [],
                 'message': 'No Stripe customer found'
             }), 200
         
-        stripe_customer_id = result['stripe_customer_id']
-        print(f"Found stripe_customer_id: {stripe_customer_id}")
-        
-        # Get customer details to find default payment method
-        print(f"Retrieving Stripe customer...")
-        stripe_customer = stripe.Customer.retrieve(stripe_customer_id)
-        default_payment_method = stripe_customer.invoice_settings.default_payment_method
-        print(f"Default payment method: {default_payment_method}")
-        
-        # Get payment methods from Stripe
-        print(f"Listing payment methods...")
-        payment_methods = stripe.PaymentMethod.list(
-            customer=stripe_customer_id,
-            type='card'
-        )
-        print(f"Retrieved {len(payment_methods.data)} payment methods from Stripe")
-        
-        # Format payment methods for frontend
-        formatted_methods = []
-        for pm in payment_methods.data:
-            formatted_methods.append({
-                'id': pm.id,
-                'brand': pm.card.brand,
-                'last4': pm.card.last4,
-                'exp_month': pm.card.exp_month,
-                'exp_year': pm.card.exp_year,
-                'is_default': pm.id == default_payment_method
-            })
+        formatted_methods = mirrored_payment_methods(conn, cursor, rows)
         
         print(f"Found {len(formatted_methods)} payment methods")
         print(f"Formatted methods: {formatted_methods}")
@@ -238,41 +254,25 @@ def get_payment_methods(current_user_id, user_type, customer_id):
         conn = get_db_connection()
         cursor = get_cursor(conn, dictionary=True, buffered=True)
         
-        # Get Stripe customer ID
-        cursor.execute('''
-            SELECT stripe_customer_id FROM customers
-            WHERE id = %s
+        # Stripe link and mirrored cards in one read
+        cursor.execute(f'''
+            SELECT {MIRRORED_PAYMENT_METHOD_COLUMNS}
+            FROM customers c
+            LEFT JOIN stripe_payment_methods spm ON spm.stripe_customer_id = c.stripe_customer_id
+            WHERE c.id = %s
+            ORDER BY spm.is_default DESC, spm.stripe_created DESC
         ''', (customer_id,))
         
-        result = cursor.fetchone()
+        rows = cursor.fetchall()
         
-        if not result or not result.get('stripe_customer_id'):
+        if not rows or not rows[0]['stripe_customer_id']:
             return jsonify({
                 'success': True,
                 'payment_methods': [],
                 'message': 'No Stripe customer found'
             }), 200
         
-        stripe_customer_id = result['stripe_customer_id']
-        
-        # Get payment methods from Stripe
-        payment_methods = stripe.PaymentMethod.list(
-            customer=stripe_customer_id,
-            type='card'
-        )
-        
-        # Format payment methods for frontend
-        formatted_methods = []
-        for pm in payment_methods.data:
-            formatted_methods.append({
-                'id': pm.id,
-                'brand': pm.card.brand,
-                'last4': pm.card.last4,
-                'exp_month': pm.card.exp_month,
-                'exp_year': pm.card.exp_year,
-                'funding': pm.card.funding,  # credit, debit, prepaid
-                'created': pm.created
-            })
+        formatted_methods = mirrored_payment_methods(conn, cursor, rows)
         
         return jsonify({
             'success': True,
@@ -380,7 +380,8 @@ def attach_payment_method_with_token():
             type='card'
         )
         
-        if len(customer_payment_methods.data) == 1:
+        is_first_card = len(customer_payment_methods.data) == 1
+        if is_first_card:
             stripe.Customer.modify(
                 stripe_customer_id,
                 invoice_settings={
@@ -388,6 +389,9 @@ def attach_payment_method_with_token():
                 }
             )
         
+        write_through_mirror(conn, stripe_mirror.upsert_payment_method,
+                             payment_method, stripe_customer_id, True if is_first_card else None)
+        
         return jsonify({
             'success': True,
             'payment_method': {
@@ -458,6 +462,8 @@ def attach_payment_method(current_user_id, user_type, customer_id):
             customer=stripe_customer_id
         )
         
+        write_through_mirror(conn, stripe_mirror.upsert_payment_method, payment_method, stripe_customer_id)
+        
         # Set as default payment method if requested
         if data.get('set_as_default', False):
             stripe.Customer.modify(
@@ -466,6 +472,8 @@ def attach_payment_method(current_user_id, user_type, customer_id):
                     'default_payment_method': payment_method_id
                 }
             )
+            write_through_mirror(conn, stripe_mirror.set_default_payment_method,
+                                 stripe_customer_id, payment_method_id)
         
         return jsonify({
             'success': True,
@@ -506,6 +514,10 @@ def detach_payment_method_no_auth(payment_method_id):
         # Detach payment method
         payment_method = stripe.PaymentMethod.detach(payment_method_id)
         
+        conn = get_db_connection()
+        write_through_mirror(conn, stripe_mirror.remove_payment_method, payment_method_id)
+        conn.close()
+        
         return jsonify({
             'success': True,
             'message': 'Payment method removed successfully'
@@ -570,6 +582,8 @@ def set_default_payment_method_no_auth(payment_method_id):
                 'default_payment_method': payment_method_id
             }
         )
+        write_through_mirror(conn, stripe_mirror.set_default_payment_method,
+                             stripe_customer_id, payment_method_id)
         
         return jsonify({
             'success': True,
@@ -603,6 +617,10 @@ def detach_payment_method(current_user_id, user_type, customer_id, payment_metho
         # Detach payment method
         payment_method = stripe.PaymentMethod.detach(payment_method_id)
         
+        conn = get_db_connection()
+        write_through_mirror(conn, stripe_mirror.remove_payment_method, payment_method_id)
+        conn.close()
+        
         return jsonify({
             'success': True,
             'message': 'Payment method removed successfully'
@@ -634,24 +652,68 @@ def create_payment_intent(current_user_id, user_type):
     customer_id = data.get('customer_id')
     payment_method_id = data.get('payment_method_id')
     description = data.get('description', 'ChefAsap Booking Payment')
+    booking_id = data.get('booking_id')  # Optional - marked paid by the payment_intent webhook
+    order_id = data.get('order_id')
     
     print(f"Amount: {amount}, Customer ID: {customer_id}, Payment Method: {payment_method_id}")
     
     if not amount:
         return jsonify({'error': 'Amount is required'}), 400
     
-    if not customer_id:
-        return jsonify({'error': 'Customer ID is required'}), 400
-    
     if not payment_method_id:
         return jsonify({'error': 'Payment method ID is required'}), 400
     
+    if booking_id and order_id:
+        return jsonify({'error': 'Pay for a booking or an order, not both'}), 400
+    
     conn = None
     cursor = None
     try:
         conn = get_db_connection()
         cursor = get_cursor(conn, dictionary=True, buffered=True)
         
+        # The token carries users.id; the customer is the one linked to that user
+        cursor.execute('''
+            SELECT customer_id FROM users
+            WHERE id = %s AND user_type = 'customer'
+        ''', (current_user_id,))
+        
+        user_result = cursor.fetchone()
+        
+        if not user_result or not user_result['customer_id']:
+            return jsonify({'error': 'Customer not found'}), 404
+        
+        # customer_id in the body is optional, but must be the caller's own
+        if customer_id and str(customer_id) != str(user_result['customer_id']):
+            return jsonify({'error': 'Unauthorized'}), 403
+        customer_id = user_result['customer_id']
+        
+        # Convert amount to cents and ensure it's an integer
+        amount_cents = int(round(float(amount) * 100))
+        print(f"Amount in cents: {amount_cents}")
+        
+        # The webhook marks this row paid, so it must belong to the caller and the
+        # amount must be exactly what the row owes
+        payable = None
+        if booking_id:
+            payable = ('bookings', 'total_cost', booking_id)
+        elif order_id:
+            payable = ('orders', 'total_amount', order_id)
+        if payable:
+            table_name, total_column, row_id = payable
+            cursor.execute(f'''
+                SELECT ROUND({total_column} * 100) AS amount_due, payment_status
+                FROM {table_name}
+                WHERE id = %s AND customer_id = %s
+            ''', (row_id, customer_id))
+            row = cursor.fetchone()
+            if not row:
+                return jsonify({'error': f'{table_name[:-1].capitalize()} not found'}), 404
+            if row['payment_status'] == 'paid':
+                return jsonify({'error': f'{table_name[:-1].capitalize()} is already paid'}), 409
+            if row['amount_due'] is None or int(row['amount_due']) != amount_cents:
+                return jsonify({'error': 'Amount does not match the amount due'}), 400
+        
         # Get Stripe customer ID if provided
         stripe_customer_id = None
         if customer_id:
@@ -667,26 +729,41 @@ def create_payment_intent(current_user_id, user_type):
         if not stripe_customer_id:
             return jsonify({'error': 'Stripe customer not found'}), 400
         
-        # Convert amount to cents and ensure it's an integer
-        amount_cents = int(float(amount) * 100)
-        print(f"Amount in cents: {amount_cents}")
-        
-        # Create payment intent
+        # Create payment intent; it is confirmed only after it is linked below
         intent_params = {
             'amount': amount_cents,
             'currency': currency,
             'description': description,
             'customer': stripe_customer_id,
             'payment_method': payment_method_id,
-            'confirm': True,
             'automatic_payment_methods': {'enabled': True, 'allow_redirects': 'never'}
         }
         
+        metadata = {}
+        if booking_id:
+            metadata['booking_id'] = booking_id
+        if order_id:
+            metadata['order_id'] = order_id
+        if metadata:
+            intent_params['metadata'] = metadata
+        
         print(f"Creating payment intent with params: {intent_params}")
         payment_intent = stripe.PaymentIntent.create(**intent_params)
         
         print(f"Payment intent created: {payment_intent.id}, status: {payment_intent.status}")
         
+        # Link the intent before confirming it, so the succeeded webhook always finds
+        # the row; the webhook worker matches rows by payment_intent_id only
+        if payable:
+            cursor.execute(f'''
+                UPDATE {table_name} SET payment_intent_id = %s
+                WHERE id = %s AND customer_id = %s
+            ''', (payment_intent.id, row_id, customer_id))
+        conn.commit()
+        
+        payment_intent = stripe.PaymentIntent.confirm(payment_intent.id)
+        print(f"Payment intent confirmed: {payment_intent.id}, status: {payment_intent.status}")
+        
         return jsonify({
             'success': True,
             'client_secret': payment_intent.client_secret,
@@ -738,24 +815,33 @@ def stripe_webhook():
         print(f"Invalid signature: {e}")
         return jsonify({'error': 'Invalid signature'}), 400
     
-    # Handle different event types
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        print(f"PaymentIntent {payment_intent['id']} succeeded")
-        # Update your database - mark order/booking as paid
-        
-    elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        print(f"PaymentIntent {payment_intent['id']} failed")
-        # Update your database - mark payment as failed
-        
-    elif event['type'] == 'customer.created':
-        customer = event['data']['object']
-        print(f"Customer {customer['id']} created")
-        
-    elif event['type'] == 'payment_method.attached':
-        payment_method = event['data']['object']
-        print(f"PaymentMethod {payment_method['id']} attached")
+    # Store the event and acknowledge immediately; background workers apply it
+    # (booking/order payment status, payment method mirror) exactly once, in order.
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = get_cursor(conn)
+        is_new = stripe_events.store_event(cursor, event)
+        conn.commit()
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"Error storing Stripe event {event['id']}: {e}")
+        # Non-2xx makes Stripe redeliver the event later
+        return jsonify({'error': 'Could not store event'}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+    
+    if is_new:
+        print(f"Stored Stripe event {event['id']} ({event['type']})")
+        stripe_events.start_event_workers()
+        stripe_events.notify_workers()
+    else:
+        print(f"Duplicate Stripe event {event['id']} ignored")
     
     return jsonify({'success': True}), 200
 
@@ -800,6 +886,8 @@ def set_default_payment_method(current_user_id, user_type, customer_id):
                 'default_payment_method': payment_method_id
             }
         )
+        write_through_mirror(conn, stripe_mirror.set_default_payment_method,
+                             stripe_customer_id, payment_method_id)
         
         return jsonify({
             'success': True,
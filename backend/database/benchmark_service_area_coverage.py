@@ -0,0 +1,113 @@
+"""
+Benchmark point-in-service-area lookups against the coverage_box GiST index.
+
+Builds a temporary copy of chef_service_areas with 100k random service areas across
+the continental US, then times the covering-area query used by booking_bp with the
+index and with index scans disabled (the full scan the old Python loop amounted to).
+Nothing is written to real tables.
+
+Usage: python benchmark_service_area_coverage.py [service_area_count] [lookups]
+"""
+
+import random
+import sys
+import time
+import psycopg2
+from config import db_config
+
+COVERING_QUERY = '''
+    SELECT chef_id, distance_miles
+    FROM (
+        SELECT
+            chef_id,
+            service_radius_miles,
+            3959 * acos(LEAST(1.0, GREATEST(-1.0,
+                cos(radians(%s)) * cos(radians(latitude)) *
+                cos(radians(longitude) - radians(%s)) +
+                sin(radians(%s)) * sin(radians(latitude))))) AS distance_miles
+        FROM bench_service_areas
+        WHERE coverage_box && box(point(%s, %s), point(%s, %s))
+    ) areas
+    WHERE distance_miles <= service_radius_miles
+'''
+
+
+def create_bench_table(cursor, area_count):
+    cursor.execute('''
+        CREATE TEMP TABLE bench_service_areas (
+            id SERIAL PRIMARY KEY,
+            chef_id INTEGER NOT NULL,
+            service_radius_miles INTEGER NOT NULL,
+            latitude DOUBLE PRECISION NOT NULL,
+            longitude DOUBLE PRECISION NOT NULL,
+            coverage_box BOX
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO bench_service_areas (chef_id, service_radius_miles, latitude, longitude)
+        SELECT n, 5 + floor(random() * 46)::int, 25 + random() * 24, -124 + random() * 57
+        FROM generate_series(1, %s) AS n
+    ''', (area_count,))
+    # Same box formula as the service_area_coverage_box() trigger
+    cursor.execute('''
+        UPDATE bench_service_areas
+        SET coverage_box = box(
+            point(longitude - service_radius_miles / (69.0 * GREATEST(cos(radians(latitude)), 0.01)),
+                  latitude - service_radius_miles / 69.0),
+            point(longitude + service_radius_miles / (69.0 * GREATEST(cos(radians(latitude)), 0.01)),
+                  latitude + service_radius_miles / 69.0)
+        )
+    ''')
+    cursor.execute('CREATE INDEX ON bench_service_areas USING GIST (coverage_box)')
+    cursor.execute('ANALYZE bench_service_areas')
+
+
+def time_lookups(cursor, points):
+    matches = 0
+    start = time.perf_counter()
+    for lat, lon in points:
+        cursor.execute(COVERING_QUERY, (lat, lon, lat, lon, lat, lon, lat))
+        matches += len(cursor.fetchall())
+    elapsed = time.perf_counter() - start
+    return elapsed, matches
+
+
+def run_benchmark(area_count=100000, lookups=200):
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print(f"Creating {area_count} random service areas...")
+        create_bench_table(cursor, area_count)
+
+        random.seed(42)
+        points = [(random.uniform(25, 49), random.uniform(-124, -67)) for _ in range(lookups)]
+
+        indexed_time, indexed_matches = time_lookups(cursor, points)
+
+        cursor.execute('SET enable_indexscan = off')
+        cursor.execute('SET enable_bitmapscan = off')
+        scan_time, scan_matches = time_lookups(cursor, points)
+
+        print("="*60)
+        print(f"Service areas: {area_count}, lookups: {lookups}")
+        print(f"GiST index:  {indexed_time * 1000 / lookups:8.2f} ms/lookup ({indexed_matches} matches)")
+        print(f"Full scan:   {scan_time * 1000 / lookups:8.2f} ms/lookup ({scan_matches} matches)")
+        if indexed_time > 0:
+            print(f"Speedup:     {scan_time / indexed_time:8.1f}x")
+        print("="*60)
+
+        conn.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    area_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    run_benchmark(area_count, lookups)
@@ -3,28 +3,154 @@ Database helper module for ChefAsap
 PostgreSQL database connection interface
 """
 
+import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2.extensions import cursor as BaseCursor
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from database.config import db_config
+from services import metrics, query_tracer
+
+DB_POOL_MAX_CONNECTIONS = int(os.getenv('DB_POOL_MAX_CONNECTIONS', '10'))
+
+_pool = None
+_pool_lock = threading.Lock()
+# psycopg2 pools raise when exhausted; borrowers wait on this instead
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_CONNECTIONS)
+_pool_in_use = 0
+_pool_waiting = 0
+_pool_stats_lock = threading.Lock()
+
+class _TimedExecute:
+    """
+    Reports every execute round trip to services.metrics (histogram and Server-Timing)
+    and, when QUERY_TRACE=1, to services.query_tracer
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.record_query(elapsed)
+            if query_tracer.ENABLED:
+                query_tracer.record(self, query, vars, elapsed)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.record_query(elapsed)
+            if query_tracer.ENABLED:
+                query_tracer.record(self, query, None, elapsed)
+
+class TimedCursor(_TimedExecute, BaseCursor):
+    pass
+
+class TimedDictCursor(_TimedExecute, RealDictCursor):
+    pass
 
 def get_db_connection():
     """
     Get PostgreSQL database connection
     Returns a psycopg2 connection object
     """
-    conn = psycopg2.connect(**db_config)
+    conn = psycopg2.connect(cursor_factory=TimedCursor, **db_config)
     return conn
 
+def get_pool():
+    """
+    Shared thread-safe connection pool, created on first use.
+    Used where one request fans out into parallel queries (see bootstrap_bp)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(1, DB_POOL_MAX_CONNECTIONS, cursor_factory=TimedCursor, **db_config)
+    return _pool
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrow a connection from the pool; any open transaction is rolled back on return
+    so the next borrower starts clean
+    """
+    global _pool_in_use, _pool_waiting
+    pool = get_pool()
+    with _pool_stats_lock:
+        _pool_waiting += 1
+    _pool_slots.acquire()
+    with _pool_stats_lock:
+        _pool_waiting -= 1
+        _pool_in_use += 1
+    try:
+        conn = pool.getconn()
+        try:
+            yield conn
+        finally:
+            if conn.closed:
+                pool.putconn(conn, close=True)
+            else:
+                conn.rollback()
+                pool.putconn(conn)
+    finally:
+        with _pool_stats_lock:
+            _pool_in_use -= 1
+        _pool_slots.release()
+
+def pool_stats():
+    """Connection pool utilization for the db_pool_connections gauge"""
+    with _pool_stats_lock:
+        return {('in_use',): _pool_in_use, ('waiting',): _pool_waiting,
+                ('max',): DB_POOL_MAX_CONNECTIONS}
+
+metrics.Gauge('db_pool_connections', 'Pooled database connections by state', ('state',), pool_stats)
+
 def get_cursor(conn, dictionary=True, buffered=False):
     """
     Get cursor from PostgreSQL connection
     Returns RealDictCursor if dictionary=True (buffered parameter is ignored in PostgreSQL)
     """
     if dictionary:
-        return conn.cursor(cursor_factory=RealDictCursor)
+        return conn.cursor(cursor_factory=TimedDictCursor)
     else:
         return conn.cursor()
 
+def apply_display_order(cursor, table, ordered_ids, scope):
+    """
+    Renumber display_order to 1..n following ordered_ids in a single UPDATE, whatever
+    the list length. Only rows matching every scope column (e.g. {'chef_id': 3}) are
+    touched, and rows already in place are not rewritten.
+    Returns the set of ids that matched the scope so callers can reject unknown ids.
+    """
+    conditions = ' AND '.join(f't.{column} = %s' for column in scope)
+    cursor.execute(f'''
+        WITH wanted AS (
+            SELECT id, ord::int AS ord
+            FROM unnest(%s::int[]) WITH ORDINALITY AS v(id, ord)
+        ),
+        matched AS (
+            SELECT t.id, w.ord
+            FROM {table} t
+            JOIN wanted w ON w.id = t.id
+            WHERE {conditions}
+        ),
+        updated AS (
+            UPDATE {table} t
+            SET display_order = m.ord, updated_at = NOW()
+            FROM matched m
+            WHERE t.id = m.id AND t.display_order IS DISTINCT FROM m.ord
+        )
+        SELECT id FROM matched
+    ''', [list(ordered_ids)] + list(scope.values()))
+    return {row[0] if isinstance(row, tuple) else row['id'] for row in cursor.fetchall()}
+
 def handle_db_error(e):
     """
     Handle database errors
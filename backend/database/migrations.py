@@ -224,6 +224,1451 @@ def add_chef_kitchen_tools_table():
         if conn:
             conn.close()
 
+def add_chef_search_index():
+
+    migration_name = "add_chef_search_index"
+    description = ("Added denormalized chef_search_index table (one row per searchable chef) "
+                   "kept current by triggers on chefs, chef_addresses, chef_pricing, chef_cuisines, "
+                   "cuisine_types, chef_meal_availability and chef_rating_summary")
+    rollback_script = """
+        DROP TRIGGER IF EXISTS trigger_chef_search_index_chefs ON chefs;
+        DROP TRIGGER IF EXISTS trigger_chef_search_index_addresses ON chef_addresses;
+        DROP TRIGGER IF EXISTS trigger_chef_search_index_pricing ON chef_pricing;
+        DROP TRIGGER IF EXISTS trigger_chef_search_index_cuisines ON chef_cuisines;
+        DROP TRIGGER IF EXISTS trigger_chef_search_index_meals ON chef_meal_availability;
+        DROP TRIGGER IF EXISTS trigger_chef_search_index_ratings ON chef_rating_summary;
+        DROP TRIGGER IF EXISTS trigger_chef_search_index_cuisine_types ON cuisine_types;
+        DROP FUNCTION IF EXISTS chef_search_index_sync_chef();
+        DROP FUNCTION IF EXISTS chef_search_index_sync_child();
+        DROP FUNCTION IF EXISTS chef_search_index_sync_cuisine_type();
+        DROP FUNCTION IF EXISTS refresh_chef_search_index(INTEGER);
+        DROP TABLE IF EXISTS chef_search_index;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding table chef_search_index...")
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chef_search_index (
+                chef_id INTEGER PRIMARY KEY,
+                first_name VARCHAR(50) NOT NULL,
+                last_name VARCHAR(50) NOT NULL,
+                email VARCHAR(100),
+                phone VARCHAR(20),
+                gender VARCHAR(30),
+                meal_timings TEXT[],
+                street_address VARCHAR(100),
+                city VARCHAR(50),
+                state VARCHAR(2),
+                zip_code VARCHAR(10),
+                latitude DECIMAL(10, 8) NOT NULL,
+                longitude DECIMAL(11, 8) NOT NULL,
+                base_rate_per_person DECIMAL(10, 2),
+                minimum_people INTEGER,
+                maximum_people INTEGER,
+                additional_charges DECIMAL(10, 2),
+                cuisine_ids INTEGER[] NOT NULL DEFAULT '{}',
+                cuisine_names TEXT[] NOT NULL DEFAULT '{}',
+                available_meal_types TEXT[] NOT NULL DEFAULT '{}',
+                average_rating DECIMAL(3, 2),
+                total_reviews INTEGER DEFAULT 0,
+                search_text TEXT NOT NULL DEFAULT '',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (chef_id) REFERENCES chefs(id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chef_search_location ON chef_search_index(latitude, longitude)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chef_search_gender ON chef_search_index(gender)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chef_search_rate ON chef_search_index(base_rate_per_person)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chef_search_rating ON chef_search_index(average_rating DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chef_search_cuisines ON chef_search_index USING GIN (cuisine_ids)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chef_search_meals ON chef_search_index USING GIN (available_meal_types)')
+
+        # Rebuilds (or removes) the index row for one chef from the source tables.
+        # A chef is searchable only once they have a geocoded default address.
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION refresh_chef_search_index(p_chef_id INTEGER)
+            RETURNS VOID AS $$
+            BEGIN
+                IF p_chef_id IS NULL THEN
+                    RETURN;
+                END IF;
+
+                INSERT INTO chef_search_index (
+                    chef_id, first_name, last_name, email, phone, gender, meal_timings,
+                    street_address, city, state, zip_code, latitude, longitude,
+                    base_rate_per_person, minimum_people, maximum_people, additional_charges,
+                    cuisine_ids, cuisine_names, available_meal_types,
+                    average_rating, total_reviews, search_text, updated_at
+                )
+                SELECT
+                    c.id, c.first_name, c.last_name, c.email, c.phone, c.gender, c.meal_timings,
+                    ca.address_line1, ca.city, ca.state, ca.zip_code, ca.latitude, ca.longitude,
+                    cp.base_rate_per_person, cp.minimum_people, cp.maximum_people, cp.produce_supply_extra_cost,
+                    COALESCE(cu.cuisine_ids, '{}'), COALESCE(cu.cuisine_names, '{}'), COALESCE(ma.meal_types, '{}'),
+                    crs.average_rating, COALESCE(crs.total_reviews, 0),
+                    LOWER(c.first_name || ' ' || c.last_name || ' ' || array_to_string(COALESCE(cu.cuisine_names, '{}'), ' ')),
+                    CURRENT_TIMESTAMP
+                FROM chefs c
+                JOIN LATERAL (
+                    SELECT address_line1, city, state, zip_code, latitude, longitude
+                    FROM chef_addresses
+                    WHERE chef_id = c.id AND is_default = TRUE
+                      AND latitude IS NOT NULL AND longitude IS NOT NULL
+                    ORDER BY id DESC
+                    LIMIT 1
+                ) ca ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT base_rate_per_person, minimum_people, maximum_people, produce_supply_extra_cost
+                    FROM chef_pricing
+                    WHERE chef_id = c.id
+                    ORDER BY updated_at DESC NULLS LAST, id DESC
+                    LIMIT 1
+                ) cp ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT array_agg(ct.id ORDER BY ct.name) AS cuisine_ids,
+                           array_agg(ct.name::TEXT ORDER BY ct.name) AS cuisine_names
+                    FROM chef_cuisines cc
+                    JOIN cuisine_types ct ON cc.cuisine_id = ct.id
+                    WHERE cc.chef_id = c.id
+                ) cu ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT array_agg(meal_type::TEXT ORDER BY meal_type) AS meal_types
+                    FROM chef_meal_availability
+                    WHERE chef_id = c.id AND is_available = TRUE
+                ) ma ON TRUE
+                LEFT JOIN chef_rating_summary crs ON crs.chef_id = c.id
+                WHERE c.id = p_chef_id
+                ON CONFLICT (chef_id) DO UPDATE SET
+                    first_name = EXCLUDED.first_name,
+                    last_name = EXCLUDED.last_name,
+                    email = EXCLUDED.email,
+                    phone = EXCLUDED.phone,
+                    gender = EXCLUDED.gender,
+                    meal_timings = EXCLUDED.meal_timings,
+                    street_address = EXCLUDED.street_address,
+                    city = EXCLUDED.city,
+                    state = EXCLUDED.state,
+                    zip_code = EXCLUDED.zip_code,
+                    latitude = EXCLUDED.latitude,
+                    longitude = EXCLUDED.longitude,
+                    base_rate_per_person = EXCLUDED.base_rate_per_person,
+                    minimum_people = EXCLUDED.minimum_people,
+                    maximum_people = EXCLUDED.maximum_people,
+                    additional_charges = EXCLUDED.additional_charges,
+                    cuisine_ids = EXCLUDED.cuisine_ids,
+                    cuisine_names = EXCLUDED.cuisine_names,
+                    available_meal_types = EXCLUDED.available_meal_types,
+                    average_rating = EXCLUDED.average_rating,
+                    total_reviews = EXCLUDED.total_reviews,
+                    search_text = EXCLUDED.search_text,
+                    updated_at = EXCLUDED.updated_at;
+
+                IF NOT FOUND THEN
+                    DELETE FROM chef_search_index WHERE chef_id = p_chef_id;
+                END IF;
+            END;
+            $$ LANGUAGE plpgsql;
+        ''')
+
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION chef_search_index_sync_chef()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP <> 'DELETE' THEN
+                    PERFORM refresh_chef_search_index(NEW.id);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        ''')
+
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION chef_search_index_sync_child()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM refresh_chef_search_index(OLD.chef_id);
+                ELSIF TG_OP = 'INSERT' THEN
+                    PERFORM refresh_chef_search_index(NEW.chef_id);
+                ELSE
+                    PERFORM refresh_chef_search_index(NEW.chef_id);
+                    IF OLD.chef_id IS DISTINCT FROM NEW.chef_id THEN
+                        PERFORM refresh_chef_search_index(OLD.chef_id);
+                    END IF;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        ''')
+
+        # Renaming a cuisine touches every chef offering it (deletes cascade through chef_cuisines)
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION chef_search_index_sync_cuisine_type()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                PERFORM refresh_chef_search_index(cc.chef_id)
+                FROM chef_cuisines cc
+                WHERE cc.cuisine_id = NEW.id;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        ''')
+
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_chef_search_index_chefs ON chefs')
+        cursor.execute('''
+            CREATE TRIGGER trigger_chef_search_index_chefs
+            AFTER INSERT OR UPDATE OF first_name, last_name, email, phone, gender, meal_timings ON chefs
+            FOR EACH ROW
+            EXECUTE FUNCTION chef_search_index_sync_chef();
+        ''')
+
+        child_tables = [
+            ('chef_addresses', 'trigger_chef_search_index_addresses'),
+            ('chef_pricing', 'trigger_chef_search_index_pricing'),
+            ('chef_cuisines', 'trigger_chef_search_index_cuisines'),
+            ('chef_meal_availability', 'trigger_chef_search_index_meals'),
+            ('chef_rating_summary', 'trigger_chef_search_index_ratings'),
+        ]
+        for table_name, trigger_name in child_tables:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name} ON {table_name}')
+            cursor.execute(f'''
+                CREATE TRIGGER {trigger_name}
+                AFTER INSERT OR UPDATE OR DELETE ON {table_name}
+                FOR EACH ROW
+                EXECUTE FUNCTION chef_search_index_sync_child();
+            ''')
+
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_chef_search_index_cuisine_types ON cuisine_types')
+        cursor.execute('''
+            CREATE TRIGGER trigger_chef_search_index_cuisine_types
+            AFTER UPDATE OF name ON cuisine_types
+            FOR EACH ROW
+            EXECUTE FUNCTION chef_search_index_sync_cuisine_type();
+        ''')
+
+        print("Backfilling chef_search_index...")
+        cursor.execute('SELECT refresh_chef_search_index(id) FROM chefs')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("chef_search_index table added successfully.")
+    except Exception as e:
+        print(f"Error adding chef_search_index: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_service_area_coverage_index():
+
+    migration_name = "add_service_area_coverage_index"
+    description = ("Added latitude/longitude and a trigger-maintained coverage_box to chef_service_areas "
+                   "with a GiST index so point-in-service-area lookups use the index")
+    rollback_script = """
+        DROP TRIGGER IF EXISTS trigger_service_area_coverage_box ON chef_service_areas;
+        DROP FUNCTION IF EXISTS service_area_coverage_box();
+        DROP INDEX IF EXISTS idx_service_area_coverage;
+        ALTER TABLE chef_service_areas DROP COLUMN IF EXISTS coverage_box;
+        ALTER TABLE chef_service_areas DROP COLUMN IF EXISTS longitude;
+        ALTER TABLE chef_service_areas DROP COLUMN IF EXISTS latitude;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding coverage index to chef_service_areas...")
+
+        cursor.execute('''
+            ALTER TABLE chef_service_areas
+                ADD COLUMN IF NOT EXISTS latitude DECIMAL(10, 8),
+                ADD COLUMN IF NOT EXISTS longitude DECIMAL(11, 8),
+                ADD COLUMN IF NOT EXISTS coverage_box BOX
+        ''')
+
+        # Bounding box of the service circle as (longitude, latitude) corners.
+        # 69 miles per degree of latitude; longitude degrees shrink with cos(latitude).
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION service_area_coverage_box()
+            RETURNS TRIGGER AS $$
+            DECLARE
+                radius DOUBLE PRECISION := COALESCE(NEW.service_radius_miles, 10);
+                lat_delta DOUBLE PRECISION;
+                lon_delta DOUBLE PRECISION;
+            BEGIN
+                IF NEW.latitude IS NULL OR NEW.longitude IS NULL THEN
+                    NEW.coverage_box := NULL;
+                    RETURN NEW;
+                END IF;
+
+                lat_delta := radius / 69.0;
+                lon_delta := radius / (69.0 * GREATEST(cos(radians(NEW.latitude)), 0.01));
+                NEW.coverage_box := box(
+                    point(NEW.longitude - lon_delta, NEW.latitude - lat_delta),
+                    point(NEW.longitude + lon_delta, NEW.latitude + lat_delta)
+                );
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+        ''')
+
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_service_area_coverage_box ON chef_service_areas')
+        cursor.execute('''
+            CREATE TRIGGER trigger_service_area_coverage_box
+            BEFORE INSERT OR UPDATE OF latitude, longitude, service_radius_miles ON chef_service_areas
+            FOR EACH ROW
+            EXECUTE FUNCTION service_area_coverage_box();
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_service_area_coverage
+            ON chef_service_areas USING GIST (coverage_box)
+        ''')
+
+        # Seed coordinates from the chef's geocoded default address in the same city.
+        # Rows left without coordinates are geocoded by services.service_area_geocoding.
+        print("Backfilling service area coordinates...")
+        cursor.execute('''
+            UPDATE chef_service_areas csa
+            SET latitude = ca.latitude,
+                longitude = ca.longitude
+            FROM chef_addresses ca
+            WHERE ca.chef_id = csa.chef_id
+            AND ca.is_default = TRUE
+            AND ca.latitude IS NOT NULL
+            AND ca.longitude IS NOT NULL
+            AND LOWER(ca.city) = LOWER(csa.city)
+            AND ca.state = csa.state
+            AND csa.latitude IS NULL
+        ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("Service area coverage index added successfully.")
+    except Exception as e:
+        print(f"Error adding service area coverage index: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_stripe_payment_methods_mirror():
+
+    migration_name = "add_stripe_payment_methods_mirror"
+    description = ("Added stripe_payment_methods, a local mirror of saved card display data "
+                   "(brand, last4, expiry, default flag) kept in sync by webhooks and write-through")
+    rollback_script = """
+        DROP TABLE IF EXISTS stripe_payment_methods;
+        ALTER TABLE customers DROP COLUMN IF EXISTS stripe_payment_methods_synced_at;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding table stripe_payment_methods...")
+
+        # Display data only - card numbers and CVCs stay with Stripe
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stripe_payment_methods (
+                id VARCHAR(255) PRIMARY KEY,
+                stripe_customer_id VARCHAR(255) NOT NULL,
+                customer_id INTEGER,
+                brand VARCHAR(50),
+                last4 VARCHAR(4),
+                exp_month INTEGER,
+                exp_year INTEGER,
+                funding VARCHAR(20),
+                stripe_created BIGINT,
+                is_default BOOLEAN NOT NULL DEFAULT FALSE,
+                synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_stripe_payment_methods_customer
+            ON stripe_payment_methods(stripe_customer_id, is_default DESC, stripe_created DESC)
+        ''')
+
+        # NULL means the mirror has never been filled from Stripe for this customer
+        cursor.execute('''
+            ALTER TABLE customers
+            ADD COLUMN IF NOT EXISTS stripe_payment_methods_synced_at TIMESTAMP
+        ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("stripe_payment_methods table added successfully.")
+    except Exception as e:
+        print(f"Error adding stripe_payment_methods: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_stripe_webhook_events_table():
+
+    migration_name = "add_stripe_webhook_events_table"
+    description = ("Added stripe_webhook_events store for durable, exactly-once webhook processing "
+                   "and payment tracking columns on bookings and orders")
+    rollback_script = """
+        DROP TABLE IF EXISTS stripe_webhook_events;
+        ALTER TABLE bookings DROP COLUMN IF EXISTS payment_intent_id;
+        ALTER TABLE bookings DROP COLUMN IF EXISTS payment_status;
+        ALTER TABLE bookings DROP COLUMN IF EXISTS paid_at;
+        ALTER TABLE orders DROP COLUMN IF EXISTS payment_intent_id;
+        ALTER TABLE orders DROP COLUMN IF EXISTS payment_status;
+        ALTER TABLE orders DROP COLUMN IF EXISTS paid_at;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding table stripe_webhook_events...")
+
+        # event_id is Stripe's evt_ id, so redelivered events are ignored on insert.
+        # object_id groups events for the same PaymentIntent/PaymentMethod/Customer so
+        # they are processed in order.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stripe_webhook_events (
+                seq BIGSERIAL UNIQUE,
+                event_id VARCHAR(255) PRIMARY KEY,
+                event_type VARCHAR(100) NOT NULL,
+                object_id VARCHAR(255),
+                stripe_created BIGINT,
+                payload JSONB NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending'
+                    CHECK (status IN ('pending', 'processing', 'retry', 'done', 'failed')),
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                locked_at TIMESTAMP,
+                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                processed_at TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_stripe_webhook_events_open
+            ON stripe_webhook_events(stripe_created, seq)
+            WHERE status IN ('pending', 'processing', 'retry')
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_stripe_webhook_events_object
+            ON stripe_webhook_events(object_id, stripe_created, seq)
+            WHERE status IN ('pending', 'processing', 'retry')
+        ''')
+
+        for table_name in ('bookings', 'orders'):
+            cursor.execute(f'''
+                ALTER TABLE {table_name}
+                    ADD COLUMN IF NOT EXISTS payment_intent_id VARCHAR(255),
+                    ADD COLUMN IF NOT EXISTS payment_status VARCHAR(20) DEFAULT 'unpaid',
+                    ADD COLUMN IF NOT EXISTS paid_at TIMESTAMP
+            ''')
+            cursor.execute(f'''
+                CREATE INDEX IF NOT EXISTS idx_{table_name}_payment_intent
+                ON {table_name}(payment_intent_id)
+            ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("stripe_webhook_events table added successfully.")
+    except Exception as e:
+        print(f"Error adding stripe_webhook_events: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_google_calendar_tokens_table():
+
+    migration_name = "add_google_calendar_tokens_table"
+    description = ("Added google_calendar_tokens (pgcrypto-encrypted OAuth tokens) to replace "
+                   "the per-user JSON files under static/google_tokens")
+    rollback_script = """
+        DROP TABLE IF EXISTS google_calendar_tokens;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding table google_calendar_tokens...")
+
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pgcrypto')
+
+        # Tokens are encrypted with pgp_sym_encrypt using GOOGLE_TOKEN_ENCRYPTION_KEY
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS google_calendar_tokens (
+                user_id VARCHAR(64) PRIMARY KEY,
+                access_token BYTEA NOT NULL,
+                refresh_token BYTEA,
+                scope TEXT,
+                token_type VARCHAR(20),
+                expires_at TIMESTAMP NOT NULL,
+                refresh_failures INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_google_calendar_tokens_expiry
+            ON google_calendar_tokens(expires_at)
+            WHERE refresh_token IS NOT NULL
+        ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("google_calendar_tokens table added successfully.")
+    except Exception as e:
+        print(f"Error adding google_calendar_tokens: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_external_busy_blocks_table():
+
+    migration_name = "add_external_busy_blocks_table"
+    description = ("Added external_busy_blocks (busy time imported from outside calendars) and "
+                   "google_calendar_sync_state (per-user Google sync tokens)")
+    rollback_script = """
+        DROP TABLE IF EXISTS google_calendar_sync_state;
+        DROP TABLE IF EXISTS external_busy_blocks;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding table external_busy_blocks...")
+
+        # external_id is the Google event id, or UID + recurrence instance for .ics imports
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS external_busy_blocks (
+                id SERIAL PRIMARY KEY,
+                user_id VARCHAR(64) NOT NULL,
+                source VARCHAR(20) NOT NULL CHECK (source IN ('google', 'ics')),
+                external_id VARCHAR(1024) NOT NULL,
+                summary TEXT,
+                starts_at TIMESTAMP NOT NULL,
+                ends_at TIMESTAMP NOT NULL,
+                all_day BOOLEAN DEFAULT FALSE,
+                sequence INTEGER DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (user_id, source, external_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_external_busy_blocks_time
+            ON external_busy_blocks(user_id, starts_at, ends_at)
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS google_calendar_sync_state (
+                user_id VARCHAR(64) PRIMARY KEY,
+                sync_token TEXT,
+                last_synced_at TIMESTAMP,
+                last_error TEXT
+            )
+        ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("external_busy_blocks table added successfully.")
+    except Exception as e:
+        print(f"Error adding external_busy_blocks: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_calendar_feed_versions():
+
+    migration_name = "add_calendar_feed_versions"
+    description = ("Added calendar_feed_versions (per chef/customer version stamp for .ics feeds) "
+                   "bumped by triggers on bookings and chef_menu_items")
+    rollback_script = """
+        DROP TRIGGER IF EXISTS trigger_calendar_feed_bookings ON bookings;
+        DROP TRIGGER IF EXISTS trigger_calendar_feed_menu_items ON chef_menu_items;
+        DROP FUNCTION IF EXISTS calendar_feed_bookings_changed();
+        DROP FUNCTION IF EXISTS calendar_feed_menu_items_changed();
+        DROP FUNCTION IF EXISTS bump_calendar_feed_version(VARCHAR, INTEGER);
+        DROP TABLE IF EXISTS calendar_feed_versions;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding table calendar_feed_versions...")
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS calendar_feed_versions (
+                owner_type VARCHAR(10) NOT NULL CHECK (owner_type IN ('chef', 'customer')),
+                owner_id INTEGER NOT NULL,
+                version BIGINT NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (owner_type, owner_id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION bump_calendar_feed_version(p_owner_type VARCHAR, p_owner_id INTEGER)
+            RETURNS VOID AS $$
+            BEGIN
+                IF p_owner_id IS NULL THEN
+                    RETURN;
+                END IF;
+                INSERT INTO calendar_feed_versions (owner_type, owner_id)
+                VALUES (p_owner_type, p_owner_id)
+                ON CONFLICT (owner_type, owner_id) DO UPDATE
+                SET version = calendar_feed_versions.version + 1,
+                    updated_at = CURRENT_TIMESTAMP;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+
+        # Every booking change invalidates the feeds of both sides, old and new
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION calendar_feed_bookings_changed()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    PERFORM bump_calendar_feed_version('customer', OLD.customer_id);
+                    PERFORM bump_calendar_feed_version('chef', OLD.chef_id);
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    IF TG_OP = 'INSERT' OR NEW.customer_id IS DISTINCT FROM OLD.customer_id THEN
+                        PERFORM bump_calendar_feed_version('customer', NEW.customer_id);
+                    END IF;
+                    IF TG_OP = 'INSERT' OR NEW.chef_id IS DISTINCT FROM OLD.chef_id THEN
+                        PERFORM bump_calendar_feed_version('chef', NEW.chef_id);
+                    END IF;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_calendar_feed_bookings ON bookings')
+        cursor.execute('''
+            CREATE TRIGGER trigger_calendar_feed_bookings
+            AFTER INSERT OR UPDATE OR DELETE ON bookings
+            FOR EACH ROW EXECUTE FUNCTION calendar_feed_bookings_changed()
+        ''')
+
+        # Booking durations come from menu prep times, so those edits invalidate the
+        # chef's feed and the feeds of customers who booked that chef
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION calendar_feed_menu_items_changed()
+            RETURNS TRIGGER AS $$
+            DECLARE
+                v_chef_id INTEGER;
+            BEGIN
+                IF TG_OP = 'UPDATE'
+                   AND NEW.prep_time IS NOT DISTINCT FROM OLD.prep_time
+                   AND NEW.cuisine_type IS NOT DISTINCT FROM OLD.cuisine_type THEN
+                    RETURN NULL;
+                END IF;
+                v_chef_id := CASE WHEN TG_OP = 'DELETE' THEN OLD.chef_id ELSE NEW.chef_id END;
+                PERFORM bump_calendar_feed_version('chef', v_chef_id);
+                PERFORM bump_calendar_feed_version('customer', customer_id)
+                FROM (SELECT DISTINCT customer_id FROM bookings WHERE chef_id = v_chef_id) booked;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_calendar_feed_menu_items ON chef_menu_items')
+        cursor.execute('''
+            CREATE TRIGGER trigger_calendar_feed_menu_items
+            AFTER INSERT OR UPDATE OR DELETE ON chef_menu_items
+            FOR EACH ROW EXECUTE FUNCTION calendar_feed_menu_items_changed()
+        ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("calendar_feed_versions table added successfully.")
+    except Exception as e:
+        print(f"Error adding calendar_feed_versions: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_booking_duration_columns():
+
+    migration_name = "add_booking_duration_columns"
+    description = ("Added bookings.duration_minutes and bookings.ends_at, computed by trigger from "
+                   "chef_menu_items prep times, plus (chef_id, booking_date) and "
+                   "(customer_id, booking_date) indexes for calendar range reads")
+    rollback_script = """
+        DROP TRIGGER IF EXISTS trigger_booking_duration_menu_items ON chef_menu_items;
+        DROP TRIGGER IF EXISTS trigger_booking_duration ON bookings;
+        DROP FUNCTION IF EXISTS booking_duration_menu_items_changed();
+        DROP FUNCTION IF EXISTS set_booking_duration();
+        DROP FUNCTION IF EXISTS booking_duration_minutes(INTEGER, VARCHAR);
+        DROP INDEX IF EXISTS idx_bookings_chef_date;
+        DROP INDEX IF EXISTS idx_bookings_customer_date;
+        ALTER TABLE bookings DROP COLUMN IF EXISTS ends_at;
+        ALTER TABLE bookings DROP COLUMN IF EXISTS duration_minutes;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding duration columns to bookings...")
+
+        cursor.execute('''
+            ALTER TABLE bookings
+            ADD COLUMN IF NOT EXISTS duration_minutes INTEGER,
+            ADD COLUMN IF NOT EXISTS ends_at TIMESTAMP
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_chef_date ON bookings(chef_id, booking_date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_customer_date ON bookings(customer_id, booking_date)')
+
+        # Same rule the calendar endpoints used to apply on every read
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION booking_duration_minutes(p_chef_id INTEGER, p_cuisine_type VARCHAR)
+            RETURNS INTEGER AS $$
+                SELECT COALESCE(MAX(prep_time), 60)
+                FROM chef_menu_items
+                WHERE chef_id = p_chef_id
+                  AND (p_cuisine_type IS NULL OR cuisine_type = p_cuisine_type)
+            $$ LANGUAGE sql STABLE
+        ''')
+
+        # Duration is fixed when a booking is created, reassigned or accepted;
+        # ends_at always follows the stored start and duration
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION set_booking_duration()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'INSERT'
+                   OR NEW.duration_minutes IS NULL
+                   OR NEW.chef_id IS DISTINCT FROM OLD.chef_id
+                   OR NEW.cuisine_type IS DISTINCT FROM OLD.cuisine_type
+                   OR (NEW.status = 'accepted' AND OLD.status IS DISTINCT FROM 'accepted') THEN
+                    NEW.duration_minutes := booking_duration_minutes(NEW.chef_id, NEW.cuisine_type);
+                END IF;
+                NEW.ends_at := NEW.booking_date + NEW.booking_time
+                               + make_interval(mins => NEW.duration_minutes);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_booking_duration ON bookings')
+        cursor.execute('''
+            CREATE TRIGGER trigger_booking_duration
+            BEFORE INSERT OR UPDATE ON bookings
+            FOR EACH ROW EXECUTE FUNCTION set_booking_duration()
+        ''')
+
+        # Prep time edits re-derive the duration of the chef's upcoming open bookings;
+        # completed and past bookings keep the duration they were booked with
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION booking_duration_menu_items_changed()
+            RETURNS TRIGGER AS $$
+            DECLARE
+                v_chef_id INTEGER;
+            BEGIN
+                IF TG_OP = 'UPDATE'
+                   AND NEW.prep_time IS NOT DISTINCT FROM OLD.prep_time
+                   AND NEW.cuisine_type IS NOT DISTINCT FROM OLD.cuisine_type
+                   AND NEW.chef_id IS NOT DISTINCT FROM OLD.chef_id THEN
+                    RETURN NULL;
+                END IF;
+                v_chef_id := CASE WHEN TG_OP = 'DELETE' THEN OLD.chef_id ELSE NEW.chef_id END;
+
+                UPDATE bookings b
+                SET duration_minutes = d.minutes
+                FROM (
+                    SELECT id, booking_duration_minutes(chef_id, cuisine_type) AS minutes
+                    FROM bookings
+                    WHERE chef_id = v_chef_id
+                      AND booking_date >= CURRENT_DATE
+                      AND status IN ('pending', 'accepted')
+                ) d
+                WHERE b.id = d.id AND b.duration_minutes IS DISTINCT FROM d.minutes;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_booking_duration_menu_items ON chef_menu_items')
+        cursor.execute('''
+            CREATE TRIGGER trigger_booking_duration_menu_items
+            AFTER INSERT OR UPDATE OR DELETE ON chef_menu_items
+            FOR EACH ROW EXECUTE FUNCTION booking_duration_menu_items_changed()
+        ''')
+
+        print("Backfilling booking durations...")
+        cursor.execute('''
+            UPDATE bookings
+            SET duration_minutes = booking_duration_minutes(chef_id, cuisine_type)
+            WHERE duration_minutes IS NULL
+        ''')
+        print(f"Backfilled {cursor.rowcount} bookings")
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("Booking duration columns added successfully.")
+    except Exception as e:
+        print(f"Error adding booking duration columns: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_photo_objects_table():
+
+    migration_name = "add_photo_objects_table"
+    description = ("Added photo_objects (content-addressed photo store) with reference counts "
+                   "maintained by triggers on chefs, customers, chef_menu_items and chef_cuisine_photos")
+    rollback_script = """
+        DROP TRIGGER IF EXISTS trigger_photo_refs_chefs ON chefs;
+        DROP TRIGGER IF EXISTS trigger_photo_refs_customers ON customers;
+        DROP TRIGGER IF EXISTS trigger_photo_refs_menu_items ON chef_menu_items;
+        DROP TRIGGER IF EXISTS trigger_photo_refs_cuisine_photos ON chef_cuisine_photos;
+        DROP FUNCTION IF EXISTS photo_refs_changed();
+        DROP FUNCTION IF EXISTS adjust_photo_ref(TEXT, INTEGER);
+        DROP TABLE IF EXISTS photo_objects;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("\nAdding table photo_objects...")
+
+        # unreferenced_since is set whenever ref_count drops to 0 (or on upload, before
+        # any row points at the photo); the GC sweep only removes objects idle past a grace period
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS photo_objects (
+                hash VARCHAR(64) PRIMARY KEY,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                original_bytes INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                unreferenced_since TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_photo_objects_unreferenced
+            ON photo_objects(unreferenced_since) WHERE ref_count = 0
+        ''')
+
+        # Only content-addressed URLs (/static/photos/<aa>/<hash>_full.jpg) are counted
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION adjust_photo_ref(p_photo_url TEXT, p_delta INTEGER)
+            RETURNS VOID AS $$
+            DECLARE
+                v_hash TEXT;
+            BEGIN
+                v_hash := substring(p_photo_url from '^/static/photos/[0-9a-f]{2}/([0-9a-f]+)_full\\.jpg$');
+                IF v_hash IS NULL THEN
+                    RETURN;
+                END IF;
+                UPDATE photo_objects
+                SET ref_count = GREATEST(ref_count + p_delta, 0),
+                    unreferenced_since = CASE
+                        WHEN ref_count + p_delta <= 0 THEN CURRENT_TIMESTAMP
+                        ELSE NULL
+                    END
+                WHERE hash = v_hash;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION photo_refs_changed()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' AND NEW.photo_url IS NOT DISTINCT FROM OLD.photo_url THEN
+                    RETURN NULL;
+                END IF;
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    PERFORM adjust_photo_ref(OLD.photo_url, -1);
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    PERFORM adjust_photo_ref(NEW.photo_url, 1);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        for trigger_name, table in (
+            ('trigger_photo_refs_chefs', 'chefs'),
+            ('trigger_photo_refs_customers', 'customers'),
+            ('trigger_photo_refs_menu_items', 'chef_menu_items'),
+            ('trigger_photo_refs_cuisine_photos', 'chef_cuisine_photos'),
+        ):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name} ON {table}')
+            cursor.execute(f'''
+                CREATE TRIGGER {trigger_name}
+                AFTER INSERT OR UPDATE OF photo_url OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION photo_refs_changed()
+            ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("photo_objects table added successfully.")
+    except Exception as e:
+        print(f"Error adding photo_objects: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_reference_data_versions():
+
+    migration_name = "add_reference_data_versions"
+    description = ("Added reference_data_versions with change notifications for cuisine_types and "
+                   "agreements, and cuisine_types.chef_count maintained by a trigger on chef_cuisines")
+    rollback_script = """
+        DROP TRIGGER IF EXISTS trigger_reference_data_cuisine_types ON cuisine_types;
+        DROP TRIGGER IF EXISTS trigger_reference_data_agreements ON agreements;
+        DROP TRIGGER IF EXISTS trigger_cuisine_chef_count ON chef_cuisines;
+        DROP FUNCTION IF EXISTS reference_data_changed();
+        DROP FUNCTION IF EXISTS cuisine_chef_count_changed();
+        ALTER TABLE cuisine_types DROP COLUMN IF EXISTS chef_count;
+        DROP TABLE IF EXISTS reference_data_versions;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("Adding reference_data_versions...")
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reference_data_versions (
+                name VARCHAR(50) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO reference_data_versions (name) VALUES ('cuisine_types'), ('agreements')
+            ON CONFLICT (name) DO NOTHING
+        ''')
+
+        # Statement-level: a bulk edit is one version bump and one notification
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION reference_data_changed()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                INSERT INTO reference_data_versions (name, version) VALUES (TG_TABLE_NAME, 1)
+                ON CONFLICT (name) DO UPDATE SET
+                    version = reference_data_versions.version + 1,
+                    updated_at = CURRENT_TIMESTAMP;
+                PERFORM pg_notify('reference_data', TG_TABLE_NAME);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_reference_data_cuisine_types ON cuisine_types')
+        cursor.execute('''
+            CREATE TRIGGER trigger_reference_data_cuisine_types
+            AFTER INSERT OR UPDATE OF name OR DELETE ON cuisine_types
+            FOR EACH STATEMENT EXECUTE FUNCTION reference_data_changed()
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_reference_data_agreements ON agreements')
+        cursor.execute('''
+            CREATE TRIGGER trigger_reference_data_agreements
+            AFTER INSERT OR UPDATE OR DELETE ON agreements
+            FOR EACH STATEMENT EXECUTE FUNCTION reference_data_changed()
+        ''')
+
+        # Chef counts per cuisine move by one per chef_cuisines row instead of being
+        # recounted; identical notifications within a transaction are delivered once
+        cursor.execute('ALTER TABLE cuisine_types ADD COLUMN IF NOT EXISTS chef_count INTEGER NOT NULL DEFAULT 0')
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION cuisine_chef_count_changed()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' AND NEW.cuisine_id IS NOT DISTINCT FROM OLD.cuisine_id THEN
+                    RETURN NULL;
+                END IF;
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE cuisine_types SET chef_count = chef_count - 1 WHERE id = OLD.cuisine_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    UPDATE cuisine_types SET chef_count = chef_count + 1 WHERE id = NEW.cuisine_id;
+                END IF;
+                PERFORM pg_notify('reference_data', 'cuisine_counts');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_cuisine_chef_count ON chef_cuisines')
+        cursor.execute('''
+            CREATE TRIGGER trigger_cuisine_chef_count
+            AFTER INSERT OR UPDATE OR DELETE ON chef_cuisines
+            FOR EACH ROW EXECUTE FUNCTION cuisine_chef_count_changed()
+        ''')
+
+        print("Backfilling cuisine chef counts...")
+        cursor.execute('''
+            UPDATE cuisine_types ct
+            SET chef_count = (SELECT COUNT(*) FROM chef_cuisines cc WHERE cc.cuisine_id = ct.id)
+        ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("reference_data_versions table added successfully.")
+    except Exception as e:
+        print(f"Error adding reference_data_versions: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_service_area_geocode_attempts():
+
+    migration_name = "add_service_area_geocode_attempts"
+    description = ("Added chef_service_areas.geocode_attempted_at for background geocoding retries "
+                   "and cleared coordinates that were fallback guesses rather than geocoder hits")
+    rollback_script = """
+        ALTER TABLE chef_service_areas DROP COLUMN IF EXISTS geocode_attempted_at;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        from services.geocoding_service import geocoding_service
+
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("Adding geocode_attempted_at to chef_service_areas...")
+
+        cursor.execute('''
+            ALTER TABLE chef_service_areas
+                ADD COLUMN IF NOT EXISTS geocode_attempted_at TIMESTAMP
+        ''')
+
+        # Area-prefix and NYC fallbacks were stored as if they were real coordinates.
+        # Clear them (the coverage_box trigger clears the box) so they are geocoded again;
+        # exact ZIP entries are real coordinates and are kept.
+        exact = {zip_code: coords for zip_code, coords in geocoding_service.fallback_coordinates.items()
+                 if len(zip_code) == 5}
+        guesses = [coords for zip_code, coords in geocoding_service.fallback_coordinates.items()
+                   if len(zip_code) != 5] + [(40.7128, -74.0060)]
+        cursor.execute('''
+            UPDATE chef_service_areas
+            SET latitude = NULL, longitude = NULL
+            WHERE (latitude, longitude) IN (
+                SELECT * FROM unnest(%s::numeric[], %s::numeric[])
+            )
+            AND NOT (split_part(zip_code, '-', 1) = ANY(%s::text[]))
+        ''', ([lat for lat, _ in guesses], [lon for _, lon in guesses], list(exact)))
+        print(f"Cleared {cursor.rowcount} guessed service area coordinates")
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("geocode_attempted_at added successfully.")
+    except Exception as e:
+        print(f"Error adding geocode_attempted_at: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_google_token_refresh_claims():
+
+    migration_name = "add_google_token_refresh_claims"
+    description = ("Added google_calendar_tokens.refresh_claimed_until so the token refresher can "
+                   "claim a batch without holding row locks, and moved every remaining "
+                   "static/google_tokens file into the table")
+    rollback_script = """
+        ALTER TABLE google_calendar_tokens DROP COLUMN IF EXISTS refresh_claimed_until;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        from services import google_tokens
+
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("Adding refresh_claimed_until to google_calendar_tokens...")
+
+        cursor.execute('''
+            ALTER TABLE google_calendar_tokens
+                ADD COLUMN IF NOT EXISTS refresh_claimed_until TIMESTAMP
+        ''')
+
+        legacy_files = google_tokens.import_legacy_token_files(cursor)
+        print(f"Imported {len(legacy_files)} legacy Google token file(s)")
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        # The tokens are committed, so the files can go
+        for path in legacy_files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        print("refresh_claimed_until added successfully.")
+    except Exception as e:
+        print(f"Error adding refresh_claimed_until: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_photo_processing_status():
+
+    migration_name = "add_photo_processing_status"
+    description = ("Added photo_objects.processed_at and processing_error so uploads whose "
+                   "variants could not be generated are reported as failed")
+    rollback_script = """
+        ALTER TABLE photo_objects DROP COLUMN IF EXISTS processing_error;
+        ALTER TABLE photo_objects DROP COLUMN IF EXISTS processed_at;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        from services import photo_store
+
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("Adding processing status to photo_objects...")
+
+        cursor.execute('''
+            ALTER TABLE photo_objects
+                ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP,
+                ADD COLUMN IF NOT EXISTS processing_error TEXT
+        ''')
+
+        # Existing objects are ready if the pipeline published them; the rest failed earlier
+        cursor.execute('SELECT hash, created_at FROM photo_objects WHERE processed_at IS NULL')
+        ready, missing = [], []
+        for content_hash, created_at in cursor.fetchall():
+            if photo_store.object_exists(content_hash):
+                ready.append(content_hash)
+            else:
+                missing.append(content_hash)
+        cursor.execute('''
+            UPDATE photo_objects SET processed_at = created_at WHERE hash = ANY(%s)
+        ''', (ready,))
+        cursor.execute('''
+            UPDATE photo_objects SET processing_error = 'Variants were not generated'
+            WHERE hash = ANY(%s)
+        ''', (missing,))
+        print(f"{len(ready)} photo objects ready, {len(missing)} marked failed")
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("Photo processing status added successfully.")
+    except Exception as e:
+        print(f"Error adding photo processing status: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_statement_level_cuisine_counts():
+
+    migration_name = "add_statement_level_cuisine_counts"
+    description = ("Replaced the row-level cuisine_types.chef_count trigger on chef_cuisines with "
+                   "statement-level triggers that apply one delta per cuisine, in id order")
+    rollback_script = """
+        DROP TRIGGER IF EXISTS trigger_cuisine_chef_count_insert ON chef_cuisines;
+        DROP TRIGGER IF EXISTS trigger_cuisine_chef_count_update ON chef_cuisines;
+        DROP TRIGGER IF EXISTS trigger_cuisine_chef_count_delete ON chef_cuisines;
+        DROP FUNCTION IF EXISTS cuisine_chef_counts_changed();
+        CREATE TRIGGER trigger_cuisine_chef_count
+            AFTER INSERT OR UPDATE OR DELETE ON chef_cuisines
+            FOR EACH ROW EXECUTE FUNCTION cuisine_chef_count_changed();
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("Replacing the cuisine chef count trigger...")
+
+        # The row-level trigger updated cuisine_types once per chef_cuisines row, in
+        # whatever order the rows came, so two chefs saving overlapping cuisines could
+        # deadlock. Per statement, the rows are summed into one delta per cuisine and the
+        # cuisine_types rows are locked in id order before they are updated.
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION cuisine_chef_counts_changed()
+            RETURNS TRIGGER AS $$
+            DECLARE
+                v_ids INTEGER[];
+                v_deltas INTEGER[];
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    SELECT array_agg(cuisine_id ORDER BY cuisine_id), array_agg(delta ORDER BY cuisine_id)
+                    INTO v_ids, v_deltas
+                    FROM (SELECT cuisine_id, COUNT(*)::INTEGER AS delta
+                          FROM new_rows GROUP BY cuisine_id) d;
+                ELSIF TG_OP = 'DELETE' THEN
+                    SELECT array_agg(cuisine_id ORDER BY cuisine_id), array_agg(delta ORDER BY cuisine_id)
+                    INTO v_ids, v_deltas
+                    FROM (SELECT cuisine_id, -COUNT(*)::INTEGER AS delta
+                          FROM old_rows GROUP BY cuisine_id) d;
+                ELSE
+                    SELECT array_agg(cuisine_id ORDER BY cuisine_id), array_agg(delta ORDER BY cuisine_id)
+                    INTO v_ids, v_deltas
+                    FROM (SELECT cuisine_id, SUM(delta)::INTEGER AS delta
+                          FROM (SELECT cuisine_id, 1 AS delta FROM new_rows
+                                UNION ALL
+                                SELECT cuisine_id, -1 AS delta FROM old_rows) changes
+                          GROUP BY cuisine_id
+                          HAVING SUM(delta) <> 0) d;
+                END IF;
+
+                IF v_ids IS NULL THEN
+                    RETURN NULL;
+                END IF;
+
+                PERFORM 1 FROM cuisine_types WHERE id = ANY(v_ids) ORDER BY id FOR UPDATE;
+                UPDATE cuisine_types ct
+                SET chef_count = ct.chef_count + d.delta
+                FROM unnest(v_ids, v_deltas) AS d(id, delta)
+                WHERE ct.id = d.id;
+
+                PERFORM pg_notify('reference_data', 'cuisine_counts');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+
+        # A trigger with transition tables can only handle one event. The old row-level
+        # function is kept for the rollback script.
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_cuisine_chef_count ON chef_cuisines')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_cuisine_chef_count_insert ON chef_cuisines')
+        cursor.execute('''
+            CREATE TRIGGER trigger_cuisine_chef_count_insert
+            AFTER INSERT ON chef_cuisines
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION cuisine_chef_counts_changed()
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_cuisine_chef_count_update ON chef_cuisines')
+        cursor.execute('''
+            CREATE TRIGGER trigger_cuisine_chef_count_update
+            AFTER UPDATE ON chef_cuisines
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION cuisine_chef_counts_changed()
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trigger_cuisine_chef_count_delete ON chef_cuisines')
+        cursor.execute('''
+            CREATE TRIGGER trigger_cuisine_chef_count_delete
+            AFTER DELETE ON chef_cuisines
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION cuisine_chef_counts_changed()
+        ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("Cuisine chef count trigger replaced successfully.")
+    except Exception as e:
+        print(f"Error replacing the cuisine chef count trigger: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def add_google_calendar_sync_claims():
+
+    migration_name = "add_google_calendar_sync_claims"
+    description = ("Added google_calendar_tokens.sync_claimed_until so only one process "
+                   "syncs a user's Google Calendar at a time")
+    rollback_script = """
+        ALTER TABLE google_calendar_tokens DROP COLUMN IF EXISTS sync_claimed_until;
+        """
+
+    if has_migration_run(migration_name):
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+
+        print("Adding sync_claimed_until to google_calendar_tokens...")
+
+        cursor.execute('''
+            ALTER TABLE google_calendar_tokens
+                ADD COLUMN IF NOT EXISTS sync_claimed_until TIMESTAMP
+        ''')
+
+        conn.commit()
+        record_migration(migration_name, description, rollback_script)
+
+        print("sync_claimed_until added successfully.")
+    except Exception as e:
+        print(f"Error adding sync_claimed_until: {e}")
+        if conn:
+            conn.rollback()
+            print("Changes rolled back")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
 def run_db_updates():
     print("="*70)
     print("Running database updates:")
@@ -235,6 +1680,21 @@ def run_db_updates():
         preserve_bookings_chats,
         add_chef_kitchen_tools_table,
         add_chef_kitchen_tools_table,
+        add_chef_search_index,
+        add_service_area_coverage_index,
+        add_stripe_payment_methods_mirror,
+        add_stripe_webhook_events_table,
+        add_google_calendar_tokens_table,
+        add_external_busy_blocks_table,
+        add_calendar_feed_versions,
+        add_booking_duration_columns,
+        add_photo_objects_table,
+        add_reference_data_versions,
+        add_service_area_geocode_attempts,
+        add_google_token_refresh_claims,
+        add_photo_processing_status,
+        add_statement_level_cuisine_counts,
+        add_google_calendar_sync_claims,
         #add more migration functions here
     ]
 
@@ -0,0 +1,7 @@
+# gunicorn app:app -c gunicorn.conf.py
+# Background threads are started per worker after the fork, so --preload is safe
+
+
+def post_fork(server, worker):
+    from app import start_background_workers
+    start_background_workers()
@@ -0,0 +1,198 @@
+"""
+Cache Invalidation Bus for ChefAsap Backend
+Keeps in-process caches consistent across workers and hosts.
+
+Write handlers call publish(cursor, entity_type, entity_id) inside their transaction.
+It queues a NOTIFY on the 'cache_invalidation' channel, which PostgreSQL delivers only
+if the transaction commits. Each process runs one listener thread (start_cache_bus)
+that evicts the matching keys from caches registered with register_cache, or calls
+handlers added with subscribe.
+
+Bounded staleness: the listener wakes up every HEARTBEAT_SECONDS and pings its
+connection. If the connection is lost, every registered cache is cleared right away,
+and again after reconnecting, because events sent while disconnected are gone. A
+cached entry is therefore never served more than about HEARTBEAT_SECONDS after a
+committed write elsewhere. Propagation lag (publish to eviction) is kept in metrics().
+"""
+
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from database.db_helper import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'cache_invalidation'
+HEARTBEAT_SECONDS = 5
+RECONNECT_SECONDS = 2
+SLOW_EVENT_SECONDS = 1.0
+
+_origin = None
+_origin_pid = None
+_origin_lock = threading.Lock()
+
+_handlers = {}
+_handlers_lock = threading.Lock()
+_listener = None
+_listener_lock = threading.Lock()
+
+_metrics = {
+    'connected': False,
+    'events': 0,
+    'resyncs': 0,
+    'last_lag_seconds': None,
+    'max_lag_seconds': 0.0,
+    'total_lag_seconds': 0.0,
+    'last_heartbeat': None,
+}
+_metrics_lock = threading.Lock()
+
+
+def origin():
+    """
+    Identifies this process, so a worker does not evict what it has just cached itself.
+    Derived per PID, so workers forked from a preloaded app each get their own.
+    """
+    global _origin, _origin_pid
+    with _origin_lock:
+        if _origin_pid != os.getpid():
+            _origin_pid = os.getpid()
+            _origin = f'{_origin_pid}-{uuid.uuid4().hex[:8]}'
+        return _origin
+
+
+def publish(cursor, entity_type, entity_id, version=None):
+    """
+    Announce that an entity changed, from inside the writing transaction. version
+    defaults to the transaction id, which increases with every writing transaction.
+    """
+    cursor.execute('''
+        SELECT pg_notify(%s, json_build_object(
+            'type', %s,
+            'id', %s,
+            'version', COALESCE(%s, txid_current()),
+            'origin', %s,
+            'sent_at', extract(epoch FROM clock_timestamp())
+        )::text)
+    ''', (CHANNEL, entity_type, str(entity_id), version, origin()))
+
+
+def subscribe(entity_type, handler):
+    """
+    Call handler(entity_id, version) for every change to entity_type made by another
+    process, and handler(None, None) when events may have been missed (clear everything)
+    """
+    with _handlers_lock:
+        _handlers.setdefault(entity_type, []).append(handler)
+
+
+def register_cache(entity_type, cache, lock, key=str):
+    """Evict key(entity_id) from cache (guarded by lock) whenever the entity changes"""
+    def evict(entity_id, version):
+        with lock:
+            if entity_id is None:
+                cache.clear()
+            else:
+                cache.pop(key(entity_id), None)
+    subscribe(entity_type, evict)
+
+
+def _dispatch(entity_type, entity_id, version):
+    with _handlers_lock:
+        handlers = list(_handlers.get(entity_type, ()))
+    for handler in handlers:
+        try:
+            handler(entity_id, version)
+        except Exception as e:
+            logger.error(f"Cache invalidation handler for {entity_type} failed: {e}")
+
+
+def _resync():
+    """Clear every registered cache; used whenever events may have been lost"""
+    with _handlers_lock:
+        entity_types = list(_handlers)
+    for entity_type in entity_types:
+        _dispatch(entity_type, None, None)
+    with _metrics_lock:
+        _metrics['resyncs'] += 1
+
+
+def _handle_notification(payload):
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.warning(f"Ignoring malformed cache invalidation: {payload}")
+        return
+    if event.get('origin') == origin():
+        return
+    _dispatch(event['type'], event['id'], event.get('version'))
+
+    lag = max(0.0, time.time() - float(event.get('sent_at') or time.time()))
+    with _metrics_lock:
+        _metrics['events'] += 1
+        _metrics['last_lag_seconds'] = lag
+        _metrics['max_lag_seconds'] = max(_metrics['max_lag_seconds'], lag)
+        _metrics['total_lag_seconds'] += lag
+    if lag > SLOW_EVENT_SECONDS:
+        logger.warning(f"Cache invalidation for {event['type']} {event['id']} took {lag:.2f}s")
+
+
+def metrics():
+    """Listener health and propagation lag, for monitoring"""
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+    total = snapshot.pop('total_lag_seconds')
+    snapshot['avg_lag_seconds'] = total / snapshot['events'] if snapshot['events'] else None
+    return snapshot
+
+
+def _set_connected(connected):
+    with _metrics_lock:
+        _metrics['connected'] = connected
+        if connected:
+            _metrics['last_heartbeat'] = time.time()
+
+
+def _listen_loop():
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = conn.cursor()
+            cursor.execute(f'LISTEN {CHANNEL}')
+            _set_connected(True)
+            _resync()
+            while True:
+                if select.select([conn], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                    # Quiet channel: make sure the connection is still there
+                    cursor.execute('SELECT 1')
+                    _set_connected(True)
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _handle_notification(conn.notifies.pop(0).payload)
+        except Exception as e:
+            logger.error(f"Cache invalidation listener error: {e}")
+            _set_connected(False)
+            _resync()
+            time.sleep(RECONNECT_SECONDS)
+        finally:
+            if conn:
+                conn.close()
+
+
+def start_cache_bus():
+    """Start the invalidation listener once per process"""
+    global _listener
+    with _listener_lock:
+        # A thread object inherited through fork is not alive in the child
+        if _listener is not None and _listener.is_alive():
+            return
+        _listener = threading.Thread(target=_listen_loop, name='cache-bus', daemon=True)
+        _listener.start()
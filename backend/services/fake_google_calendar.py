@@ -0,0 +1,113 @@
+"""
+Local fake of the Google Calendar events API for development and tests
+Implements just enough of service.events().list(...).execute() for the incremental
+sync in services.google_calendar_sync: paging with pageToken, nextSyncToken, changed
+and cancelled events returned for a syncToken, and 410 Gone for unknown tokens.
+
+    from services import fake_google_calendar
+    fake_google_calendar.calendar.add_event('evt1', '2025-05-01T18:00:00Z', '2025-05-01T21:00:00Z')
+    GOOGLE_CALENDAR_FAKE=1  ->  google_calendar_sync uses this calendar
+"""
+
+import threading
+
+
+class FakeHttpError(Exception):
+    """Mimics googleapiclient.errors.HttpError enough for status checks"""
+
+    class _Response:
+        def __init__(self, status):
+            self.status = status
+
+    def __init__(self, status, message=''):
+        super().__init__(message or f'HTTP {status}')
+        self.resp = self._Response(status)
+
+
+class FakeCalendar:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+        self._changed_at = {}
+        self._version = 0
+
+    def _touch(self, event_id):
+        self._version += 1
+        self._changed_at[event_id] = self._version
+
+    def add_event(self, event_id, start, end, summary='Busy', all_day=False, transparency='opaque'):
+        key = 'date' if all_day else 'dateTime'
+        with self._lock:
+            self._events[event_id] = {
+                'id': event_id,
+                'status': 'confirmed',
+                'summary': summary,
+                'start': {key: start},
+                'end': {key: end},
+                'transparency': transparency,
+                'sequence': self._events.get(event_id, {}).get('sequence', -1) + 1,
+            }
+            self._touch(event_id)
+
+    def cancel_event(self, event_id):
+        with self._lock:
+            self._events[event_id] = {'id': event_id, 'status': 'cancelled'}
+            self._touch(event_id)
+
+    def list_events(self, syncToken=None, pageToken=None, maxResults=250, **_):
+        with self._lock:
+            if pageToken:
+                since, offset = (int(part) for part in pageToken.split(':'))
+            elif syncToken:
+                if not syncToken.isdigit() or int(syncToken) > self._version:
+                    raise FakeHttpError(410, 'Sync token is no longer valid')
+                since, offset = int(syncToken), 0
+            else:
+                since, offset = 0, 0
+
+            if since == 0:
+                # Full sync: live events only
+                changed = [e for e in self._events.values() if e['status'] != 'cancelled']
+            else:
+                changed = [self._events[i] for i, v in self._changed_at.items() if v > since]
+
+            changed.sort(key=lambda e: e['id'])
+            page = changed[offset:offset + maxResults]
+            result = {'items': [dict(e) for e in page]}
+            if offset + maxResults < len(changed):
+                result['nextPageToken'] = f'{since}:{offset + maxResults}'
+            else:
+                result['nextSyncToken'] = str(self._version)
+            return result
+
+
+class _Request:
+    def __init__(self, calendar, params):
+        self._calendar = calendar
+        self._params = params
+
+    def execute(self, num_retries=0):
+        return self._calendar.list_events(**self._params)
+
+
+class _Events:
+    def __init__(self, calendar):
+        self._calendar = calendar
+
+    def list(self, **params):
+        return _Request(self._calendar, params)
+
+
+class FakeCalendarService:
+    def __init__(self, calendar):
+        self._calendar = calendar
+
+    def events(self):
+        return _Events(self._calendar)
+
+
+calendar = FakeCalendar()
+
+
+def fake_calendar_service():
+    return FakeCalendarService(calendar)
@@ -9,13 +9,20 @@ from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 from typing import Tuple, Optional, Dict
 import logging
+from services import http_client
 
 logger = logging.getLogger(__name__)
 
 class GeocodingService:
     def __init__(self):
         # Initialize Nominatim (free OpenStreetMap geocoder)
-        self.nominatim = Nominatim(user_agent="chefasap_v1.0")
+        # Pooled connections, bounded retries and a breaker so a slow Nominatim fails fast
+        self.nominatim = Nominatim(
+            user_agent="chefasap_v1.0",
+            timeout=http_client.get_timeout('nominatim')[1],
+            adapter_factory=http_client.geopy_adapter_factory()
+        )
+        self.breaker = http_client.get_breaker('nominatim')
         
         # Fallback hardcoded coordinates for major cities/zip codes
         self.fallback_coordinates = {
@@ -54,7 +61,7 @@ class GeocodingService:
         """
         try:
             # Try Nominatim first (free, no API key required)
-            location = self.nominatim.geocode(address, timeout=10)
+            location = self.breaker.call(self.nominatim.geocode, address)
             if location:
                 logger.info(f"Successfully geocoded address: {address} -> ({location.latitude}, {location.longitude})")
                 return (location.latitude, location.longitude)
@@ -80,30 +87,43 @@ class GeocodingService:
             logger.error(f"Unexpected error geocoding address '{address}': {e}")
             return None
     
-    def get_zip_coordinates(self, zip_code: str) -> Tuple[float, float]:
+    def lookup_zip(self, zip_code: str) -> Optional[Tuple[float, float]]:
         """
-        Get coordinates for a ZIP code using geocoding service with intelligent fallbacks
+        Coordinates of a ZIP code from a known exact match or the geocoder, with no guessing
         Args:
             zip_code: ZIP code string (e.g., "60601" or "60601-1234")
         Returns:
-            Tuple of (latitude, longitude)
+            Tuple of (latitude, longitude), or None if the ZIP could not be geocoded
         """
-        # Clean zip code (remove +4 extension)
         clean_zip = zip_code.split('-')[0].strip()
-        
-        # Try exact match first
-        if clean_zip in self.fallback_coordinates:
+        if len(clean_zip) == 5 and clean_zip in self.fallback_coordinates:
             return self.fallback_coordinates[clean_zip]
         
-        # Try geocoding the zip code
         try:
-            location = self.nominatim.geocode(f"{clean_zip}, USA", timeout=10)
+            location = self.breaker.call(self.nominatim.geocode, f"{clean_zip}, USA")
             if location:
                 coords = (location.latitude, location.longitude)
                 logger.info(f"Geocoded ZIP {clean_zip}: {coords}")
                 return coords
         except Exception as e:
             logger.warning(f"Could not geocode ZIP {clean_zip}: {e}")
+        return None
+    
+    def get_zip_coordinates(self, zip_code: str) -> Tuple[float, float]:
+        """
+        Get coordinates for a ZIP code using geocoding service with intelligent fallbacks.
+        The fallbacks are guesses: use lookup_zip for anything that gets stored.
+        Args:
+            zip_code: ZIP code string (e.g., "60601" or "60601-1234")
+        Returns:
+            Tuple of (latitude, longitude)
+        """
+        # Clean zip code (remove +4 extension)
+        clean_zip = zip_code.split('-')[0].strip()
+        
+        coords = self.lookup_zip(clean_zip)
+        if coords:
+            return coords
         
         # Try partial ZIP matching for major areas (first 2 digits)
         zip_prefix = clean_zip[:2]
@@ -130,7 +150,7 @@ class GeocodingService:
                 query += f", {state}"
             query += ", USA"
             
-            location = self.nominatim.geocode(query, timeout=10)
+            location = self.breaker.call(self.nominatim.geocode, query)
             if location:
                 return (location.latitude, location.longitude)
             
@@ -149,7 +169,7 @@ class GeocodingService:
             Dictionary with address components or None
         """
         try:
-            location = self.nominatim.reverse(f"{latitude}, {longitude}", timeout=10)
+            location = self.breaker.call(self.nominatim.reverse, f"{latitude}, {longitude}")
             if location and location.raw:
                 address = location.raw.get('address', {})
                 return {
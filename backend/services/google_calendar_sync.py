@@ -0,0 +1,431 @@
+"""
+Google Calendar Sync for ChefAsap Backend
+Mirrors each connected user's Google Calendar busy time into external_busy_blocks.
+
+The first sync lists events in a bounded window and stores Google's nextSyncToken;
+later syncs send that token and receive only events changed since, so a sync transfers
+changes only. Changes are fetched before the sync-state row is locked, and the lock is
+held only while they are written. Availability checks then read busy time locally;
+request_sync() refreshes a user in the background when a read finds the copy stale.
+
+Every worker runs the scheduler, so a user is leased (FOR UPDATE SKIP LOCKED plus
+google_calendar_tokens.sync_claimed_until, as the token refresher does) before Google
+is called, and only one process syncs them at a time.
+
+Set GOOGLE_CALENDAR_FAKE=1 to sync against services.fake_google_calendar instead of
+Google (local development and tests).
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from dateutil import parser as date_parser
+from psycopg2.extras import execute_values
+from database.db_helper import get_db_connection, get_cursor
+from services import google_tokens, http_client
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL_SECONDS = 900
+SYNC_BATCH_SIZE = 20
+PAGE_SIZE = 250
+# Window of busy time mirrored: the first (full) sync lists only this range, and
+# incremental changes that fall outside it are dropped
+FULL_SYNC_LOOKBACK_DAYS = 1
+SYNC_HORIZON_DAYS = 365
+# Reads older than this queue a background sync
+SYNC_ON_READ_AFTER_SECONDS = 60
+# How long a process holds a user's sync; a crashed sync only delays the next one
+SYNC_CLAIM_SECONDS = 300
+
+_request_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='google-sync-request')
+_requested_users = set()
+_requested_users_lock = threading.Lock()
+
+
+class SyncTokenExpired(Exception):
+    """Google answered 410 Gone: the stored sync token must be dropped"""
+
+
+def calendar_service(creds):
+    """Calendar API client using the bundled discovery document and a bounded read timeout"""
+    if os.getenv('GOOGLE_CALENDAR_FAKE') == '1':
+        from services.fake_google_calendar import fake_calendar_service
+        return fake_calendar_service()
+
+    import google_auth_httplib2
+    import httplib2
+    from googleapiclient.discovery import build
+
+    read_timeout = http_client.get_timeout('google')[1]
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=read_timeout))
+    return build('calendar', 'v3', http=http, static_discovery=True, cache_discovery=False)
+
+
+def credentials_for(data):
+    from google.oauth2.credentials import Credentials
+    return Credentials(
+        token=data['access_token'],
+        refresh_token=data.get('refresh_token'),
+        token_uri=google_tokens.GOOGLE_TOKEN_ENDPOINT,
+        client_id=google_tokens.GOOGLE_CLIENT_ID,
+        client_secret=google_tokens.GOOGLE_CLIENT_SECRET,
+        scopes=['https://www.googleapis.com/auth/calendar.readonly'],
+    )
+
+
+def _to_utc_naive(value):
+    parsed = date_parser.isoparse(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def event_to_block(event):
+    """
+    Convert a Google event into an external_busy_blocks row, or None if it does not
+    block time (cancelled, marked 'free', or missing times).
+    """
+    if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+        return None
+    start = event.get('start') or {}
+    end = event.get('end') or {}
+    all_day = 'date' in start
+    start_value = start.get('dateTime') or start.get('date')
+    end_value = end.get('dateTime') or end.get('date')
+    if not (start_value and end_value):
+        return None
+    return (
+        event['id'],
+        event.get('summary'),
+        _to_utc_naive(start_value),
+        _to_utc_naive(end_value),
+        all_day,
+        event.get('sequence', 0),
+    )
+
+
+def sync_window():
+    """(starts_after, ends_before) of the busy time kept, as naive UTC"""
+    now = datetime.utcnow()
+    return now - timedelta(days=FULL_SYNC_LOOKBACK_DAYS), now + timedelta(days=SYNC_HORIZON_DAYS)
+
+
+def list_changes(service, sync_token, on_page):
+    """
+    Page through events (changes since sync_token, or everything in sync_window() when
+    None), calling on_page(events) for each page. Returns Google's nextSyncToken.
+    """
+    params = {'calendarId': 'primary', 'singleEvents': True, 'maxResults': PAGE_SIZE}
+    if sync_token:
+        params['syncToken'] = sync_token
+    else:
+        # Without timeMax, singleEvents expands open-ended recurring events without end
+        time_min, time_max = sync_window()
+        params['timeMin'] = time_min.isoformat() + 'Z'
+        params['timeMax'] = time_max.isoformat() + 'Z'
+
+    breaker = http_client.get_breaker('google')
+    retries = http_client.PROVIDER_SETTINGS['google']['retries']
+    while True:
+        try:
+            page = breaker.call(service.events().list(**params).execute, num_retries=retries)
+        except Exception as e:
+            if getattr(getattr(e, 'resp', None), 'status', None) == 410:
+                raise SyncTokenExpired() from e
+            raise
+        on_page(page.get('items', []))
+        if not page.get('nextPageToken'):
+            return page.get('nextSyncToken')
+        params['pageToken'] = page['nextPageToken']
+
+
+def apply_events(cursor, user_id, events):
+    """
+    Bulk upsert busy events and bulk delete cancelled/free ones for one user. Events
+    moved outside sync_window() are deleted too.
+    """
+    window_start, window_end = sync_window()
+    blocks = []
+    removed_ids = []
+    for event in events:
+        block = event_to_block(event)
+        if block and block[3] > window_start and block[2] < window_end:
+            blocks.append((user_id, 'google') + block)
+        else:
+            removed_ids.append(event['id'])
+
+    if blocks:
+        execute_values(cursor, '''
+            INSERT INTO external_busy_blocks
+                (user_id, source, external_id, summary, starts_at, ends_at, all_day, sequence)
+            VALUES %s
+            ON CONFLICT (user_id, source, external_id) DO UPDATE SET
+                summary = EXCLUDED.summary,
+                starts_at = EXCLUDED.starts_at,
+                ends_at = EXCLUDED.ends_at,
+                all_day = EXCLUDED.all_day,
+                sequence = EXCLUDED.sequence,
+                updated_at = CURRENT_TIMESTAMP
+        ''', blocks, page_size=PAGE_SIZE)
+
+    if removed_ids:
+        cursor.execute('''
+            DELETE FROM external_busy_blocks
+            WHERE user_id = %s AND source = 'google' AND external_id = ANY(%s)
+        ''', (user_id, removed_ids))
+
+    return len(blocks), len(removed_ids)
+
+
+def sync_user(conn, cursor, user_id, service):
+    """
+    Pull changes for one user and store them. Incremental when a sync token is stored;
+    falls back to a full sync (replacing the user's Google blocks) if Google expired it.
+    Returns (upserted, removed, full_sync).
+    """
+    try:
+        return _run_sync(conn, cursor, user_id, service, use_sync_token=True)
+    except SyncTokenExpired:
+        logger.info(f"Google sync token expired for user {user_id}; running full sync")
+        conn.rollback()
+        return _run_sync(conn, cursor, user_id, service, use_sync_token=False)
+
+
+def _run_sync(conn, cursor, user_id, service, use_sync_token):
+    cursor.execute('''
+        INSERT INTO google_calendar_sync_state (user_id) VALUES (%s)
+        ON CONFLICT (user_id) DO NOTHING
+    ''', (user_id,))
+    cursor.execute('''
+        SELECT sync_token FROM google_calendar_sync_state WHERE user_id = %s
+    ''', (user_id,))
+    stored_token = cursor.fetchone()['sync_token']
+    sync_token = stored_token if use_sync_token else None
+    # No transaction or lock is held while Google is being called
+    conn.commit()
+
+    events = []
+    next_sync_token = list_changes(service, sync_token, events.extend)
+
+    # The row lock serializes writers; if another process stored a newer token since
+    # this sync read it, its result is at least as new and this one is dropped
+    cursor.execute('''
+        SELECT sync_token FROM google_calendar_sync_state WHERE user_id = %s FOR UPDATE
+    ''', (user_id,))
+    if cursor.fetchone()['sync_token'] != stored_token:
+        conn.rollback()
+        logger.info(f"Google sync for user {user_id} superseded by a concurrent sync")
+        return 0, 0, False
+
+    full_sync = sync_token is None
+    if full_sync:
+        cursor.execute('''
+            DELETE FROM external_busy_blocks WHERE user_id = %s AND source = 'google'
+        ''', (user_id,))
+
+    upserted, removed = 0, 0
+    for offset in range(0, len(events), PAGE_SIZE):
+        page_upserted, page_removed = apply_events(cursor, user_id, events[offset:offset + PAGE_SIZE])
+        upserted += page_upserted
+        removed += page_removed
+
+    cursor.execute('''
+        UPDATE google_calendar_sync_state
+        SET sync_token = %s, last_synced_at = CURRENT_TIMESTAMP, last_error = NULL
+        WHERE user_id = %s
+    ''', (next_sync_token, user_id))
+    conn.commit()
+    return upserted, removed, full_sync
+
+
+def sync_user_calendar(user_id):
+    """Sync one user now; returns (result, error)"""
+    data, err = google_tokens.get_access_token(user_id)
+    if err:
+        return None, err
+
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        service = calendar_service(credentials_for(data))
+        upserted, removed, full_sync = sync_user(conn, cursor, user_id, service)
+        return {'upserted': upserted, 'removed': removed, 'full_sync': full_sync}, None
+    except Exception as e:
+        conn.rollback()
+        cursor.execute('''
+            INSERT INTO google_calendar_sync_state (user_id, last_error) VALUES (%s, %s)
+            ON CONFLICT (user_id) DO UPDATE SET last_error = EXCLUDED.last_error
+        ''', (user_id, str(e)))
+        conn.commit()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_sync_status(cursor, user_id):
+    """
+    {'last_synced_at', 'last_error', 'stale'} of a user's Google sync, or None before the
+    first one. stale means older than SYNC_ON_READ_AFTER_SECONDS.
+    """
+    cursor.execute('''
+        SELECT last_synced_at, last_error,
+               last_synced_at IS NULL
+               OR last_synced_at < CURRENT_TIMESTAMP - make_interval(secs => %s) AS stale
+        FROM google_calendar_sync_state
+        WHERE user_id = %s
+    ''', (SYNC_ON_READ_AFTER_SECONDS, user_id))
+    return cursor.fetchone()
+
+
+def _claim_due_users(cursor, batch_size):
+    """Lease a batch of users whose last sync is older than SYNC_INTERVAL_SECONDS"""
+    cursor.execute('''
+        UPDATE google_calendar_tokens t
+        SET sync_claimed_until = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') + make_interval(secs => %s)
+        FROM (
+            SELECT t.user_id
+            FROM google_calendar_tokens t
+            LEFT JOIN google_calendar_sync_state s ON s.user_id = t.user_id
+            WHERE (s.last_synced_at IS NULL
+                   OR s.last_synced_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+            AND (t.sync_claimed_until IS NULL
+                 OR t.sync_claimed_until < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'))
+            ORDER BY s.last_synced_at NULLS FIRST
+            LIMIT %s
+            FOR UPDATE OF t SKIP LOCKED
+        ) due
+        WHERE t.user_id = due.user_id
+        RETURNING t.user_id
+    ''', (SYNC_CLAIM_SECONDS, SYNC_INTERVAL_SECONDS, batch_size))
+    return [row['user_id'] for row in cursor.fetchall()]
+
+
+def _claim_user(user_id):
+    """Lease one user's sync; False while another process holds it"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            UPDATE google_calendar_tokens
+            SET sync_claimed_until = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') + make_interval(secs => %s)
+            WHERE user_id = %s
+            AND (sync_claimed_until IS NULL
+                 OR sync_claimed_until < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'))
+        ''', (SYNC_CLAIM_SECONDS, user_id))
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        return claimed
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _release_user(user_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            'UPDATE google_calendar_tokens SET sync_claimed_until = NULL WHERE user_id = %s',
+            (user_id,)
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _run_requested_sync(user_id):
+    try:
+        if not _claim_user(user_id):
+            return
+        try:
+            _, err = sync_user_calendar(user_id)
+            if err:
+                logger.warning(f"Skipped requested Google sync for user {user_id}: {err}")
+        finally:
+            _release_user(user_id)
+    except Exception as e:
+        logger.error(f"Requested Google sync failed for user {user_id}: {e}")
+    finally:
+        with _requested_users_lock:
+            _requested_users.discard(user_id)
+
+
+def request_sync(user_id):
+    """Sync a user in the background unless a sync for them is already queued; returns True if queued"""
+    with _requested_users_lock:
+        if user_id in _requested_users:
+            return False
+        _requested_users.add(user_id)
+    _request_executor.submit(_run_requested_sync, user_id)
+    return True
+
+
+def get_busy_blocks(cursor, user_id, starts_after, ends_before):
+    cursor.execute('''
+        SELECT external_id, source, summary, starts_at, ends_at, all_day
+        FROM external_busy_blocks
+        WHERE user_id = %s AND ends_at > %s AND starts_at < %s
+        ORDER BY starts_at
+    ''', (user_id, starts_after, ends_before))
+    return cursor.fetchall()
+
+
+def sync_due_users(batch_size=SYNC_BATCH_SIZE):
+    """
+    Sync connected users whose last sync is older than SYNC_INTERVAL_SECONDS. The batch
+    is leased and committed first, so no lock is held while Google is called.
+    """
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        user_ids = _claim_due_users(cursor, batch_size)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    synced = 0
+    for user_id in user_ids:
+        try:
+            _, err = sync_user_calendar(user_id)
+            if err:
+                logger.warning(f"Skipped Google sync for user {user_id}: {err}")
+            else:
+                synced += 1
+        except Exception as e:
+            logger.error(f"Google sync failed for user {user_id}: {e}")
+        finally:
+            try:
+                _release_user(user_id)
+            except Exception as e:
+                logger.error(f"Could not release the Google sync lease of user {user_id}: {e}")
+    return synced
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _scheduler_loop():
+    while True:
+        try:
+            sync_due_users()
+        except Exception as e:
+            logger.error(f"Google sync scheduler error: {e}")
+        time.sleep(60)
+
+
+def start_sync_scheduler():
+    """Start the background sync scheduler once per process"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler.is_alive():
+            return
+        _scheduler = threading.Thread(target=_scheduler_loop, name='google-calendar-sync', daemon=True)
+        _scheduler.start()
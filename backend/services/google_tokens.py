@@ -0,0 +1,300 @@
+"""
+Google Calendar Token Store for ChefAsap Backend
+Keeps each user's Google OAuth tokens in google_calendar_tokens, encrypted with pgcrypto
+under GOOGLE_TOKEN_ENCRYPTION_KEY, with a short-lived in-process cache in front.
+
+A background refresher renews access tokens in batches before they expire, so request
+handlers normally get a valid token without a round trip to Google. Each batch is claimed
+(FOR UPDATE SKIP LOCKED plus a refresh_claimed_until lease) and committed before any
+request goes out, so several app processes can run the refresher safely and no row lock
+is held across calls to Google.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from cachetools import TTLCache
+from database.db_helper import get_db_connection, get_cursor
+from services import cache_bus, http_client, metrics
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TOKEN_ENDPOINT = 'https://oauth2.googleapis.com/token'
+GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
+GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
+TOKEN_ENCRYPTION_KEY = os.getenv('GOOGLE_TOKEN_ENCRYPTION_KEY')
+
+# Tokens used to live in static/google_tokens/<user_id>.json; the
+# add_google_token_refresh_claims migration moves them all into the table
+LEGACY_TOKEN_DIR = os.path.join(os.path.dirname(__file__), '..', 'static', 'google_tokens')
+
+EXPIRY_PADDING_SECONDS = 60
+REFRESH_AHEAD_SECONDS = 600
+REFRESH_INTERVAL_SECONDS = 60
+REFRESH_BATCH_SIZE = 50
+REFRESH_CLAIM_SECONDS = 300
+MAX_REFRESH_FAILURES = 5
+
+# Cached entries live shorter than REFRESH_AHEAD_SECONDS, so a token renewed by another
+# process is picked up before the cached one gets close to expiring
+token_cache = TTLCache(maxsize=1000, ttl=300)
+token_cache_lock = threading.Lock()
+# Tokens rewritten by another process (a refresh, a reconnect) are evicted here right away
+cache_bus.register_cache('google_tokens', token_cache, token_cache_lock)
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def _encryption_key():
+    if not TOKEN_ENCRYPTION_KEY:
+        raise RuntimeError('GOOGLE_TOKEN_ENCRYPTION_KEY is not set')
+    return TOKEN_ENCRYPTION_KEY
+
+
+def _cache_put(user_id, data):
+    with token_cache_lock:
+        token_cache[user_id] = data
+
+
+def _cache_get(user_id):
+    with token_cache_lock:
+        data = token_cache.get(user_id)
+    metrics.record_cache('google_tokens', data is not None)
+    return data
+
+
+def _read_tokens(cursor, user_id):
+    cursor.execute('''
+        SELECT pgp_sym_decrypt(access_token, %s) AS access_token,
+               pgp_sym_decrypt(refresh_token, %s) AS refresh_token,
+               scope,
+               token_type,
+               EXTRACT(EPOCH FROM expires_at AT TIME ZONE 'UTC') AS expires_at
+        FROM google_calendar_tokens
+        WHERE user_id = %s
+    ''', (_encryption_key(), _encryption_key(), user_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    data = dict(row)
+    data['expires_at'] = float(data['expires_at'])
+    return data
+
+
+def _write_tokens(cursor, user_id, tok):
+    cursor.execute('''
+        INSERT INTO google_calendar_tokens
+            (user_id, access_token, refresh_token, scope, token_type, expires_at)
+        VALUES (%s, pgp_sym_encrypt(%s, %s), pgp_sym_encrypt(%s, %s), %s, %s,
+                to_timestamp(%s) AT TIME ZONE 'UTC')
+        ON CONFLICT (user_id) DO UPDATE SET
+            access_token = EXCLUDED.access_token,
+            refresh_token = COALESCE(EXCLUDED.refresh_token, google_calendar_tokens.refresh_token),
+            scope = COALESCE(EXCLUDED.scope, google_calendar_tokens.scope),
+            token_type = COALESCE(EXCLUDED.token_type, google_calendar_tokens.token_type),
+            expires_at = EXCLUDED.expires_at,
+            refresh_failures = 0,
+            last_error = NULL,
+            refresh_claimed_until = NULL,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (user_id, tok['access_token'], _encryption_key(), tok.get('refresh_token'), _encryption_key(),
+          tok.get('scope'), tok.get('token_type'), tok['expires_at']))
+    cache_bus.publish(cursor, 'google_tokens', user_id)
+
+
+def import_legacy_token_files(cursor):
+    """
+    Copy every token file left over from the file-based store into the table.
+    A user who already has a row keeps it; their file is stale.
+    Returns the file paths, which the caller deletes once the copy is committed.
+    """
+    if not os.path.isdir(LEGACY_TOKEN_DIR):
+        return []
+
+    paths = []
+    for name in sorted(os.listdir(LEGACY_TOKEN_DIR)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(LEGACY_TOKEN_DIR, name)
+        user_id = name[:-len('.json')]
+        cursor.execute('SELECT 1 FROM google_calendar_tokens WHERE user_id = %s', (user_id,))
+        if cursor.fetchone() is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                _write_tokens(cursor, user_id, json.load(f))
+            logger.info(f"Moved Google tokens for user {user_id} into the database")
+        paths.append(path)
+    return paths
+
+
+def save_tokens(user_id, tok):
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        _write_tokens(cursor, user_id, tok)
+        conn.commit()
+        data = _read_tokens(cursor, user_id)
+    finally:
+        cursor.close()
+        conn.close()
+    _cache_put(user_id, data)
+    return data
+
+
+def load_tokens(user_id, use_cache=True):
+    if use_cache:
+        data = _cache_get(user_id)
+        if data:
+            return data
+
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        data = _read_tokens(cursor, user_id)
+    finally:
+        cursor.close()
+        conn.close()
+
+    if data:
+        _cache_put(user_id, data)
+    return data
+
+
+def request_refresh(refresh_token):
+    """Exchange a refresh token for a new access token; returns (token_response, error)"""
+    r = http_client.request('google', 'POST', GOOGLE_TOKEN_ENDPOINT, data={
+        'client_id': GOOGLE_CLIENT_ID,
+        'client_secret': GOOGLE_CLIENT_SECRET,
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+    })
+    if r.status_code != 200:
+        return None, f"Refresh failed: {r.text}"
+    return r.json(), None
+
+
+def _is_fresh(data):
+    return data.get('expires_at', 0) > time.time() + EXPIRY_PADDING_SECONDS
+
+
+def get_access_token(user_id):
+    """
+    Return (token_data, error) with a currently valid access token.
+    Refreshing here is a fallback; normally the background refresher got there first.
+    """
+    data = load_tokens(user_id)
+    if not data:
+        return None, 'Not connected'
+    if _is_fresh(data):
+        return data, None
+
+    # Another process may already have renewed it
+    data = load_tokens(user_id, use_cache=False)
+    if data and _is_fresh(data):
+        return data, None
+
+    nd, err = request_refresh(data.get('refresh_token'))
+    if err:
+        return None, err
+    data = save_tokens(user_id, {
+        'access_token': nd['access_token'],
+        'expires_at': time.time() + int(nd.get('expires_in', 3600)),
+    })
+    return data, None
+
+
+def _claim_expiring_tokens(cursor, batch_size):
+    """
+    Lease a batch of tokens expiring within REFRESH_AHEAD_SECONDS to this process.
+    Leased rows are skipped by other refreshers until the lease runs out, so the
+    batch can be committed before refreshing; a crashed refresher only delays them.
+    """
+    cursor.execute('''
+        UPDATE google_calendar_tokens t
+        SET refresh_claimed_until = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') + make_interval(secs => %s)
+        FROM (
+            SELECT user_id
+            FROM google_calendar_tokens
+            WHERE refresh_token IS NOT NULL
+            AND refresh_failures < %s
+            AND expires_at < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') + make_interval(secs => %s)
+            AND (refresh_claimed_until IS NULL
+                 OR refresh_claimed_until < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'))
+            ORDER BY expires_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ) due
+        WHERE t.user_id = due.user_id
+        RETURNING t.user_id, pgp_sym_decrypt(t.refresh_token, %s) AS refresh_token
+    ''', (REFRESH_CLAIM_SECONDS, MAX_REFRESH_FAILURES, REFRESH_AHEAD_SECONDS, batch_size,
+          _encryption_key()))
+    return cursor.fetchall()
+
+
+def refresh_expiring_tokens(batch_size=REFRESH_BATCH_SIZE):
+    """Renew one batch of tokens that expire within REFRESH_AHEAD_SECONDS; returns the batch size"""
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        due = _claim_expiring_tokens(cursor, batch_size)
+        conn.commit()
+
+        # No transaction is open while Google is being called; each result commits on its own
+        for row in due:
+            try:
+                nd, err = request_refresh(row['refresh_token'])
+            except Exception as e:
+                nd, err = None, str(e)
+
+            try:
+                if err:
+                    # The lease is left in place, so the retry waits for it to run out
+                    cursor.execute('''
+                        UPDATE google_calendar_tokens
+                        SET refresh_failures = refresh_failures + 1, last_error = %s
+                        WHERE user_id = %s
+                    ''', (err, row['user_id']))
+                    logger.warning(f"Could not refresh Google token for user {row['user_id']}: {err}")
+                else:
+                    _write_tokens(cursor, row['user_id'], {
+                        'access_token': nd['access_token'],
+                        'expires_at': time.time() + int(nd.get('expires_in', 3600)),
+                    })
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Could not store refreshed Google token for user {row['user_id']}: {e}")
+                continue
+
+            if not err:
+                with token_cache_lock:
+                    token_cache.pop(row['user_id'], None)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return len(due)
+
+
+def _refresher_loop():
+    while True:
+        try:
+            # Keep going while full batches come back
+            while refresh_expiring_tokens() >= REFRESH_BATCH_SIZE:
+                pass
+        except Exception as e:
+            logger.error(f"Google token refresher error: {e}")
+        time.sleep(REFRESH_INTERVAL_SECONDS)
+
+
+def start_token_refresher():
+    """Start the background refresher once per process"""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None and _refresher.is_alive():
+            return
+        _refresher = threading.Thread(target=_refresher_loop, name='google-token-refresher', daemon=True)
+        _refresher.start()
@@ -0,0 +1,269 @@
+"""
+Outbound HTTP Client for ChefAsap Backend
+Shared connection pools, deadlines, retries and circuit breakers for third-party calls
+(Stripe, Google, Nominatim), so a slow provider cannot tie up request threads.
+
+- one keep-alive requests.Session per provider
+- every call has a (connect, read) timeout
+- idempotent calls retry with jittered exponential backoff (POST is never retried here)
+- a circuit breaker per provider fails fast after repeated failures
+"""
+
+import functools
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds and retry counts for idempotent calls
+PROVIDER_SETTINGS = {
+    'stripe': {'timeout': (5, 30), 'retries': 2},
+    'google': {'timeout': (5, 15), 'retries': 2},
+    'nominatim': {'timeout': (3, 10), 'retries': 1},
+}
+POOL_MAXSIZE = 10
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures for one provider. After BREAKER_FAILURE_THRESHOLD the
+    circuit opens and calls fail immediately; after BREAKER_RESET_SECONDS one trial call
+    is let through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit opened for {self.name} after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """End a trial call that neither proved nor disproved the provider is up"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run func through the breaker. Only transport errors and 5xx/429 responses count
+        as provider failures, as in request(); a 4xx (revoked auth, expired sync token,
+        bad query) is the caller's problem and leaves the failure count alone.
+        """
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if classify_exception(e) == 'failure':
+                self.record_failure()
+            else:
+                self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+
+def _status_code(exc):
+    """HTTP status carried by an exception from requests, googleapiclient or geopy, if any"""
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'resp', None), 'status', None)  # googleapiclient HttpError
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_exception(exc):
+    """'failure' (provider down or throttling), 'client_error' (4xx) or 'other' (a local bug)"""
+    status = _status_code(exc)
+    if status is not None:
+        return 'failure' if status >= 500 or status == 429 else 'client_error'
+
+    try:
+        from geopy import exc as geopy_exc
+    except ImportError:
+        geopy_exc = None
+    if geopy_exc is not None and isinstance(exc, geopy_exc.GeopyError):
+        if isinstance(exc, (geopy_exc.GeocoderQueryError, geopy_exc.GeocoderAuthenticationFailure,
+                            geopy_exc.GeocoderInsufficientPrivileges, geopy_exc.ConfigurationError)):
+            return 'client_error'
+        return 'failure'
+
+    transport_errors = (requests.RequestException, OSError)
+    try:
+        import httplib2
+        transport_errors += (httplib2.HttpLib2Error,)
+    except ImportError:
+        pass
+    return 'failure' if isinstance(exc, transport_errors) else 'other'
+
+
+def _retry_policy(retries):
+    # DEFAULT_ALLOWED_METHODS excludes POST/PATCH, so only idempotent calls are retried
+    return Retry(
+        total=retries,
+        backoff_factor=0.5,
+        backoff_jitter=0.5,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def _make_session(provider):
+    # The Stripe SDK runs its own retries (see configure_stripe), so its pool does not retry
+    retries = 0 if provider == 'stripe' else PROVIDER_SETTINGS[provider]['retries']
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=_retry_policy(retries),
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_sessions = {provider: _make_session(provider) for provider in PROVIDER_SETTINGS}
+_breakers = {provider: CircuitBreaker(provider) for provider in PROVIDER_SETTINGS}
+
+
+def get_session(provider):
+    return _sessions[provider]
+
+
+def get_breaker(provider):
+    return _breakers[provider]
+
+
+def get_timeout(provider):
+    return PROVIDER_SETTINGS[provider]['timeout']
+
+
+def request(provider, method, url, timeout=None, **kwargs):
+    """
+    Make an HTTP call to a provider through its pooled session and circuit breaker.
+    5xx and 429 responses count as failures for the breaker but are still returned to the caller.
+    """
+    breaker = get_breaker(provider)
+    breaker.before_call()
+    start = time.perf_counter()
+    try:
+        response = get_session(provider).request(
+            method, url, timeout=timeout or get_timeout(provider), **kwargs
+        )
+    except requests.RequestException:
+        metrics.record_outbound(provider, 'error', time.perf_counter() - start)
+        breaker.record_failure()
+        raise
+    metrics.record_outbound(provider, response.status_code, time.perf_counter() - start)
+    if response.status_code >= 500 or response.status_code == 429:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def configure_stripe(stripe_module):
+    """Route the Stripe SDK through the shared pool, with deadlines and the Stripe breaker"""
+    from stripe.http_client import RequestsClient
+
+    breaker = get_breaker('stripe')
+
+    class PooledStripeClient(RequestsClient):
+        def request(self, method, url, headers, post_data=None):
+            breaker.before_call()
+            start = time.perf_counter()
+            try:
+                content, status_code, response_headers = super().request(method, url, headers, post_data)
+            except Exception:
+                metrics.record_outbound('stripe', 'error', time.perf_counter() - start)
+                breaker.record_failure()
+                raise
+            metrics.record_outbound('stripe', status_code, time.perf_counter() - start)
+            if status_code >= 500 or status_code == 429:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return content, status_code, response_headers
+
+    stripe_module.default_http_client = PooledStripeClient(
+        timeout=get_timeout('stripe'),
+        session=get_session('stripe'),
+    )
+    # Stripe's own retries send idempotency keys, so POSTs are safe to retry there
+    stripe_module.max_network_retries = PROVIDER_SETTINGS['stripe']['retries']
+
+
+def geopy_adapter_factory():
+    """
+    Adapter factory for geopy geocoders using pooled connections and bounded retries.
+    Calls are recorded as outbound 'nominatim' time, like request() does for the others.
+    """
+    from geopy.adapters import RequestsAdapter
+
+    def timed(method, url, timeout, headers):
+        start = time.perf_counter()
+        try:
+            result = method(url, timeout=timeout, headers=headers)
+        except Exception as e:
+            # AdapterHTTPError carries the status of a 4xx/5xx answer
+            status = getattr(e, 'status_code', None) or 'error'
+            metrics.record_outbound('nominatim', status, time.perf_counter() - start)
+            raise
+        metrics.record_outbound('nominatim', 200, time.perf_counter() - start)
+        return result
+
+    class TimedRequestsAdapter(RequestsAdapter):
+        def get_text(self, url, *, timeout, headers):
+            return timed(super().get_text, url, timeout, headers)
+
+        def get_json(self, url, *, timeout, headers):
+            return timed(super().get_json, url, timeout, headers)
+
+    return functools.partial(
+        TimedRequestsAdapter,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=PROVIDER_SETTINGS['nominatim']['retries'],
+    )
@@ -0,0 +1,222 @@
+"""
+ICS Feed Export for ChefAsap Backend
+Builds subscribable .ics feeds of a chef's or customer's bookings.
+
+Each owner has a version stamp in calendar_feed_versions that triggers bump whenever
+their bookings (or the chef's menu prep times) change. The version is the feed's
+ETag, so a calendar app polling an unchanged feed gets a 304 after one primary-key
+lookup. Changed feeds are streamed from a server-side cursor and, when small enough,
+cached by version for the next poller.
+
+Feeds have no login (calendar apps cannot send one), so their URLs carry a token signed
+under CALENDAR_FEED_SECRET instead of the owner id; feed_token() issues it.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+from itsdangerous import URLSafeSerializer, BadSignature
+from psycopg2.extras import RealDictCursor
+from database.db_helper import get_db_connection, get_cursor
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+OWNER_TABLES = {'chef': 'chefs', 'customer': 'customers'}
+STATUS_MAP = {
+    'pending': 'TENTATIVE',
+    'accepted': 'CONFIRMED',
+    'completed': 'CONFIRMED',
+    'declined': 'CANCELLED',
+    'cancelled': 'CANCELLED',
+}
+FETCH_SIZE = 500
+MAX_CACHED_FEED_BYTES = 1024 * 1024
+
+# Feed URLs are bearer credentials for an owner's bookings, so there is no default key
+CALENDAR_FEED_SECRET = os.getenv('CALENDAR_FEED_SECRET')
+if not CALENDAR_FEED_SECRET:
+    raise RuntimeError('CALENDAR_FEED_SECRET is not set')
+feed_token_serializer = URLSafeSerializer(CALENDAR_FEED_SECRET, salt='calendar-feed')
+
+# (owner_type, owner_id) -> (version, feed bytes)
+feed_cache = TTLCache(maxsize=500, ttl=3600)
+feed_cache_lock = threading.Lock()
+
+FEED_QUERY = '''
+    SELECT
+      b.id AS booking_id,
+      b.booking_date,
+      b.booking_time,
+      b.status,
+      b.special_notes,
+      b.cuisine_type,
+      b.meal_type,
+      b.event_type,
+      b.number_of_people,
+      b.updated_at,
+      COALESCE(b.duration_minutes, 60) AS duration_minutes
+    FROM bookings b
+    WHERE b.{owner_column} = %s
+    ORDER BY b.booking_date, b.booking_time
+'''
+
+
+def feed_token(owner_type, owner_id):
+    """Unguessable token naming an owner's feed; stable, so subscriptions keep working"""
+    return feed_token_serializer.dumps([owner_type, owner_id])
+
+
+def parse_feed_token(token):
+    """(owner_type, owner_id) of a feed token, or None if it was not issued by feed_token"""
+    try:
+        owner_type, owner_id = feed_token_serializer.loads(token)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    if owner_type not in OWNER_TABLES or not isinstance(owner_id, int):
+        return None
+    return owner_type, owner_id
+
+
+def feed_version(cursor, owner_type, owner_id):
+    """
+    Current feed version for an owner, 0 if nothing has changed since versioning began,
+    or None if the chef/customer does not exist.
+    """
+    cursor.execute(f'''
+        SELECT COALESCE(v.version, 0) AS version
+        FROM {OWNER_TABLES[owner_type]} o
+        LEFT JOIN calendar_feed_versions v ON v.owner_type = %s AND v.owner_id = o.id
+        WHERE o.id = %s
+    ''', (owner_type, owner_id))
+    row = cursor.fetchone()
+    return row['version'] if row else None
+
+
+def feed_etag(owner_type, owner_id, version):
+    return f'{owner_type}-{owner_id}-v{version}'
+
+
+def get_cached_feed(owner_type, owner_id, version):
+    with feed_cache_lock:
+        cached = feed_cache.get((owner_type, owner_id))
+    hit = bool(cached) and cached[0] == version
+    metrics.record_cache('ics_feed', hit)
+    return cached[1] if hit else None
+
+
+def escape_text(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """Fold a content line at 75 octets (RFC 5545 3.1) without splitting UTF-8 characters"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    current = ''
+    limit = 75
+    for char in line:
+        if len((current + char).encode('utf-8')) > limit:
+            parts.append(current)
+            current = ''
+            limit = 74  # continuation lines start with a space
+        current += char
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def booking_to_vevent(row):
+    booking_date = row['booking_date']
+    booking_time = row['booking_time']
+    meal = ' '.join(filter(None, [row.get('cuisine_type'), row.get('meal_type')]))
+    summary = f'ChefAsap {meal}'.strip() if meal else 'ChefAsap booking'
+    stamp = row.get('updated_at') or datetime.combine(booking_date, datetime.min.time())
+
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:booking-{row['booking_id']}@chefasap",
+        f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%S')}Z",
+    ]
+    if booking_time is None:
+        lines.append(f"DTSTART;VALUE=DATE:{booking_date.strftime('%Y%m%d')}")
+        lines.append(f"DTEND;VALUE=DATE:{(booking_date + timedelta(days=1)).strftime('%Y%m%d')}")
+    else:
+        # Bookings are stored in the event's local time, so they are exported as floating times
+        start = datetime.combine(booking_date, booking_time)
+        end = start + timedelta(minutes=int(row['duration_minutes'] or 60))
+        lines.append(f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}")
+        lines.append(f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}")
+    lines.append(f'SUMMARY:{escape_text(summary)}')
+
+    details = []
+    if row.get('event_type'):
+        details.append(f"Event: {row['event_type']}")
+    if row.get('number_of_people'):
+        details.append(f"Guests: {row['number_of_people']}")
+    if row.get('special_notes'):
+        details.append(f"Notes: {row['special_notes']}")
+    if details:
+        lines.append(f"DESCRIPTION:{escape_text(chr(10).join(details))}")
+    lines.append(f"STATUS:{STATUS_MAP.get(row.get('status') or 'pending', 'TENTATIVE')}")
+    lines.append('END:VEVENT')
+    return ''.join(fold_line(line) for line in lines)
+
+
+def generate_feed(owner_type, owner_id, version):
+    """
+    Yield the feed in chunks, reading bookings through a server-side cursor so large
+    histories are never held in memory at once. Small feeds are cached under version.
+    """
+    header = ''.join(fold_line(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//ChefAsap//Bookings//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:ChefAsap {owner_type} bookings',
+    ]).encode('utf-8')
+    chunks = [header]
+    size = len(header)
+    yield header
+
+    conn = get_db_connection()
+    cursor = conn.cursor(name=f'ics_feed_{owner_type}_{owner_id}', cursor_factory=RealDictCursor)
+    cursor.itersize = FETCH_SIZE
+    try:
+        cursor.execute(FEED_QUERY.format(owner_column=f'{owner_type}_id'), (owner_id,))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunk = ''.join(booking_to_vevent(row) for row in rows).encode('utf-8')
+            if chunks is not None:
+                size += len(chunk)
+                if size <= MAX_CACHED_FEED_BYTES:
+                    chunks.append(chunk)
+                else:
+                    chunks = None
+            yield chunk
+    finally:
+        cursor.close()
+        conn.close()
+
+    footer = fold_line('END:VCALENDAR').encode('utf-8')
+    yield footer
+    if chunks is not None:
+        chunks.append(footer)
+        with feed_cache_lock:
+            feed_cache[(owner_type, owner_id)] = (version, b''.join(chunks))
+
+
+def current_version(owner_type, owner_id):
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        return feed_version(cursor, owner_type, owner_id)
+    finally:
+        cursor.close()
+        conn.close()
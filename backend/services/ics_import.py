@@ -0,0 +1,279 @@
+"""
+ICS Import for ChefAsap Backend
+Streams an uploaded .ics file into external_busy_blocks (source 'ics').
+
+The file is read line by line and parsed one VEVENT at a time, so memory stays flat
+no matter how many events a calendar holds. VTIMEZONE definitions are kept per file,
+so custom TZIDs (e.g. Outlook's) resolve to the file's own rules. Recurring events
+are expanded only inside the import horizon, instances are keyed by UID + start time
+(a RECURRENCE-ID override replaces its instance when its SEQUENCE is at least as
+high), and rows are written in batches with execute_values.
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from dateutil.rrule import rrulestr
+from icalendar import Event, Timezone
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+HORIZON_PAST_DAYS = 1
+HORIZON_FUTURE_DAYS = 365
+# Upper bound on instances one recurring event may add inside the horizon
+MAX_OCCURRENCES_PER_EVENT = 10000
+# Expanding these from an old DTSTART means walking millions of instances; calendar
+# apps do not produce them for real events
+UNSUPPORTED_FREQUENCIES = ('SECONDLY', 'MINUTELY')
+
+
+def unfold_lines(stream):
+    """Yield logical iCalendar lines from a binary stream, joining folded continuations"""
+    current = None
+    for raw in stream:
+        line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def iter_vevents(stream, timezones):
+    """
+    Yield (event, error) for each VEVENT, holding only one component's lines at a time.
+    VTIMEZONE components are collected into timezones ({TZID: tzinfo}) as they go by.
+    """
+    buffer = None
+    depth = 0
+    for line in unfold_lines(stream):
+        upper = line.upper()
+        if buffer is None:
+            if upper in ('BEGIN:VEVENT', 'BEGIN:VTIMEZONE'):
+                buffer = [line]
+                depth = 1
+            continue
+        buffer.append(line)
+        if upper.startswith('BEGIN:'):
+            depth += 1
+        elif upper.startswith('END:'):
+            depth -= 1
+            if depth == 0:
+                ical = '\r\n'.join(buffer)
+                buffer = None
+                if upper == 'END:VTIMEZONE':
+                    try:
+                        component = Timezone.from_ical(ical)
+                        timezones[str(component['TZID'])] = component.to_tz()
+                    except Exception as e:
+                        logger.warning(f"Ignoring unreadable VTIMEZONE: {e}")
+                    continue
+                try:
+                    yield Event.from_ical(ical), None
+                except Exception as e:
+                    yield None, e
+
+
+def _as_datetime(value):
+    """Normalize DTSTART/DTEND values: dates become midnight, aware times become naive UTC"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    return datetime.combine(value, time.min)
+
+
+def _align(value, reference):
+    """Match value's type and tz-awareness to reference so dateutil can compare them"""
+    if not isinstance(reference, datetime):
+        return value.date() if isinstance(value, datetime) else value
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if reference.tzinfo is not None and value.tzinfo is None:
+        return value.replace(tzinfo=reference.tzinfo)
+    if reference.tzinfo is None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _localize(value, prop, timezones):
+    """
+    Give a TZID-qualified time the file's own VTIMEZONE. icalendar resolves TZIDs by
+    name, so custom ones come back floating or with another file's definition; the
+    wall-clock time is right either way.
+    """
+    if not timezones or not isinstance(value, datetime):
+        return value
+    tzid = prop.params.get('TZID')
+    if tzid in timezones:
+        return value.replace(tzinfo=timezones[tzid])
+    return value
+
+
+def _decoded(event, name, timezones):
+    return _localize(event.decoded(name), event.get(name), timezones)
+
+
+def _date_values(prop, timezones=None):
+    if prop is None:
+        return []
+    props = prop if isinstance(prop, list) else [prop]
+    return [_localize(d.dt, p, timezones) for p in props for d in p.dts]
+
+
+def event_duration(event, start, timezones=None):
+    if event.get('DTEND') is not None:
+        return _decoded(event, 'DTEND', timezones) - start
+    if event.get('DURATION') is not None:
+        return event.decoded('DURATION')
+    # RFC 5545: an all-day event without an end lasts one day
+    return timedelta(days=1) if not isinstance(start, datetime) else timedelta(0)
+
+
+def _window_bound(value, dtstart):
+    """A naive-UTC window bound in the same awareness as the rule's dtstart"""
+    return value.replace(tzinfo=timezone.utc) if dtstart.tzinfo is not None else value
+
+
+def expand_occurrences(event, start, window_start, window_end, duration=timedelta(0), timezones=None):
+    """Start times of the instances of event that overlap [window_start, window_end)"""
+    rrule = event.get('RRULE')
+    if rrule is None:
+        return [start]
+    frequency = rrule.get('FREQ', [''])[0].upper()
+    if frequency in UNSUPPORTED_FREQUENCIES:
+        raise ValueError(f'FREQ={frequency} is not supported')
+
+    # dateutil needs datetimes; all-day rules are expanded from midnight
+    dtstart = start if isinstance(start, datetime) else datetime.combine(start, time.min)
+    # Floating-time rules often still carry a UTC UNTIL, which dateutil rejects unless told to ignore it
+    rule_set = rrulestr('RRULE:' + rrule.to_ical().decode(), dtstart=dtstart, forceset=True,
+                        ignoretz=dtstart.tzinfo is None)
+    for rdate in _date_values(event.get('RDATE'), timezones):
+        rule_set.rdate(_align(rdate, dtstart))
+    for exdate in _date_values(event.get('EXDATE'), timezones):
+        rule_set.exdate(_align(exdate, dtstart))
+
+    # Start the search at the window (less one duration, for instances already under
+    # way), so the cap applies to instances in the horizon, not to years of history
+    search_start = _window_bound(window_start - duration, dtstart)
+    search_end = _window_bound(window_end, dtstart)
+    occurrences = []
+    for occurrence in rule_set.xafter(search_start, count=MAX_OCCURRENCES_PER_EVENT, inc=True):
+        if occurrence >= search_end:
+            break
+        occurrences.append(occurrence if isinstance(start, datetime) else occurrence.date())
+    else:
+        if len(occurrences) >= MAX_OCCURRENCES_PER_EVENT:
+            logger.warning(f"Recurring event {event.get('UID')} truncated to "
+                           f"{MAX_OCCURRENCES_PER_EVENT} instances")
+    return occurrences
+
+
+def event_to_blocks(event, window_start, window_end, timezones=None):
+    """
+    Busy-block rows (external_id, summary, starts_at, ends_at, all_day, sequence) for one
+    VEVENT within the window. Cancelled and TRANSP:TRANSPARENT events block nothing.
+    """
+    if str(event.get('STATUS', '')).upper() == 'CANCELLED':
+        return []
+    if str(event.get('TRANSP', '')).upper() == 'TRANSPARENT':
+        return []
+    uid = event.get('UID')
+    if uid is None or event.get('DTSTART') is None:
+        return []
+
+    start = _decoded(event, 'DTSTART', timezones)
+    duration = event_duration(event, start, timezones)
+    all_day = isinstance(start, date) and not isinstance(start, datetime)
+    summary = str(event.get('SUMMARY')) if event.get('SUMMARY') is not None else None
+    sequence = int(event.get('SEQUENCE', 0))
+
+    if event.get('RECURRENCE-ID') is not None:
+        # An override is keyed by the instance it replaces, not by its (possibly moved) start
+        instance_starts = [(_decoded(event, 'RECURRENCE-ID', timezones), start)]
+    else:
+        instance_starts = [(s, s) for s in expand_occurrences(event, start, window_start, window_end,
+                                                              duration, timezones)]
+
+    blocks = []
+    for instance, occurrence_start in instance_starts:
+        starts_at = _as_datetime(occurrence_start)
+        ends_at = _as_datetime(occurrence_start + duration)
+        if ends_at <= window_start or starts_at >= window_end:
+            continue
+        external_id = f'{uid}/{_as_datetime(instance).isoformat()}'
+        blocks.append((external_id, summary, starts_at, ends_at, all_day, sequence))
+    return blocks
+
+
+def _write_batch(cursor, user_id, batch):
+    execute_values(cursor, '''
+        INSERT INTO external_busy_blocks AS b
+            (user_id, source, external_id, summary, starts_at, ends_at, all_day, sequence)
+        VALUES %s
+        ON CONFLICT (user_id, source, external_id) DO UPDATE SET
+            summary = EXCLUDED.summary,
+            starts_at = EXCLUDED.starts_at,
+            ends_at = EXCLUDED.ends_at,
+            all_day = EXCLUDED.all_day,
+            sequence = EXCLUDED.sequence,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE EXCLUDED.sequence >= b.sequence
+    ''', [(user_id, 'ics') + block for block in batch.values()], page_size=BATCH_SIZE)
+
+
+def import_ics(conn, cursor, user_id, stream):
+    """
+    Replace the user's imported .ics busy time with the contents of stream, in one
+    transaction. Returns counts of events read, busy blocks written and events skipped.
+    """
+    now = datetime.utcnow()
+    window_start = now - timedelta(days=HORIZON_PAST_DAYS)
+    window_end = now + timedelta(days=HORIZON_FUTURE_DAYS)
+    stats = {'events': 0, 'imported': 0, 'skipped': 0}
+
+    cursor.execute('''
+        DELETE FROM external_busy_blocks WHERE user_id = %s AND source = 'ics'
+    ''', (user_id,))
+
+    # Deduplicated per batch (one row may not be upserted twice in a statement);
+    # across batches the ON CONFLICT ... WHERE keeps the highest SEQUENCE
+    batch = {}
+    timezones = {}
+    for event, error in iter_vevents(stream, timezones):
+        stats['events'] += 1
+        if error is not None:
+            stats['skipped'] += 1
+            continue
+        try:
+            blocks = event_to_blocks(event, window_start, window_end, timezones)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable VEVENT {event.get('UID')}: {e}")
+            stats['skipped'] += 1
+            continue
+
+        for block in blocks:
+            existing = batch.get(block[0])
+            if existing is None or block[5] >= existing[5]:
+                batch[block[0]] = block
+        if len(batch) >= BATCH_SIZE:
+            _write_batch(cursor, user_id, batch)
+            batch = {}
+
+    if batch:
+        _write_batch(cursor, user_id, batch)
+
+    # The same instance can land in several batches, so count what was actually stored
+    cursor.execute('''
+        SELECT COUNT(*) AS imported FROM external_busy_blocks WHERE user_id = %s AND source = 'ics'
+    ''', (user_id,))
+    stats['imported'] = cursor.fetchone()['imported']
+
+    conn.commit()
+    return stats
@@ -0,0 +1,239 @@
+"""
+Image Pipeline for ChefAsap Backend
+Turns uploaded photos into small, EXIF-free variants served from /static.
+
+The request thread only checks that the upload is an image and parks the original
+outside /static; a bounded worker pool then writes each variant as WebP and JPEG:
+
+    thumb  - 160px long edge (lists, avatars)
+    card   - 480px (menu and chef cards)
+    full   - 1600px (detail screens)
+
+Files are content-addressed through services.photo_store: identical uploads reuse the
+existing variants, and unreferenced ones are garbage collected. Variant URLs are
+deterministic, so upload responses return them immediately. photo_url columns store
+the JPEG "full" variant; photo_variants() derives the others for read endpoints.
+The outcome of processing is recorded on the photo_objects row, so a failed upload
+shows up in photo_store.processing_status() instead of as a URL that never resolves.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from services import photo_store
+from services.object_storage import IMMUTABLE_CACHE_CONTROL, get_storage
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = photo_store.STATIC_DIR
+# Originals may carry EXIF (GPS, device) data, so they never live under /static
+PENDING_DIR = os.path.join(BASE_DIR, 'uploads_pending')
+
+VARIANTS = {'thumb': 160, 'card': 480, 'full': 1600}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+CONTENT_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+MAX_UPLOAD_PIXELS = 50_000_000
+MAX_WORKERS = 2
+# Uploads beyond this many queued jobs are processed on the request thread (back-pressure)
+MAX_PENDING_JOBS = 32
+
+MAX_PHOTO_BYTES = 15 * 1024 * 1024
+# Upload parts larger than this are spooled to a temp file instead of memory
+SPOOL_MEMORY_BYTES = 256 * 1024
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+Image.MAX_IMAGE_PIXELS = MAX_UPLOAD_PIXELS
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='image-pipeline')
+_pending_slots = threading.BoundedSemaphore(MAX_PENDING_JOBS)
+
+
+class InvalidImageError(Exception):
+    """The upload is not an image Pillow can read"""
+
+
+class PhotoTooLargeError(RequestEntityTooLarge):
+    description = f'Each photo must be at most {MAX_PHOTO_BYTES // (1024 * 1024)} MB'
+
+
+class _CappedSpool(tempfile.SpooledTemporaryFile):
+    """Upload part buffer that spills to disk and aborts the parse once a file exceeds its cap"""
+
+    def __init__(self, max_bytes):
+        super().__init__(max_size=SPOOL_MEMORY_BYTES)
+        self._remaining = max_bytes
+
+    def write(self, data):
+        self._remaining -= len(data)
+        if self._remaining < 0:
+            raise PhotoTooLargeError()
+        return super().write(data)
+
+
+def parse_photo_form(environ, max_files, max_file_bytes=MAX_PHOTO_BYTES):
+    """
+    Parse a multipart photo upload with every file spooled to disk and capped while it
+    streams in, instead of Werkzeug's default buffering. Returns (form, files).
+    Raises RequestEntityTooLarge when a file or the whole body is over its limit.
+    """
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        return _CappedSpool(max_file_bytes)
+
+    _, form, files = parse_form_data(
+        environ,
+        stream_factory=stream_factory,
+        max_content_length=max_files * max_file_bytes + 1024 * 1024,
+    )
+    return form, files
+
+
+def sniff_image_type(stream):
+    """Image type from the file's magic bytes (jpeg, png, gif, webp), or None"""
+    head = stream.read(12)
+    stream.seek(0)
+    for signature, image_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def file_extension(filename):
+    return filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+
+
+def variant_urls(content_hash):
+    return {
+        variant: {fmt: photo_store.object_url(content_hash, variant, fmt) for fmt in FORMATS}
+        for variant in VARIANTS
+    }
+
+
+def photo_variants(photo_url):
+    """
+    Variant URLs of a stored photo_url, in the shape upload responses use.
+    None for photos that predate the pipeline; clients fall back to photo_url.
+    """
+    content_hash = photo_store.hash_from_url(photo_url)
+    return variant_urls(content_hash) if content_hash else None
+
+
+def delete_photo_files(photo_url):
+    """
+    Remove a pre-pipeline /static photo from disk. Content-addressed photos may be
+    shared, so they are left to photo_store's reference-counted GC.
+    """
+    if not photo_url or not photo_url.startswith('/static/') or photo_store.hash_from_url(photo_url):
+        return
+    try:
+        os.remove(os.path.join(STATIC_DIR, photo_url[len('/static/'):]))
+    except OSError:
+        pass
+
+
+def _flatten(image):
+    """RGB copy of image, compositing any transparency onto white for JPEG"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def process_image(source_path, content_hash):
+    """
+    Write all variants of source_path to storage under its content hash, then delete the
+    original. Failures are recorded on the photo_objects row; uploading the same bytes
+    again retries.
+    """
+    storage = get_storage()
+    error = None
+    try:
+        with Image.open(source_path) as opened:
+            opened.seek(0)  # first frame of animated GIF/WebP
+            # Apply the camera's rotation before the EXIF block is dropped
+            image = _flatten(ImageOps.exif_transpose(opened))
+
+        # 'full' goes last: its JPEG marks the object as complete (photo_store.object_exists)
+        for variant, size in sorted(VARIANTS.items(), key=lambda item: item[0] == 'full'):
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            for fmt, (pil_format, options) in sorted(FORMATS.items(), key=lambda item: item[0] == 'jpg'):
+                temp_path = f'{source_path}_{variant}.{fmt}'
+                # Saving without exif= drops all metadata
+                resized.save(temp_path, pil_format, **options)
+                storage.put_file(photo_store.object_key(content_hash, variant, fmt), temp_path,
+                                 content_type=CONTENT_TYPES[fmt],
+                                 cache_control=IMMUTABLE_CACHE_CONTROL)
+    except Exception as e:
+        logger.error(f"Image processing failed for {content_hash}: {e}")
+        error = str(e) or e.__class__.__name__
+    finally:
+        try:
+            os.remove(source_path)
+        except OSError:
+            pass
+
+    try:
+        photo_store.record_processing_result(content_hash, error)
+    except Exception as e:
+        logger.error(f"Could not record processing result for {content_hash}: {e}")
+
+
+def _run_job(source_path, content_hash):
+    try:
+        process_image(source_path, content_hash)
+    finally:
+        _pending_slots.release()
+
+
+def store_upload(photo):
+    """
+    Validate an uploaded FileStorage, register it by content hash and queue variant
+    generation unless identical bytes were stored before.
+    Returns (photo_url, variants). Raises InvalidImageError for non-image uploads.
+    """
+    try:
+        with Image.open(photo.stream) as probe:
+            probe.verify()
+    except Exception as e:
+        raise InvalidImageError(f'Uploaded file is not a readable image: {e}')
+
+    photo.stream.seek(0)
+    content_hash = photo_store.hash_stream(photo.stream)
+    original_bytes = photo.stream.tell()
+    created = photo_store.register_object(content_hash, original_bytes)
+    variants = variant_urls(content_hash)
+
+    # A new row means any files under this hash are left over from a GC sweep, so
+    # they are regenerated rather than trusted
+    if not created and photo_store.object_exists(content_hash):
+        return variants['full']['jpg'], variants
+
+    os.makedirs(PENDING_DIR, exist_ok=True)
+    source_path = os.path.join(PENDING_DIR, f'{content_hash}_{threading.get_ident()}')
+    photo.stream.seek(0)
+    photo.save(source_path)
+
+    if _pending_slots.acquire(blocking=False):
+        _executor.submit(_run_job, source_path, content_hash)
+    else:
+        logger.warning("Image pipeline queue full; processing upload inline")
+        process_image(source_path, content_hash)
+
+    return variants['full']['jpg'], variants
@@ -0,0 +1,187 @@
+"""
+Performance Metrics for ChefAsap Backend
+In-process latency histograms and counters, exposed in Prometheus text format at
+/metrics and summarised per request in a Server-Timing header (app, db, http).
+
+    http_request_duration_seconds{method,route,status}       histogram
+    http_request_db_queries{route}                            histogram
+    db_query_duration_seconds                                 histogram
+    outbound_request_duration_seconds{provider,status}        histogram
+    cache_requests_total{cache,result}                        counter
+    db_pool_connections{state}                                gauge
+
+DB time comes from the timed cursors in database.db_helper; outbound time from
+services.http_client. Each worker process reports its own numbers, so scrape every
+worker (or sum across them). Streamed responses are timed until the response starts.
+"""
+
+import threading
+import time
+from flask import Response, g, has_request_context, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_label_text(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._values.items()]
+        for key, counts in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_label_text(self.labels, key, [("le", bound)])} {count}')
+            total = counts[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{_label_text(self.labels, key, [("le", "+Inf")])} {total}')
+            lines.append(f'{self.name}_sum{_label_text(self.labels, key)} {counts[-1]}')
+            lines.append(f'{self.name}_count{_label_text(self.labels, key)} {total}')
+        return lines
+
+
+class Gauge:
+    """Value read at scrape time from read(), which returns {label values tuple: number}"""
+
+    def __init__(self, name, help_text, labels, read):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.read = read
+        _registry.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        for key, value in self.read().items():
+            lines.append(f'{self.name}{_label_text(self.labels, key)} {value}')
+        return lines
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Time spent handling a request',
+                             ('method', 'route', 'status'))
+request_db_queries = Histogram('http_request_db_queries', 'Database round trips per request',
+                               ('route',), buckets=QUERY_COUNT_BUCKETS)
+db_query_duration = Histogram('db_query_duration_seconds', 'Time per database round trip')
+outbound_duration = Histogram('outbound_request_duration_seconds', 'Time per third-party HTTP call',
+                              ('provider', 'status'))
+cache_requests = Counter('cache_requests_total', 'In-process cache lookups', ('cache', 'result'))
+
+
+def _add_to_request(field, seconds):
+    if has_request_context():
+        setattr(g, field, getattr(g, field, 0.0) + seconds)
+        if field == '_metrics_db_seconds':
+            g._metrics_db_queries = getattr(g, '_metrics_db_queries', 0) + 1
+
+
+def record_query(seconds):
+    db_query_duration.observe(seconds)
+    _add_to_request('_metrics_db_seconds', seconds)
+
+
+def record_outbound(provider, status, seconds):
+    outbound_duration.observe(seconds, provider=provider, status=status)
+    _add_to_request('_metrics_http_seconds', seconds)
+
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _start_timer():
+    g._metrics_start = time.perf_counter()
+
+
+def _finish_timer(response):
+    start = getattr(g, '_metrics_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    db_seconds = getattr(g, '_metrics_db_seconds', 0.0)
+    db_queries = getattr(g, '_metrics_db_queries', 0)
+    http_seconds = getattr(g, '_metrics_http_seconds', 0.0)
+
+    request_duration.observe(elapsed, method=request.method, route=route, status=response.status_code)
+    request_db_queries.observe(db_queries, route=route)
+
+    timings = [f'app;dur={elapsed * 1000:.1f}',
+               f'db;dur={db_seconds * 1000:.1f};desc="{db_queries} queries"']
+    if http_seconds:
+        timings.append(f'http;dur={http_seconds * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+def metrics_endpoint():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Time every request and serve /metrics"""
+    app.before_request(_start_timer)
+    app.after_request(_finish_timer)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
@@ -0,0 +1,130 @@
+"""
+Object Storage for ChefAsap Backend
+Where photo objects live, behind one small interface.
+
+    LocalStorage - files under backend/static (default)
+    S3Storage    - any S3-compatible bucket; point S3_ENDPOINT_URL at MinIO or
+                   LocalStack to run it locally
+
+Keys are paths relative to /static (e.g. photos/ab/<hash>_full.jpg), so photo_url
+columns keep the same /static/... form whichever backend is configured.
+
+Environment:
+    PHOTO_STORAGE_BACKEND   local | s3
+    S3_BUCKET, S3_ENDPOINT_URL, S3_REGION, S3_PUBLIC_BASE_URL
+"""
+
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+
+# Content-addressed objects never change, so clients and proxies may keep them forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+
+class LocalStorage:
+    name = 'local'
+
+    def __init__(self, root=STATIC_DIR):
+        self.root = root
+
+    def path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f'Invalid storage key: {key}')
+        return path
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def put_file(self, key, source_path, content_type=None, cache_control=None):
+        """Move source_path into place; the rename makes the object appear atomically"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(source_path, path)
+        except OSError:
+            # Different filesystem: copy next to the target, then rename
+            temp_path = f'{path}.tmp'
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, path)
+            os.remove(source_path)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def public_url(self, key):
+        return None
+
+
+class S3Storage:
+    name = 's3'
+
+    def __init__(self, bucket, endpoint_url=None, region=None, public_base_url=None):
+        import boto3  # optional dependency, only needed for the S3 backend
+        self.bucket = bucket
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        base = public_base_url or (f'{endpoint_url.rstrip("/")}/{bucket}' if endpoint_url
+                                   else f'https://{bucket}.s3.amazonaws.com')
+        self.public_base_url = base.rstrip('/')
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def put_file(self, key, source_path, content_type=None, cache_control=None):
+        extra = {}
+        if content_type:
+            extra['ContentType'] = content_type
+        if cache_control:
+            extra['CacheControl'] = cache_control
+        self.client.upload_file(source_path, self.bucket, key, ExtraArgs=extra)
+        os.remove(source_path)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def public_url(self, key):
+        return f'{self.public_base_url}/{key}'
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Configured storage backend, created once per process"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            backend = os.getenv('PHOTO_STORAGE_BACKEND', 'local')
+            if backend == 's3':
+                _storage = S3Storage(
+                    bucket=os.environ['S3_BUCKET'],
+                    endpoint_url=os.getenv('S3_ENDPOINT_URL'),
+                    region=os.getenv('S3_REGION'),
+                    public_base_url=os.getenv('S3_PUBLIC_BASE_URL'),
+                )
+            else:
+                _storage = LocalStorage()
+            logger.info(f"Photo storage backend: {_storage.name}")
+    return _storage
+
+
+def cache_control_for(key):
+    """Immutable caching for content-addressed photos, a short max-age for everything else"""
+    from services.photo_store import hash_from_url
+    return IMMUTABLE_CACHE_CONTROL if hash_from_url(f'/static/{key}') else DEFAULT_CACHE_CONTROL
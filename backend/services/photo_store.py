@@ -0,0 +1,257 @@
+"""
+Photo Store for ChefAsap Backend
+Content-addressed storage for pipeline photos, with reference counting and GC.
+
+Each uploaded image is named by the SHA-256 of its bytes, so identical uploads share
+one set of variant objects at photos/<aa>/<hash>_<variant>.<fmt> in the configured
+storage backend (services.object_storage), served as /static/photos/.... The
+photo_objects table tracks every stored hash; triggers on chefs, customers,
+chef_menu_items and chef_cuisine_photos keep ref_count in step with photo_url
+columns. collect_garbage() removes objects that have had no references for
+GC_GRACE_HOURS (the grace covers uploads whose row is saved in a later request).
+processed_at and processing_error record whether the variants were written.
+
+    python -m services.photo_store            # one GC sweep
+    python -m services.photo_store --legacy   # also remove unreferenced pre-pipeline files
+"""
+
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+from database.db_helper import get_db_connection, get_cursor, pooled_connection
+from services.object_storage import STATIC_DIR, get_storage
+
+logger = logging.getLogger(__name__)
+
+PHOTOS_SUBDIR = 'photos'
+HASH_LENGTH = 64
+GC_GRACE_HOURS = 24
+GC_INTERVAL_SECONDS = 6 * 3600
+GC_BATCH_SIZE = 500
+
+# Directories used before content addressing, and the columns that may point into them
+LEGACY_DIRS = ('menu_photos', 'item_photos', 'profile_photos', 'cuisine_photos')
+PHOTO_URL_COLUMNS = (
+    ('chefs', 'photo_url'),
+    ('customers', 'photo_url'),
+    ('chef_menu_items', 'photo_url'),
+    ('chef_cuisine_photos', 'photo_url'),
+)
+
+
+def hash_stream(stream, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def object_key(content_hash, variant, fmt):
+    """Storage key (path under /static) of one variant of an object"""
+    return f'{PHOTOS_SUBDIR}/{content_hash[:2]}/{content_hash}_{variant}.{fmt}'
+
+
+def object_exists(content_hash):
+    """True once the pipeline has published the object's full JPEG (written last)"""
+    return get_storage().exists(object_key(content_hash, 'full', 'jpg'))
+
+
+def object_url(content_hash, variant, fmt):
+    return f'/static/{object_key(content_hash, variant, fmt)}'
+
+
+def hash_from_url(photo_url):
+    """Content hash of a content-addressed photo URL, else None"""
+    prefix = f'/static/{PHOTOS_SUBDIR}/'
+    if not photo_url or not photo_url.startswith(prefix):
+        return None
+    name = photo_url.rsplit('/', 1)[-1]
+    content_hash = name.split('_', 1)[0]
+    return content_hash if len(content_hash) == HASH_LENGTH else None
+
+
+def register_object(content_hash, original_bytes):
+    """
+    Record an upload; returns True if the row was just created. A re-upload of known
+    bytes restarts the grace period of an unreferenced object, so GC cannot remove it
+    before the caller saves its row.
+    """
+    # Pooled: multi-photo uploads register their files from several threads at once
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO photo_objects (hash, original_bytes) VALUES (%s, %s)
+                ON CONFLICT (hash) DO UPDATE SET
+                    unreferenced_since = CASE
+                        WHEN photo_objects.ref_count = 0 THEN CURRENT_TIMESTAMP
+                        ELSE NULL
+                    END,
+                    processing_error = NULL
+                RETURNING (xmax = 0) AS created
+            ''', (content_hash, original_bytes))
+            created = cursor.fetchone()[0]
+            conn.commit()
+        finally:
+            cursor.close()
+    return created
+
+
+def record_processing_result(content_hash, error=None):
+    """Mark an object processed, or failed with error until the same bytes are uploaded again"""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE photo_objects
+                SET processed_at = CASE WHEN %s::text IS NULL THEN CURRENT_TIMESTAMP END,
+                    processing_error = %s
+                WHERE hash = %s
+            ''', (error, error, content_hash))
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+def processing_status(photo_urls):
+    """
+    {photo_url: {'status': 'ready' | 'processing' | 'failed', 'error': ...}} for the given
+    URLs. Photos that predate the pipeline are always ready.
+    """
+    hashes = {url: hash_from_url(url) for url in photo_urls}
+    rows = {}
+    if any(hashes.values()):
+        conn = get_db_connection()
+        cursor = get_cursor(conn, dictionary=True)
+        try:
+            cursor.execute('''
+                SELECT hash, processed_at, processing_error
+                FROM photo_objects
+                WHERE hash = ANY(%s)
+            ''', (list(filter(None, hashes.values())),))
+            rows = {row['hash']: row for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            conn.close()
+
+    statuses = {}
+    for url, content_hash in hashes.items():
+        row = rows.get(content_hash)
+        if content_hash is None:
+            statuses[url] = {'status': 'ready', 'error': None}
+        elif row is None:
+            statuses[url] = {'status': 'failed', 'error': 'Photo not found'}
+        elif row['processing_error']:
+            statuses[url] = {'status': 'failed', 'error': row['processing_error']}
+        elif row['processed_at']:
+            statuses[url] = {'status': 'ready', 'error': None}
+        else:
+            statuses[url] = {'status': 'processing', 'error': None}
+    return statuses
+
+
+def _remove_object_files(content_hash):
+    from services.image_pipeline import FORMATS, VARIANTS
+    storage = get_storage()
+    for variant in VARIANTS:
+        for fmt in FORMATS:
+            try:
+                storage.delete(object_key(content_hash, variant, fmt))
+            except Exception as e:
+                logger.warning(f"Could not delete {object_key(content_hash, variant, fmt)}: {e}")
+
+
+def collect_garbage(grace_hours=GC_GRACE_HOURS):
+    """Delete objects unreferenced for grace_hours, rows and files. Returns how many were removed"""
+    removed = 0
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        while True:
+            # Files are removed while the rows are still locked. A concurrent re-upload
+            # waits in register_object until the DELETE commits, then creates a new row
+            # and regenerates the files, so it never ends up with a URL whose files are gone.
+            cursor.execute('''
+                SELECT hash FROM photo_objects
+                WHERE ref_count = 0
+                  AND unreferenced_since < CURRENT_TIMESTAMP - make_interval(hours => %s)
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ''', (grace_hours, GC_BATCH_SIZE))
+            hashes = [row['hash'] for row in cursor.fetchall()]
+            for content_hash in hashes:
+                _remove_object_files(content_hash)
+            if hashes:
+                cursor.execute('DELETE FROM photo_objects WHERE hash = ANY(%s)', (hashes,))
+            conn.commit()
+            removed += len(hashes)
+            if len(hashes) < GC_BATCH_SIZE:
+                break
+    finally:
+        cursor.close()
+        conn.close()
+    if removed:
+        logger.info(f"Photo GC removed {removed} unreferenced objects")
+    return removed
+
+
+def collect_legacy_files():
+    """Remove files in the pre-pipeline photo directories that no row references"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        referenced = set()
+        for table, column in PHOTO_URL_COLUMNS:
+            cursor.execute(f'SELECT DISTINCT {column} FROM {table} WHERE {column} LIKE %s', ('/static/%',))
+            referenced.update(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+    removed = 0
+    for subdir in LEGACY_DIRS:
+        directory = os.path.join(STATIC_DIR, subdir)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if f'/static/{subdir}/{name}' not in referenced:
+                try:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+                except OSError:
+                    pass
+    logger.info(f"Photo GC removed {removed} unreferenced legacy files")
+    return removed
+
+
+_gc_thread = None
+_gc_lock = threading.Lock()
+
+
+def _gc_loop():
+    while True:
+        try:
+            collect_garbage()
+        except Exception as e:
+            logger.error(f"Photo GC error: {e}")
+        time.sleep(GC_INTERVAL_SECONDS)
+
+
+def start_photo_gc():
+    """Start the periodic GC sweep once per process"""
+    global _gc_thread
+    with _gc_lock:
+        if _gc_thread is not None and _gc_thread.is_alive():
+            return
+        _gc_thread = threading.Thread(target=_gc_loop, name='photo-gc', daemon=True)
+        _gc_thread.start()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Removed {collect_garbage()} unreferenced photo objects")
+    if '--legacy' in sys.argv:
+        print(f"Removed {collect_legacy_files()} unreferenced legacy files")
@@ -0,0 +1,198 @@
+"""
+Query Tracer for ChefAsap Backend
+Opt-in N+1 and slow-query detector for development and canary deployments.
+
+While a traced request runs, every statement executed through database.db_helper's
+timed cursors is fingerprinted (literals and IN lists collapsed). When the request
+ends, fingerprints seen N_PLUS_ONE_THRESHOLD or more times are flagged as N+1.
+Read-only statements slower than SLOW_QUERY_MS get EXPLAIN (ANALYZE, BUFFERS)
+captured once per fingerprint, on a separate read-only connection in the background.
+Findings are kept per route and per process, logged, and written to QUERY_TRACE_REPORT
+with the process id added to the name (query_trace_report.<pid>.json), so workers do
+not overwrite each other's findings; they are also served at /__query_trace__.
+
+Environment:
+    QUERY_TRACE=1                 enable tracing
+    QUERY_TRACE_SAMPLE=0.05       fraction of requests to trace (canary), default 1
+    QUERY_TRACE_N_PLUS_ONE=5      repeats of one statement that count as N+1
+    QUERY_TRACE_SLOW_MS=100       latency budget per statement
+    QUERY_TRACE_REPORT=path       report file name, default backend/query_trace_report.json
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import g, has_request_context, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENABLED = os.getenv('QUERY_TRACE') == '1'
+SAMPLE_RATE = float(os.getenv('QUERY_TRACE_SAMPLE', '1'))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('QUERY_TRACE_N_PLUS_ONE', '5'))
+SLOW_QUERY_MS = float(os.getenv('QUERY_TRACE_SLOW_MS', '100'))
+REPORT_PATH = os.getenv('QUERY_TRACE_REPORT', os.path.join(BASE_DIR, 'query_trace_report.json'))
+MAX_EXAMPLES = 3
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_COMMENT = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_WRITE = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|CREATE|ALTER|DROP|TRUNCATE|LOCK|NOTIFY|pg_notify|nextval|setval)\b',
+                    re.IGNORECASE)
+
+# route -> report section
+_routes = {}
+_routes_lock = threading.Lock()
+_explained = set()
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='query-explain')
+
+
+def fingerprint(sql):
+    """Statement shape with literals, numbers and IN lists collapsed to '?'"""
+    sql = _COMMENT.sub(' ', sql)
+    sql = sql.replace('%s', '?')
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?...)', sql)
+    return ' '.join(sql.split())
+
+
+def _is_read_only(sql):
+    stripped = _COMMENT.sub(' ', sql).lstrip().upper()
+    return stripped.startswith(('SELECT', 'WITH')) and not _WRITE.search(sql)
+
+
+def _sql_text(cursor, query):
+    # execute_values and mogrified statements arrive as bytes, psycopg2.sql objects as Composed
+    if isinstance(query, bytes):
+        return query.decode(cursor.connection.encoding)
+    return query if isinstance(query, str) else query.as_string(cursor)
+
+
+def record(cursor, query, params, seconds):
+    """Called by the timed cursors after every execute; tracing never breaks the query"""
+    try:
+        _record(cursor, query, params, seconds)
+    except Exception as e:
+        logger.warning(f"Query tracing failed: {e}")
+
+
+def _record(cursor, query, params, seconds):
+    if not has_request_context() or getattr(g, '_trace_queries', None) is None:
+        return
+    sql = _sql_text(cursor, query)
+    key = fingerprint(sql)
+    entry = g._trace_queries.get(key)
+    if entry is None:
+        entry = g._trace_queries[key] = {'count': 0, 'seconds': 0.0}
+    entry['count'] += 1
+    entry['seconds'] += seconds
+
+    if seconds * 1000 > SLOW_QUERY_MS and key not in _explained and _is_read_only(sql):
+        _explained.add(key)
+        statement = cursor.mogrify(query, params).decode(cursor.connection.encoding)
+        _explain_executor.submit(_explain, request.url_rule.rule if request.url_rule else 'unmatched',
+                                 key, statement, seconds)
+
+
+def _explain(route, key, statement, seconds):
+    from database.db_helper import get_db_connection
+    conn = get_db_connection()
+    try:
+        conn.set_session(readonly=True)
+        cursor = conn.cursor()
+        cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) {statement}')
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        cursor.close()
+    except Exception as e:
+        plan = f'EXPLAIN failed: {e}'
+    finally:
+        conn.rollback()
+        conn.close()
+
+    logger.warning(f"Slow query on {route} ({seconds * 1000:.0f} ms): {key}\n{plan}")
+    with _routes_lock:
+        section = _route_section(route)
+        section['slow_queries'][key] = {'ms': round(seconds * 1000, 1), 'plan': plan}
+    _write_report()
+
+
+def _route_section(route):
+    section = _routes.get(route)
+    if section is None:
+        section = _routes[route] = {'requests': 0, 'max_queries': 0, 'n_plus_one': {}, 'slow_queries': {}}
+    return section
+
+
+def _start_trace():
+    if random.random() < SAMPLE_RATE:
+        g._trace_queries = {}
+
+
+def _finish_trace(response):
+    queries = getattr(g, '_trace_queries', None)
+    if queries is None:
+        return response
+    g._trace_queries = None
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    total = sum(entry['count'] for entry in queries.values())
+    flagged = {key: entry for key, entry in queries.items() if entry['count'] >= N_PLUS_ONE_THRESHOLD}
+
+    with _routes_lock:
+        section = _route_section(route)
+        section['requests'] += 1
+        section['max_queries'] = max(section['max_queries'], total)
+        for key, entry in flagged.items():
+            found = section['n_plus_one'].setdefault(key, {'requests': 0, 'max_repeats': 0, 'examples': []})
+            found['requests'] += 1
+            found['max_repeats'] = max(found['max_repeats'], entry['count'])
+            if len(found['examples']) < MAX_EXAMPLES:
+                found['examples'].append({'path': request.path, 'repeats': entry['count'],
+                                          'ms': round(entry['seconds'] * 1000, 1)})
+
+    for key, entry in flagged.items():
+        logger.warning(f"N+1 on {request.method} {route}: {entry['count']}x {key}")
+    if flagged:
+        _write_report()
+    return response
+
+
+def report():
+    with _routes_lock:
+        return json.loads(json.dumps(_routes))
+
+
+def report_path():
+    """This process's report file: QUERY_TRACE_REPORT with the pid before the extension"""
+    root, ext = os.path.splitext(REPORT_PATH)
+    return f'{root}.{os.getpid()}{ext}'
+
+
+def _write_report():
+    data = {'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pid': os.getpid(), 'routes': report()}
+    path = report_path()
+    # Request threads of one process may write at the same time; each uses its own temp file
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write query trace report: {e}")
+
+
+def init_app(app):
+    """Trace requests and serve /__query_trace__ when QUERY_TRACE=1"""
+    if not ENABLED:
+        return
+    app.before_request(_start_trace)
+    app.after_request(_finish_trace)
+    app.add_url_rule('/__query_trace__', 'query_trace', lambda: jsonify(report()))
+    logger.info(f"Query tracing on for {SAMPLE_RATE:.0%} of requests")
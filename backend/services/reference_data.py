@@ -0,0 +1,197 @@
+"""
+Reference Data Cache for ChefAsap Backend
+Small lookup tables every worker keeps in memory instead of re-reading them per request.
+
+    cuisine_types - id <-> name, plus chef_count (chefs offering the cuisine)
+    agreements    - active agreements, without their text
+
+Triggers bump reference_data_versions and NOTIFY 'reference_data' with the table name
+when a table changes. chef_cuisines changes adjust cuisine_types.chef_count in place
+and NOTIFY 'cuisine_counts', so counts are never recounted with a join. A listener
+thread (start_reference_data) reloads whatever was named. It re-checks versions every
+POLL_SECONDS in case a notification was missed, e.g. while reconnecting. Processes
+without the listener reload tables older than POLL_SECONDS on access.
+"""
+
+import logging
+import select
+import threading
+import time
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from database.db_helper import get_db_connection
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'reference_data'
+POLL_SECONDS = 300
+RECONNECT_SECONDS = 10
+
+# Notification payload -> table to reload
+RELOADS = {
+    'cuisine_types': 'cuisine_types',
+    'cuisine_counts': 'cuisine_types',
+    'agreements': 'agreements',
+}
+
+_tables = {}
+_versions = {}
+_loaded_at = {}
+_lock = threading.Lock()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _load_cuisine_types(cursor):
+    cursor.execute('SELECT id, name, chef_count FROM cuisine_types ORDER BY name')
+    rows = [{'id': row[0], 'name': row[1], 'chef_count': row[2]} for row in cursor.fetchall()]
+    return {
+        'rows': rows,
+        'by_id': {row['id']: row for row in rows},
+        'by_name': {row['name']: row for row in rows},
+    }
+
+
+def _load_agreements(cursor):
+    cursor.execute('''
+        SELECT id, agreement_type, title, version, is_required, applicable_to,
+               effective_date, expiry_date
+        FROM agreements
+        WHERE is_active = TRUE
+        ORDER BY agreement_type, effective_date DESC
+    ''')
+    columns = [column[0] for column in cursor.description]
+    return {'rows': [dict(zip(columns, row)) for row in cursor.fetchall()]}
+
+
+LOADERS = {
+    'cuisine_types': _load_cuisine_types,
+    'agreements': _load_agreements,
+}
+
+
+def _read_versions(cursor):
+    cursor.execute('SELECT name, version FROM reference_data_versions')
+    return dict(cursor.fetchall())
+
+
+def reload(names=None, cursor=None):
+    """Reload the named tables (all by default), on cursor or a fresh connection"""
+    names = set(names or LOADERS)
+    conn = None
+    if cursor is None:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+    try:
+        versions = _read_versions(cursor)
+        loaded = {name: LOADERS[name](cursor) for name in names}
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
+    now = time.monotonic()
+    with _lock:
+        for name, data in loaded.items():
+            _tables[name] = data
+            _versions[name] = versions.get(name, 0)
+            _loaded_at[name] = now
+
+
+def reload_changed(cursor):
+    """Reload tables whose version moved, plus cuisine counts (they carry no version)"""
+    versions = _read_versions(cursor)
+    with _lock:
+        changed = {name for name in LOADERS if versions.get(name, 0) != _versions.get(name)}
+    reload(changed | {'cuisine_types'}, cursor)
+
+
+def _table(name):
+    with _lock:
+        data = _tables.get(name)
+        fresh = data is not None and (
+            _listener is not None or time.monotonic() - _loaded_at[name] < POLL_SECONDS)
+    metrics.record_cache(f'reference_data:{name}', fresh)
+    if not fresh:
+        reload([name])
+        with _lock:
+            data = _tables[name]
+    return data
+
+
+def cuisine_types():
+    """All cuisine types as [{'id', 'name', 'chef_count'}], by name"""
+    return _table('cuisine_types')['rows']
+
+
+def cuisine_name(cuisine_id):
+    row = _table('cuisine_types')['by_id'].get(cuisine_id)
+    return row['name'] if row else None
+
+
+def cuisine_ids(names):
+    """
+    Ids of the known cuisine names, sorted and without duplicates; unknown names are skipped.
+    Sorted so concurrent writes to chef_cuisines touch cuisines in the same order.
+    """
+    by_name = _table('cuisine_types')['by_name']
+    if any(name not in by_name for name in names):
+        # The cuisine may have been added after the last notification reached us
+        reload(['cuisine_types'])
+        by_name = _table('cuisine_types')['by_name']
+    return sorted({by_name[name]['id'] for name in names if name in by_name})
+
+
+def cuisines_with_chefs():
+    """Names of cuisines at least one chef offers, most offered first"""
+    rows = [row for row in cuisine_types() if row['chef_count'] > 0]
+    return [row['name'] for row in sorted(rows, key=lambda row: (-row['chef_count'], row['name']))]
+
+
+def active_agreements(applicable_to=None):
+    """Active agreements for 'customers' or 'chefs' (including 'all'), or every one"""
+    rows = _table('agreements')['rows']
+    if applicable_to is None:
+        return rows
+    return [row for row in rows if row['applicable_to'] in ('all', applicable_to)]
+
+
+def _listen_loop():
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = conn.cursor()
+            cursor.execute(f'LISTEN {CHANNEL}')
+            # Anything may have changed while no one was listening
+            reload(cursor=cursor)
+            while True:
+                if select.select([conn], [], [], POLL_SECONDS) == ([], [], []):
+                    reload_changed(cursor)
+                    continue
+                conn.poll()
+                names = set()
+                while conn.notifies:
+                    payload = conn.notifies.pop(0).payload
+                    if payload in RELOADS:
+                        names.add(RELOADS[payload])
+                if names:
+                    reload(names, cursor)
+        except Exception as e:
+            logger.error(f"Reference data listener error: {e}")
+            time.sleep(RECONNECT_SECONDS)
+        finally:
+            if conn:
+                conn.close()
+
+
+def start_reference_data():
+    """Load reference tables and start the change listener once per process"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        thread = threading.Thread(target=_listen_loop, name='reference-data', daemon=True)
+        thread.start()
+        with _lock:
+            _listener = thread
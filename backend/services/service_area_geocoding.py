@@ -0,0 +1,116 @@
+"""
+Service Area Geocoding for ChefAsap Backend
+Fills in latitude/longitude for chef_service_areas rows in the background, so chef
+searches never wait on the geocoder. The coverage_box trigger builds the indexed box
+from the stored coordinates.
+
+Only real geocoder hits are stored. Areas that fail stay NULL (not covered by any
+search) and are retried after RETRY_MINUTES, oldest attempt first.
+
+Every worker runs the sweep thread, but a sweep only proceeds while it holds the
+SWEEP_LOCK_ID advisory lock, so a single process at a time talks to the geocoder and
+the request spacing holds across the deployment.
+
+    python -m services.service_area_geocoding     # one sweep
+"""
+
+import logging
+import threading
+import time
+from database.db_helper import get_db_connection, get_cursor
+from services.geocoding_service import geocoding_service
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 25
+SWEEP_INTERVAL_SECONDS = 300
+RETRY_MINUTES = 60
+# Nominatim's usage policy allows one request per second
+REQUEST_SPACING_SECONDS = 1.0
+# pg_try_advisory_lock key held for the duration of a sweep
+SWEEP_LOCK_ID = 7310428
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def geocode_missing_service_areas(batch_size=BATCH_SIZE):
+    """
+    Geocode one batch of service areas without coordinates; returns how many were stored.
+    Returns 0 straight away while another process is sweeping.
+    """
+    conn = get_db_connection()
+    cursor = get_cursor(conn, dictionary=True)
+    stored = 0
+    try:
+        # Session-level lock: released by the unlock below or when the connection closes
+        cursor.execute('SELECT pg_try_advisory_lock(%s) AS locked', (SWEEP_LOCK_ID,))
+        if not cursor.fetchone()['locked']:
+            conn.commit()
+            return 0
+
+        # Claim the batch by stamping the attempt up front, so a sweep that dies
+        # midway does not hand the same rows straight back
+        cursor.execute('''
+            UPDATE chef_service_areas
+            SET geocode_attempted_at = CURRENT_TIMESTAMP
+            WHERE id IN (
+                SELECT id FROM chef_service_areas
+                WHERE (latitude IS NULL OR longitude IS NULL)
+                AND zip_code IS NOT NULL
+                AND (geocode_attempted_at IS NULL
+                     OR geocode_attempted_at < CURRENT_TIMESTAMP - make_interval(mins => %s))
+                ORDER BY geocode_attempted_at NULLS FIRST, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, zip_code
+        ''', (RETRY_MINUTES, batch_size))
+        areas = sorted(cursor.fetchall(), key=lambda area: area['id'])
+        conn.commit()
+
+        for area in areas:
+            # The geocoder is called outside any transaction
+            coords = geocoding_service.lookup_zip(area['zip_code'])
+            if coords:
+                cursor.execute('''
+                    UPDATE chef_service_areas
+                    SET latitude = %s, longitude = %s, geocode_attempted_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND latitude IS NULL
+                ''', (coords[0], coords[1], area['id']))
+                stored += 1
+                conn.commit()
+            time.sleep(REQUEST_SPACING_SECONDS)
+
+        cursor.execute('SELECT pg_advisory_unlock(%s)', (SWEEP_LOCK_ID,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    if stored:
+        logger.info(f"Geocoded {stored} service areas")
+    return stored
+
+
+def _geocoder_loop():
+    while True:
+        try:
+            geocode_missing_service_areas()
+        except Exception as e:
+            logger.error(f"Service area geocoding error: {e}")
+        time.sleep(SWEEP_INTERVAL_SECONDS)
+
+
+def start_service_area_geocoder():
+    """Start the periodic geocoding sweep once per process"""
+    global _thread
+    with _thread_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_geocoder_loop, name='service-area-geocoder', daemon=True)
+        _thread.start()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Geocoded {geocode_missing_service_areas()} service areas")
@@ -0,0 +1,258 @@
+"""
+Stripe Webhook Event Pipeline for ChefAsap Backend
+The webhook route only verifies and stores each event (store_event) and acknowledges
+Stripe right away. A small pool of worker threads then processes stored events:
+
+- each event is processed once; redeliveries hit ON CONFLICT (event_id) DO NOTHING
+- events for the same Stripe object (PaymentIntent, PaymentMethod, Customer) are
+  processed in the order Stripe created them
+- failures are retried with exponential backoff, then parked as 'failed'
+
+Offline check with a signed fixture (no Stripe account needed):
+    STRIPE_WEBHOOK_SECRET=whsec_test python -m services.stripe_events fixture.json
+"""
+
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from psycopg2.extras import Json
+from database.db_helper import get_db_connection, get_cursor
+from services import stripe_mirror
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 5
+STALE_LOCK_MINUTES = 5
+WORKER_COUNT = 2
+WORKER_IDLE_SECONDS = 30
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def store_event(cursor, event):
+    """Insert a verified event; returns False if Stripe already delivered it"""
+    obj = event['data']['object']
+    cursor.execute('''
+        INSERT INTO stripe_webhook_events (event_id, event_type, object_id, stripe_created, payload)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (event_id) DO NOTHING
+    ''', (event['id'], event['type'], obj.get('id'), event.get('created'), Json(event)))
+    return cursor.rowcount == 1
+
+
+def claim_next_event(cursor):
+    """
+    Mark the next processable event as 'processing' and return it, or None.
+    An event is processable when no earlier event for the same object is still open
+    and no other event for that object is being processed.
+    """
+    cursor.execute('''
+        UPDATE stripe_webhook_events
+        SET status = 'processing', attempts = attempts + 1, locked_at = CURRENT_TIMESTAMP
+        WHERE event_id = (
+            SELECT e.event_id
+            FROM stripe_webhook_events e
+            WHERE (e.status IN ('pending', 'retry') AND e.next_attempt_at <= CURRENT_TIMESTAMP
+                   OR e.status = 'processing'
+                      AND e.locked_at < CURRENT_TIMESTAMP - make_interval(mins => %s))
+            AND NOT EXISTS (
+                SELECT 1 FROM stripe_webhook_events p
+                WHERE p.object_id = e.object_id
+                AND p.event_id <> e.event_id
+                AND (
+                    p.status = 'processing' AND p.locked_at >= CURRENT_TIMESTAMP - make_interval(mins => %s)
+                    OR p.status IN ('pending', 'retry')
+                       AND (p.stripe_created, p.seq) < (e.stripe_created, e.seq)
+                )
+            )
+            ORDER BY e.stripe_created, e.seq
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING event_id, event_type, payload, attempts
+    ''', (STALE_LOCK_MINUTES, STALE_LOCK_MINUTES))
+    return cursor.fetchone()
+
+
+def mark_event_done(cursor, event_id):
+    cursor.execute('''
+        UPDATE stripe_webhook_events
+        SET status = 'done', processed_at = CURRENT_TIMESTAMP, locked_at = NULL, last_error = NULL
+        WHERE event_id = %s
+    ''', (event_id,))
+
+
+def mark_event_failed(cursor, event_id, attempts, error):
+    """Schedule a retry with exponential backoff, or park the event after MAX_ATTEMPTS"""
+    if attempts >= MAX_ATTEMPTS:
+        status, delay = 'failed', 0
+    else:
+        status, delay = 'retry', RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+    cursor.execute('''
+        UPDATE stripe_webhook_events
+        SET status = %s, last_error = %s, locked_at = NULL,
+            next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+        WHERE event_id = %s
+    ''', (status, error, delay, event_id))
+
+
+# Tables a PaymentIntent can pay for, with the column holding the amount due
+PAYABLE_TABLES = (('bookings', 'total_cost'), ('orders', 'total_amount'))
+
+
+def _set_payment_status(cursor, payment_intent, payment_status):
+    """
+    Update the booking/order paid for by a PaymentIntent. Rows are matched only by the
+    payment_intent_id stored when their owner created the intent (never by metadata).
+    A row is marked paid only when amount_received covers its total, and a failure
+    never downgrades a row that is already paid.
+    """
+    for table_name, total_column in PAYABLE_TABLES:
+        if payment_status == 'paid':
+            cursor.execute(f'''
+                SELECT id, ROUND({total_column} * 100) AS amount_due
+                FROM {table_name}
+                WHERE payment_intent_id = %s
+                FOR UPDATE
+            ''', (payment_intent['id'],))
+            for row in cursor.fetchall():
+                received = payment_intent.get('amount_received') or 0
+                if row['amount_due'] is None or received != int(row['amount_due']):
+                    logger.warning(f"PaymentIntent {payment_intent['id']} received {received} cents, "
+                                   f"{table_name} {row['id']} is due {row['amount_due']}; not marking paid")
+                    continue
+                cursor.execute(f'''
+                    UPDATE {table_name}
+                    SET payment_status = 'paid', paid_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                ''', (row['id'],))
+        else:
+            cursor.execute(f'''
+                UPDATE {table_name}
+                SET payment_status = %s
+                WHERE payment_intent_id = %s
+                AND payment_status IS DISTINCT FROM 'paid'
+            ''', (payment_status, payment_intent['id']))
+
+
+def handle_payment_intent_succeeded(cursor, payment_intent):
+    _set_payment_status(cursor, payment_intent, 'paid')
+
+
+def handle_payment_intent_failed(cursor, payment_intent):
+    _set_payment_status(cursor, payment_intent, 'failed')
+
+
+EVENT_HANDLERS = {
+    'payment_intent.succeeded': handle_payment_intent_succeeded,
+    'payment_intent.payment_failed': handle_payment_intent_failed,
+}
+
+
+def process_event(cursor, event):
+    """Apply one stored event; raises to trigger a retry"""
+    handler = EVENT_HANDLERS.get(event['type'])
+    if handler:
+        handler(cursor, event['data']['object'])
+    stripe_mirror.handle_webhook_event(cursor, event)
+
+
+def process_next_event(conn):
+    """
+    Claim and process one event in its own transactions.
+    Returns False when nothing is ready to process.
+    """
+    cursor = get_cursor(conn, dictionary=True)
+    try:
+        claimed = claim_next_event(cursor)
+        conn.commit()
+        if not claimed:
+            return False
+
+        try:
+            process_event(cursor, claimed['payload'])
+            mark_event_done(cursor, claimed['event_id'])
+            conn.commit()
+            logger.info(f"Processed Stripe event {claimed['event_id']} ({claimed['event_type']})")
+        except Exception as e:
+            conn.rollback()
+            mark_event_failed(cursor, claimed['event_id'], claimed['attempts'], str(e))
+            conn.commit()
+            logger.error(f"Stripe event {claimed['event_id']} failed (attempt {claimed['attempts']}): {e}")
+        return True
+    finally:
+        cursor.close()
+
+
+def process_events_until_idle():
+    """Drain every event that is ready now; returns how many were processed"""
+    processed = 0
+    conn = get_db_connection()
+    try:
+        while process_next_event(conn):
+            processed += 1
+    finally:
+        conn.close()
+    return processed
+
+
+def _worker_loop():
+    while True:
+        try:
+            process_events_until_idle()
+        except Exception as e:
+            logger.error(f"Stripe event worker error: {e}")
+        # Sleep until a new event is stored, or poll for retries that came due
+        _wakeup.wait(WORKER_IDLE_SECONDS)
+        _wakeup.clear()
+
+
+def notify_workers():
+    _wakeup.set()
+
+
+def start_event_workers(count=WORKER_COUNT):
+    """Start the background worker pool once per process"""
+    with _workers_lock:
+        if any(worker.is_alive() for worker in _workers):
+            return
+        _workers.clear()
+        for i in range(count):
+            worker = threading.Thread(target=_worker_loop, name=f'stripe-events-{i}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+    logger.info(f"Started {count} Stripe event workers")
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Build a Stripe-Signature header for a payload, for replaying fixtures offline"""
+    timestamp = int(timestamp or time.time())
+    signed = f'{timestamp}.{payload}'.encode('utf-8')
+    signature = hmac.new(secret.encode('utf-8'), signed, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    from app import app
+
+    logging.basicConfig(level=logging.INFO)
+    secret = os.environ['STRIPE_WEBHOOK_SECRET']
+
+    client = app.test_client()
+    for fixture_path in sys.argv[1:]:
+        with open(fixture_path) as fixture:
+            payload = fixture.read()
+        response = client.post('/stripe-payment/webhook', data=payload, headers={
+            'Stripe-Signature': sign_payload(payload, secret),
+            'Content-Type': 'application/json'
+        })
+        print(f"{fixture_path}: {response.status_code} {response.get_json()}")
+
+    print(f"Processed {process_events_until_idle()} event(s)")
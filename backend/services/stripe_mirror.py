@@ -0,0 +1,178 @@
+"""
+Stripe Payment Method Mirror for ChefAsap Backend
+Keeps a local copy of each Stripe customer's saved cards in stripe_payment_methods so
+the payment screen reads from the database instead of calling Stripe on every open.
+
+The mirror is written through by the attach/detach/set-default handlers, kept current
+by webhook events, and reconciled against Stripe by run_reconciliation() for drift.
+"""
+
+import logging
+import stripe
+from database.db_helper import get_db_connection, get_cursor
+
+logger = logging.getLogger(__name__)
+
+
+def _card_fields(payment_method):
+    """Pull the mirrored card columns out of a Stripe PaymentMethod (object or webhook dict)"""
+    card = payment_method.get('card') or {}
+    return (
+        card.get('brand'),
+        card.get('last4'),
+        card.get('exp_month'),
+        card.get('exp_year'),
+        card.get('funding'),
+        payment_method.get('created'),
+    )
+
+
+def upsert_payment_method(cursor, payment_method, stripe_customer_id, is_default=None):
+    """
+    Insert or refresh one mirrored card.
+    is_default=None leaves the stored default flag unchanged on update.
+    """
+    brand, last4, exp_month, exp_year, funding, created = _card_fields(payment_method)
+    cursor.execute('''
+        INSERT INTO stripe_payment_methods
+            (id, stripe_customer_id, customer_id, brand, last4, exp_month, exp_year,
+             funding, stripe_created, is_default)
+        VALUES (%s, %s, (SELECT id FROM customers WHERE stripe_customer_id = %s),
+                %s, %s, %s, %s, %s, %s, COALESCE(%s, FALSE))
+        ON CONFLICT (id) DO UPDATE SET
+            stripe_customer_id = EXCLUDED.stripe_customer_id,
+            customer_id = EXCLUDED.customer_id,
+            brand = EXCLUDED.brand,
+            last4 = EXCLUDED.last4,
+            exp_month = EXCLUDED.exp_month,
+            exp_year = EXCLUDED.exp_year,
+            funding = EXCLUDED.funding,
+            stripe_created = EXCLUDED.stripe_created,
+            is_default = COALESCE(%s, stripe_payment_methods.is_default),
+            synced_at = CURRENT_TIMESTAMP
+    ''', (payment_method['id'], stripe_customer_id, stripe_customer_id,
+          brand, last4, exp_month, exp_year, funding, created, is_default, is_default))
+
+
+def remove_payment_method(cursor, payment_method_id):
+    cursor.execute('DELETE FROM stripe_payment_methods WHERE id = %s', (payment_method_id,))
+
+
+def set_default_payment_method(cursor, stripe_customer_id, payment_method_id):
+    """Mark one card as the customer's default and clear the flag on the rest"""
+    cursor.execute('''
+        UPDATE stripe_payment_methods
+        SET is_default = COALESCE(id = %s, FALSE), synced_at = CURRENT_TIMESTAMP
+        WHERE stripe_customer_id = %s
+        AND is_default IS DISTINCT FROM COALESCE(id = %s, FALSE)
+    ''', (payment_method_id, stripe_customer_id, payment_method_id))
+
+
+def sync_customer_payment_methods(cursor, stripe_customer_id):
+    """
+    Replace the mirrored cards for one Stripe customer with what Stripe currently has.
+    Makes the same two Stripe calls the payment screen used to make on every open.
+    """
+    stripe_customer = stripe.Customer.retrieve(stripe_customer_id)
+    invoice_settings = stripe_customer.get('invoice_settings') or {}
+    default_payment_method = invoice_settings.get('default_payment_method')
+
+    payment_methods = stripe.PaymentMethod.list(customer=stripe_customer_id, type='card')
+    current_ids = []
+    for pm in payment_methods.auto_paging_iter():
+        upsert_payment_method(cursor, pm, stripe_customer_id, pm['id'] == default_payment_method)
+        current_ids.append(pm['id'])
+
+    cursor.execute('''
+        DELETE FROM stripe_payment_methods
+        WHERE stripe_customer_id = %s AND NOT (id = ANY(%s::varchar[]))
+    ''', (stripe_customer_id, current_ids))
+
+    cursor.execute('''
+        UPDATE customers SET stripe_payment_methods_synced_at = CURRENT_TIMESTAMP
+        WHERE stripe_customer_id = %s
+    ''', (stripe_customer_id,))
+
+
+def list_payment_methods(cursor, stripe_customer_id):
+    """Read the mirrored cards for a Stripe customer, default first"""
+    cursor.execute('''
+        SELECT id, brand, last4, exp_month, exp_year, funding, stripe_created, is_default
+        FROM stripe_payment_methods
+        WHERE stripe_customer_id = %s
+        ORDER BY is_default DESC, stripe_created DESC
+    ''', (stripe_customer_id,))
+    return cursor.fetchall()
+
+
+def handle_webhook_event(cursor, event):
+    """
+    Apply a Stripe webhook event to the mirror.
+    Returns True if the event type is one the mirror tracks.
+    """
+    event_type = event['type']
+    obj = event['data']['object']
+
+    if event_type in ('payment_method.attached', 'payment_method.updated',
+                      'payment_method.automatically_updated'):
+        if obj.get('customer'):
+            upsert_payment_method(cursor, obj, obj['customer'])
+        return True
+
+    if event_type == 'payment_method.detached':
+        remove_payment_method(cursor, obj['id'])
+        return True
+
+    if event_type == 'customer.updated':
+        invoice_settings = obj.get('invoice_settings') or {}
+        set_default_payment_method(cursor, obj['id'], invoice_settings.get('default_payment_method'))
+        return True
+
+    return False
+
+
+def run_reconciliation(stale_after_hours=24):
+    """
+    Re-sync every Stripe customer whose mirror has not been refreshed recently.
+    Meant to run from a scheduled job to correct drift from missed webhooks.
+    """
+    conn = None
+    cursor = None
+    synced = 0
+    try:
+        conn = get_db_connection()
+        cursor = get_cursor(conn, dictionary=True)
+
+        cursor.execute('''
+            SELECT stripe_customer_id FROM customers
+            WHERE stripe_customer_id IS NOT NULL
+            AND (stripe_payment_methods_synced_at IS NULL
+                 OR stripe_payment_methods_synced_at < CURRENT_TIMESTAMP - make_interval(hours => %s))
+        ''', (stale_after_hours,))
+        stripe_customer_ids = [row['stripe_customer_id'] for row in cursor.fetchall()]
+
+        for stripe_customer_id in stripe_customer_ids:
+            try:
+                sync_customer_payment_methods(cursor, stripe_customer_id)
+                conn.commit()
+                synced += 1
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Failed to reconcile payment methods for {stripe_customer_id}: {e}")
+
+        logger.info(f"Reconciled payment methods for {synced}/{len(stripe_customer_ids)} Stripe customers")
+        return synced
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    import os
+    from dotenv import load_dotenv
+    load_dotenv()
+    stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+    logging.basicConfig(level=logging.INFO)
+    run_reconciliation()